@@ -2,29 +2,56 @@
 API endpoints для работы с журналом аудита.
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 from backend.database import get_db
 from backend.api.dependencies import get_current_admin
 from backend.api.i18n_dependencies import get_translate
 from backend.api.schemas import (
     AuditLogResponse,
     AuditLogListResponse,
+    AuditLogStatsResponse,
 )
 from backend.services.audit_service import (
     get_audit_logs,
+    get_audit_logs_slim,
     get_audit_log_by_id,
-    count_audit_logs,
     get_user_audit_logs,
     get_admin_audit_logs,
+    get_audit_stats,
 )
 from backend.models.admin import Admin
-import json
+from backend.models.audit_log import AuditLog
 
 router = APIRouter(prefix="/audit-logs", tags=["audit-logs"])
 
 
+def _audit_log_to_dict(log: AuditLog) -> dict:
+    """Собрать JSON-готовый словарь AuditLogResponse; details уже десериализован колонкой JSON."""
+    return {
+        "id": log.id,
+        "user_id": log.user_id,
+        "admin_id": log.admin_id,
+        "action": log.action,
+        "entity_type": log.entity_type,
+        "entity_id": log.entity_id,
+        "details": log.details,
+        "ip_address": log.ip_address,
+        "created_at": log.created_at,
+    }
+
+
+def _audit_log_row_to_dict(row) -> dict:
+    """Собрать словарь AuditLogResponse из строки get_audit_logs_slim (details/ip_address не выбираются)."""
+    data = dict(row._mapping)
+    del data["total"]
+    data["details"] = None
+    data["ip_address"] = None
+    return data
+
+
 @router.get("", response_model=AuditLogListResponse)
 async def list_audit_logs(
     request: Request,
@@ -37,6 +64,7 @@ async def list_audit_logs(
     entity_id: Optional[str] = Query(None),
     start_date: Optional[str] = Query(None, description="ISO format: YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS"),
     end_date: Optional[str] = Query(None, description="ISO format: YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS"),
+    summary: bool = Query(False, description="Только основные поля (без details и ip_address)"),
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin),
     t=Depends(get_translate),
@@ -74,7 +102,8 @@ async def list_audit_logs(
                     detail=t("validation.invalid_format"),
                 )
     
-    logs = get_audit_logs(
+    fetch = get_audit_logs_slim if summary else get_audit_logs
+    logs, total = fetch(
         db=db,
         skip=skip,
         limit=limit,
@@ -86,44 +115,49 @@ async def list_audit_logs(
         start_date=start_date_obj,
         end_date=end_date_obj,
     )
-    total = count_audit_logs(
-        db=db,
-        user_id=user_id,
-        admin_id=admin_id,
-        action=action,
-        entity_type=entity_type,
-        start_date=start_date_obj,
-        end_date=end_date_obj,
-    )
     
-    # Формируем ответы
-    items = []
-    for log in logs:
-        details = None
-        if log.details:
-            try:
-                details = json.loads(log.details)
-            except (json.JSONDecodeError, TypeError):
-                details = log.details
-        
-        items.append(AuditLogResponse(
-            id=log.id,
-            user_id=log.user_id,
-            admin_id=log.admin_id,
-            action=log.action,
-            entity_type=log.entity_type,
-            entity_id=log.entity_id,
-            details=details,
-            ip_address=log.ip_address,
-            created_at=log.created_at,
-        ))
+    # Формируем ответы (данные из БД доверенные: без повторной валидации через Pydantic)
+    if summary:
+        items = [_audit_log_row_to_dict(row) for row in logs]
+    else:
+        items = [_audit_log_to_dict(log) for log in logs]
+    return ORJSONResponse({
+        "items": items,
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+    })
+
+
+@router.get("/stats", response_model=AuditLogStatsResponse)
+async def get_audit_stats_endpoint(
+    request: Request,
+    days: int = Query(30, ge=1, le=366),
+    action: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_admin: Admin = Depends(get_current_admin),
+    t=Depends(get_translate),
+):
+    """
+    Получить дневную сводку журнала аудита за последние days дней (из audit_log_daily).
+    """
+    end_day = datetime.utcnow().date()
+    start_day = end_day - timedelta(days=days - 1)
+    stats = get_audit_stats(db, start_day=start_day, end_day=end_day, action=action)
     
-    return AuditLogListResponse(
-        items=items,
-        total=total,
-        skip=skip,
-        limit=limit,
-    )
+    return ORJSONResponse({
+        "items": [
+            {
+                "day": row.day,
+                "action": row.action,
+                "entity_type": row.entity_type or None,
+                "count": row.count,
+            }
+            for row in stats
+        ],
+        "start_day": start_day,
+        "end_day": end_day,
+    })
 
 
 @router.get("/{log_id}", response_model=AuditLogResponse)
@@ -144,24 +178,7 @@ async def get_audit_log(
             detail=t("error.not_found"),
         )
     
-    details = None
-    if log.details:
-        try:
-            details = json.loads(log.details)
-        except (json.JSONDecodeError, TypeError):
-            details = log.details
-    
-    return AuditLogResponse(
-        id=log.id,
-        user_id=log.user_id,
-        admin_id=log.admin_id,
-        action=log.action,
-        entity_type=log.entity_type,
-        entity_id=log.entity_id,
-        details=details,
-        ip_address=log.ip_address,
-        created_at=log.created_at,
-    )
+    return ORJSONResponse(_audit_log_to_dict(log))
 
 
 @router.get("/user/{user_id}", response_model=AuditLogListResponse)
@@ -177,36 +194,14 @@ async def get_user_audit_logs_endpoint(
     """
     Получить журнал аудита для конкретного пользователя.
     """
-    logs = get_user_audit_logs(db, user_id, skip=skip, limit=limit)
-    total = count_audit_logs(db, user_id=user_id)
+    logs, total = get_user_audit_logs(db, user_id, skip=skip, limit=limit)
     
-    items = []
-    for log in logs:
-        details = None
-        if log.details:
-            try:
-                details = json.loads(log.details)
-            except (json.JSONDecodeError, TypeError):
-                details = log.details
-        
-        items.append(AuditLogResponse(
-            id=log.id,
-            user_id=log.user_id,
-            admin_id=log.admin_id,
-            action=log.action,
-            entity_type=log.entity_type,
-            entity_id=log.entity_id,
-            details=details,
-            ip_address=log.ip_address,
-            created_at=log.created_at,
-        ))
-    
-    return AuditLogListResponse(
-        items=items,
-        total=total,
-        skip=skip,
-        limit=limit,
-    )
+    return ORJSONResponse({
+        "items": [_audit_log_to_dict(log) for log in logs],
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+    })
 
 
 @router.get("/admin/{admin_id}", response_model=AuditLogListResponse)
@@ -222,33 +217,11 @@ async def get_admin_audit_logs_endpoint(
     """
     Получить журнал аудита для конкретного администратора.
     """
-    logs = get_admin_audit_logs(db, admin_id, skip=skip, limit=limit)
-    total = count_audit_logs(db, admin_id=admin_id)
+    logs, total = get_admin_audit_logs(db, admin_id, skip=skip, limit=limit)
     
-    items = []
-    for log in logs:
-        details = None
-        if log.details:
-            try:
-                details = json.loads(log.details)
-            except (json.JSONDecodeError, TypeError):
-                details = log.details
-        
-        items.append(AuditLogResponse(
-            id=log.id,
-            user_id=log.user_id,
-            admin_id=log.admin_id,
-            action=log.action,
-            entity_type=log.entity_type,
-            entity_id=log.entity_id,
-            details=details,
-            ip_address=log.ip_address,
-            created_at=log.created_at,
-        ))
-    
-    return AuditLogListResponse(
-        items=items,
-        total=total,
-        skip=skip,
-        limit=limit,
-    )
+    return ORJSONResponse({
+        "items": [_audit_log_to_dict(log) for log in logs],
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+    })
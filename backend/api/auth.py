@@ -6,7 +6,7 @@ from sqlalchemy.orm import Session
 from datetime import timedelta
 from backend.database import get_db
 from backend.services.auth_service import (
-    authenticate_admin,
+    authenticate_admin_async,
     create_access_token,
     create_refresh_token,
     verify_token,
@@ -35,7 +35,7 @@ async def login(
     """
     Вход администратора в систему.
     """
-    admin = authenticate_admin(db, login_data.username, login_data.password)
+    admin = await authenticate_admin_async(db, login_data.username, login_data.password)
     if not admin:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
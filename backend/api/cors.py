@@ -0,0 +1,101 @@
+"""
+CORS middleware в виде чистого ASGI-приложения.
+
+Не создает Request/Response на каждый запрос: заголовки ответа подготавливаются
+в байтах один раз при создании middleware, а для разрешенных источников
+к ответу лишь дописываются готовые пары заголовков.
+"""
+from typing import Iterable, List, Tuple
+
+ALL_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
+PREFLIGHT_MAX_AGE = 600
+
+Header = Tuple[bytes, bytes]
+
+
+class ASGICors:
+    """CORS: allowlist источников, preflight-ответы и заголовки для обычных запросов."""
+
+    def __init__(
+        self,
+        app,
+        allow_origins: Iterable[str] = (),
+        allow_methods: Iterable[str] = ("GET",),
+        allow_headers: Iterable[str] = (),
+        allow_credentials: bool = False,
+    ):
+        self.app = app
+        # "*" разрешает любой источник, как в Starlette CORSMiddleware
+        self.allow_all_origins = "*" in allow_origins
+        self.allow_origins = frozenset(origin.encode("latin-1") for origin in allow_origins if origin != "*")
+        # Без credentials на "*" отвечаем буквальным "*", с credentials браузер его не примет,
+        # поэтому источник запроса возвращается как есть
+        self._wildcard_origin = self.allow_all_origins and not allow_credentials
+        methods = ALL_METHODS if "*" in allow_methods else tuple(allow_methods)
+        self.allow_all_headers = "*" in allow_headers
+        self.allow_headers = ", ".join(h for h in allow_headers if h != "*").encode("latin-1")
+
+        common: List[Header] = [] if self._wildcard_origin else [(b"vary", b"Origin")]
+        if allow_credentials:
+            common.append((b"access-control-allow-credentials", b"true"))
+        self._simple_headers = common
+        self._preflight_headers = common + [
+            (b"access-control-allow-methods", ", ".join(methods).encode("latin-1")),
+            (b"access-control-max-age", str(PREFLIGHT_MAX_AGE).encode("latin-1")),
+            (b"content-length", b"0"),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        allowed = self.allow_all_origins or origin in self.allow_origins
+        allow_origin = b"*" if self._wildcard_origin else origin
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            # Preflight обрабатывается здесь, до роутинга приложения
+            if not allowed:
+                await send({
+                    "type": "http.response.start",
+                    "status": 400,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+                })
+                await send({"type": "http.response.body", "body": b"Disallowed CORS origin"})
+                return
+            headers = [(b"access-control-allow-origin", allow_origin)] + self._preflight_headers
+            if self.allow_all_headers and request_headers:
+                headers.append((b"access-control-allow-headers", request_headers))
+            elif self.allow_headers:
+                headers.append((b"access-control-allow-headers", self.allow_headers))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if not allowed:
+            await self.app(scope, receive, send)
+            return
+
+        extra_headers = [(b"access-control-allow-origin", allow_origin)] + self._simple_headers
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + extra_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
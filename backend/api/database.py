@@ -1,7 +1,7 @@
 """
 API endpoints для управления базой данных.
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File, Query
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import Optional
@@ -26,7 +26,7 @@ from backend.services.database_service import (
     optimize_database,
     get_backup_list,
 )
-from backend.services.audit_service import create_audit_log
+from backend.services.audit_service import create_audit_log, audit_log_buffer
 from backend.models.admin import Admin
 
 router = APIRouter(prefix="/database", tags=["database"])
@@ -150,6 +150,9 @@ async def restore_backup_endpoint(
             tmp_file.write(content)
             tmp_path = tmp_file.name
         
+        # Записи аудита из очереди должны попасть в текущую БД (и в копию перед восстановлением)
+        audit_log_buffer.flush()
+        
         # Восстанавливаем базу данных
         restore_backup(tmp_path, create_backup_before_restore=create_backup)
         
@@ -221,16 +224,17 @@ async def verify_database_integrity_endpoint(
 @router.post("/optimize", response_model=DatabaseOptimizeResponse)
 async def optimize_database_endpoint(
     request: Request,
+    full: bool = Query(False, description="Полный VACUUM (блокирует запись на время перезаписи файла)"),
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_current_super_admin),  # Только супер-администратор
     t=Depends(get_translate),
 ):
     """
-    Оптимизировать базу данных (VACUUM, ANALYZE).
+    Оптимизировать базу данных (incremental_vacuum и PRAGMA optimize; при full=true — VACUUM, ANALYZE).
     Требуются права супер-администратора.
     """
     try:
-        result = optimize_database(db)
+        result = optimize_database(db, full=full)
         
         # Логируем действие в аудит
         create_audit_log(
@@ -1,6 +1,9 @@
 """
 Dependencies для FastAPI endpoints.
 """
+import hashlib
+import time
+from typing import Dict, Optional, Tuple
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
@@ -11,6 +14,45 @@ from backend.models.admin import Admin
 
 security = HTTPBearer()
 
+# Кэш неудачных проверок токена: sha256(token) -> (expires_at, status_code, message_key, headers).
+# Дашборд с протухшим токеном продолжает опрашивать API; повторные запросы в пределах TTL
+# получают ту же ошибку без декодирования JWT и обращения к БД.
+_AUTH_FAIL_CACHE: Dict[bytes, Tuple[float, int, str, Optional[Dict[str, str]]]] = {}
+_AUTH_FAIL_TTL_SECONDS = 2.0
+_AUTH_FAIL_CACHE_MAX_SIZE = 1024
+
+
+# Кэш успешных проверок: sha256(token) -> (expires_at, admin_id). Снимает декодирование JWT
+# с каждого запроса панели (не дольше срока действия токена). Сам администратор берется из
+# единственного кэша get_admin_by_id, поэтому invalidate_admin_cache() действует и здесь.
+_AUTH_OK_CACHE: Dict[bytes, Tuple[float, str]] = {}
+_AUTH_OK_TTL_SECONDS = 30.0
+_AUTH_OK_CACHE_MAX_SIZE = 1024
+
+
+def _prune_cache(cache: Dict[bytes, tuple], now: float, max_size: int) -> None:
+    """Не дать кэшу расти бесконечно: удалить устаревшие записи, при переполнении — все."""
+    if len(cache) >= max_size:
+        for cached_key in [k for k, v in cache.items() if v[0] <= now]:
+            del cache[cached_key]
+        if len(cache) >= max_size:
+            cache.clear()
+
+
+def _auth_failure(
+    key: bytes,
+    t,
+    status_code: int,
+    message_key: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> HTTPException:
+    """Запомнить неудачную проверку токена и вернуть исключение для raise."""
+    _AUTH_OK_CACHE.pop(key, None)
+    now = time.monotonic()
+    _prune_cache(_AUTH_FAIL_CACHE, now, _AUTH_FAIL_CACHE_MAX_SIZE)
+    _AUTH_FAIL_CACHE[key] = (now + _AUTH_FAIL_TTL_SECONDS, status_code, message_key, headers)
+    return HTTPException(status_code=status_code, detail=t(message_key), headers=headers)
+
 
 async def get_current_admin(
     request: Request,
@@ -22,30 +64,48 @@ async def get_current_admin(
     Dependency для получения текущего администратора из JWT токена.
     """
     token = credentials.credentials
-    payload = verify_token(token, token_type="access")
-    if payload is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=t("auth.token.invalid"),
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    admin_id: str = payload.get("sub")
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    cached = _AUTH_FAIL_CACHE.get(key)
+    if cached is not None:
+        expires_at, status_code, message_key, headers = cached
+        if expires_at > time.monotonic():
+            raise HTTPException(status_code=status_code, detail=t(message_key), headers=headers)
+        _AUTH_FAIL_CACHE.pop(key, None)
+
+    admin_id: Optional[str] = None
+    payload = None
+    cached_ok = _AUTH_OK_CACHE.get(key)
+    if cached_ok is not None:
+        expires_at, cached_admin_id = cached_ok
+        if expires_at > time.time():
+            admin_id = cached_admin_id
+        else:
+            _AUTH_OK_CACHE.pop(key, None)
+
     if admin_id is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=t("auth.token.invalid"),
-        )
+        payload = verify_token(token, token_type="access")
+        if payload is None:
+            raise _auth_failure(
+                key, t, status.HTTP_401_UNAUTHORIZED, "auth.token.invalid",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        admin_id = payload.get("sub")
+        if admin_id is None:
+            raise _auth_failure(key, t, status.HTTP_401_UNAUTHORIZED, "auth.token.invalid")
+
     admin = get_admin_by_id(db, admin_id)
     if admin is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=t("admin.not_found"),
-        )
+        raise _auth_failure(key, t, status.HTTP_401_UNAUTHORIZED, "admin.not_found")
     if not admin.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail=t("auth.login.inactive_account"),
-        )
+        raise _auth_failure(key, t, status.HTTP_403_FORBIDDEN, "auth.login.inactive_account")
+
+    if payload is not None:
+        now = time.time()
+        expires_at = now + _AUTH_OK_TTL_SECONDS
+        if payload.get("exp"):
+            expires_at = min(expires_at, float(payload["exp"]))
+        _prune_cache(_AUTH_OK_CACHE, now, _AUTH_OK_CACHE_MAX_SIZE)
+        _AUTH_OK_CACHE[key] = (expires_at, admin_id)
     return admin
 
 
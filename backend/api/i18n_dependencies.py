@@ -2,9 +2,18 @@
 Dependencies для работы с интернационализацией.
 """
 from fastapi import Request, Depends
-from backend.utils.i18n import get_language_from_request, translate, SUPPORTED_LANGUAGES, DEFAULT_LANGUAGE
+from backend.utils.i18n import (
+    get_language_from_request,
+    translate,
+    preload_translations,
+    SUPPORTED_LANGUAGES,
+    DEFAULT_LANGUAGE,
+)
 from config.settings import settings
 
+# Каталоги переводов загружаются один раз при импорте, а не на первом запросе
+preload_translations()
+
 
 def get_language(request: Request) -> str:
     """
@@ -23,3 +32,11 @@ def get_translate(language: str = Depends(get_language)):
         return translate(key, language=language, **kwargs)
     
     return translate_with_lang
+
+
+def get_request_translate(request: Request):
+    """
+    Получить функцию перевода для запроса без dependency injection.
+    Для endpoints, которым перевод нужен только на пути ошибки.
+    """
+    return get_translate(get_language(request))
@@ -262,8 +262,9 @@ async def delete_mikrotik_config_endpoint(
     return {"message": t("mikrotik.config.deleted")}
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.post("/configs/{config_id}/test", response_model=MikroTikConfigTestResponse)
-async def test_mikrotik_config_endpoint(
+def test_mikrotik_config_endpoint(
     config_id: str,
     request: Request,
     db: Session = Depends(get_db),
@@ -289,8 +290,9 @@ async def test_mikrotik_config_endpoint(
 
 # ========== Пользователи MikroTik ==========
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.get("/users", response_model=MikroTikUserListResponse)
-async def list_mikrotik_users(
+def list_mikrotik_users(
     request: Request,
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin),
@@ -328,8 +330,9 @@ async def list_mikrotik_users(
         )
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.post("/users", response_model=dict)
-async def create_mikrotik_user_endpoint(
+def create_mikrotik_user_endpoint(
     user_data: MikroTikUserCreate,
     request: Request,
     db: Session = Depends(get_db),
@@ -354,8 +357,9 @@ async def create_mikrotik_user_endpoint(
         )
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.delete("/users/{username}")
-async def delete_mikrotik_user_endpoint(
+def delete_mikrotik_user_endpoint(
     username: str,
     request: Request,
     db: Session = Depends(get_db),
@@ -383,8 +387,9 @@ async def delete_mikrotik_user_endpoint(
 
 # ========== Firewall правила ==========
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.get("/firewall-rules", response_model=MikroTikFirewallRuleListResponse)
-async def list_firewall_rules(
+def list_firewall_rules(
     request: Request,
     chain: Optional[str] = Query(None),
     comment: Optional[str] = Query(None),
@@ -450,8 +455,9 @@ async def list_firewall_rule_bindings(
     return result
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.post("/firewall-rules/{rule_id}/assign", response_model=dict)
-async def assign_firewall_rule_to_user(
+def assign_firewall_rule_to_user(
     rule_id: str,
     body: MikroTikFirewallRuleAssignRequest,
     request: Request,
@@ -515,8 +521,9 @@ async def assign_firewall_rule_to_user(
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e) or t("mikrotik.connection.failed"))
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.post("/firewall-rules/{rule_id}/enable")
-async def enable_firewall_rule_endpoint(
+def enable_firewall_rule_endpoint(
     rule_id: str,
     request: Request,
     db: Session = Depends(get_db),
@@ -536,8 +543,9 @@ async def enable_firewall_rule_endpoint(
         )
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.post("/firewall-rules/{rule_id}/disable")
-async def disable_firewall_rule_endpoint(
+def disable_firewall_rule_endpoint(
     rule_id: str,
     request: Request,
     db: Session = Depends(get_db),
@@ -557,8 +565,9 @@ async def disable_firewall_rule_endpoint(
         )
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.get("/firewall-rules/by-comment/{comment}")
-async def find_firewall_rule_by_comment_endpoint(
+def find_firewall_rule_by_comment_endpoint(
     comment: str,
     request: Request,
     db: Session = Depends(get_db),
@@ -593,8 +602,9 @@ async def find_firewall_rule_by_comment_endpoint(
 
 # ========== User Manager ==========
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.get("/user-manager/users")
-async def get_user_manager_users_endpoint(
+def get_user_manager_users_endpoint(
     request: Request,
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin),
@@ -615,8 +625,9 @@ async def get_user_manager_users_endpoint(
 
 # ========== Сессии / операции над пользователями ==========
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.get("/sessions", response_model=MikroTikSessionListResponse)
-async def list_mikrotik_sessions(
+def list_mikrotik_sessions(
     request: Request,
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin),
@@ -656,8 +667,9 @@ async def list_mikrotik_sessions(
         )
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.post("/users/{username}/enable", response_model=dict)
-async def enable_mikrotik_user_endpoint(
+def enable_mikrotik_user_endpoint(
     username: str,
     request: Request,
     db: Session = Depends(get_db),
@@ -675,8 +687,9 @@ async def enable_mikrotik_user_endpoint(
         )
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.post("/users/{username}/disable", response_model=dict)
-async def disable_mikrotik_user_endpoint(
+def disable_mikrotik_user_endpoint(
     username: str,
     request: Request,
     db: Session = Depends(get_db),
@@ -694,8 +707,9 @@ async def disable_mikrotik_user_endpoint(
         )
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.post("/users/{username}/disconnect", response_model=dict)
-async def disconnect_mikrotik_user_sessions_endpoint(
+def disconnect_mikrotik_user_sessions_endpoint(
     username: str,
     request: Request,
     db: Session = Depends(get_db),
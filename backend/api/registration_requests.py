@@ -7,6 +7,7 @@ from typing import Optional
 from backend.database import get_db
 from backend.api.dependencies import get_current_admin
 from backend.api.i18n_dependencies import get_translate
+from backend.utils.response_cache import invalidate_cached_responses
 from backend.api.schemas import (
     RegistrationRequestCreate,
     RegistrationRequestResponse,
@@ -141,6 +142,8 @@ async def approve_registration(
             detail=t("registration.request.not_found"),
         )
     
+    # Статус пользователя изменился — сбрасываем кэш списка пользователей
+    invalidate_cached_responses("users:", "vpn_sessions:")
     request_dict = {
         "id": registration_request.id,
         "user_id": registration_request.user_id,
@@ -184,6 +187,8 @@ async def reject_registration(
             detail=t("registration.request.not_found"),
         )
     
+    # Статус пользователя изменился — сбрасываем кэш списка пользователей
+    invalidate_cached_responses("users:", "vpn_sessions:")
     request_dict = {
         "id": registration_request.id,
         "user_id": registration_request.user_id,
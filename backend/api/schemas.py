@@ -3,7 +3,7 @@ Pydantic схемы для валидации данных API.
 """
 from pydantic import BaseModel, EmailStr
 from typing import Optional, Any, Dict
-from datetime import datetime
+from datetime import date, datetime
 
 
 # Схемы для аутентификации
@@ -102,9 +102,10 @@ class UserResponse(BaseModel):
 class UserListResponse(BaseModel):
     """Схема ответа со списком пользователей."""
     items: list[UserResponse]
-    total: int
+    total: Optional[int] = None  # None, если запрошено include_total=false
     skip: int
     limit: int
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (keyset-пагинация)
 
 
 # Схемы для запросов на регистрацию
@@ -193,9 +194,10 @@ class VPNSessionResponse(BaseModel):
 class VPNSessionListResponse(BaseModel):
     """Схема ответа со списком VPN сессий."""
     items: list[VPNSessionResponse]
-    total: int
+    total: Optional[int] = None  # None, если запрошено include_total=false
     skip: int
     limit: int
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (keyset-пагинация)
 
 
 class VPNSessionDisconnect(BaseModel):
@@ -408,6 +410,21 @@ class AuditLogListResponse(BaseModel):
     limit: int
 
 
+class AuditLogDailyStat(BaseModel):
+    """Количество записей аудита за день по действию."""
+    day: date
+    action: str
+    entity_type: Optional[str] = None
+    count: int
+
+
+class AuditLogStatsResponse(BaseModel):
+    """Схема ответа с дневной сводкой журнала аудита."""
+    items: list[AuditLogDailyStat]
+    start_day: date
+    end_day: date
+
+
 # Схемы для статистики
 class StatsOverviewResponse(BaseModel):
     """Схема ответа с общей статистикой."""
@@ -566,35 +583,3 @@ class SetupWizardTestResponse(BaseModel):
     success: bool
     message: Optional[str] = None
 
-
-# Схемы для сопоставления пользователей
-class UserMappingBase(BaseModel):
-    """Базовая схема сопоставления пользователя."""
-    telegram_user_id: str
-    mikrotik_username: str
-
-
-class UserMappingCreate(UserMappingBase):
-    """Схема создания сопоставления пользователя."""
-    pass
-
-
-class UserMappingResponse(UserMappingBase):
-    """Схема ответа с данными сопоставления."""
-    id: str
-    is_active: bool
-    created_at: datetime
-    updated_at: datetime
-    telegram_user_full_name: Optional[str] = None
-    telegram_user_email: Optional[str] = None
-    telegram_user_phone: Optional[str] = None
-    
-    model_config = {"from_attributes": True}
-
-
-class UserMappingListResponse(BaseModel):
-    """Схема ответа со списком сопоставлений."""
-    items: list[UserMappingResponse]
-    total: int
-    skip: int
-    limit: int
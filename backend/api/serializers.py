@@ -0,0 +1,127 @@
+"""
+Преобразование ORM-объектов в схемы ответов API.
+
+Данные из БД доверенные, поэтому модели собираются через model_construct
+без повторной валидации полей.
+"""
+from datetime import datetime, timezone
+from operator import attrgetter
+from typing import Optional, List
+from pydantic import TypeAdapter
+from backend.api.schemas import UserResponse, VPNSessionResponse
+from backend.models.user import User
+from backend.models.user_setting import UserSetting
+from backend.models.vpn_session import VPNSession, VPNSessionStatus
+
+_USER_FIELDS = (
+    "id",
+    "telegram_id",
+    "full_name",
+    "phone",
+    "email",
+    "created_at",
+    "updated_at",
+    "approved_at",
+    "rejected_reason",
+)
+_get_user_fields = attrgetter(*_USER_FIELDS)
+
+_SESSION_FIELDS = (
+    "id",
+    "user_id",
+    "mikrotik_username",
+    "mikrotik_session_id",
+    "connected_at",
+    "confirmed_at",
+    "expires_at",
+    "reminder_sent_at",
+    "firewall_rule_id",
+    "created_at",
+    "updated_at",
+)
+_get_session_fields = attrgetter(*_SESSION_FIELDS)
+
+# Сериализаторы списков строятся один раз при импорте и переиспользуются list endpoints
+USER_LIST_ADAPTER = TypeAdapter(List[UserResponse])
+SESSION_LIST_ADAPTER = TypeAdapter(List[VPNSessionResponse])
+
+
+def ensure_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """
+    UI считает "активность" по разнице Date.now - last_seen.
+    Если отдавать naive datetime (без tz), браузер интерпретирует его как локальный часовой пояс,
+    что ломает вычисления (сервер хранит UTC).
+    Поэтому в API всегда отдаём UTC-aware datetime.
+    """
+    if not dt:
+        return None
+    if getattr(dt, "tzinfo", None) is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def user_to_dict(
+    user: User,
+    mikrotik_usernames: Optional[List[str]] = None,
+    user_settings: Optional[UserSetting] = None,
+) -> dict:
+    """
+    Собрать JSON-готовый словарь UserResponse (для ORJSONResponse без Pydantic).
+    user — ORM-объект User или строка get_users с теми же атрибутами.
+    """
+    data = dict(zip(_USER_FIELDS, _get_user_fields(user)))
+    data["status"] = user.status.value
+    data["mikrotik_usernames"] = mikrotik_usernames if mikrotik_usernames is not None else []
+    if user_settings is not None:
+        data["require_confirmation"] = getattr(user_settings, "require_confirmation", None)
+        data["firewall_rule_comment"] = user_settings.firewall_rule_comment
+    else:
+        data["require_confirmation"] = None
+        data["firewall_rule_comment"] = None
+    return data
+
+
+def user_to_response(
+    user: User,
+    mikrotik_usernames: Optional[List[str]] = None,
+    user_settings: Optional[UserSetting] = None,
+) -> UserResponse:
+    """Собрать UserResponse из пользователя (и, если переданы, его привязок и настроек)."""
+    return UserResponse.model_construct(**user_to_dict(user, mikrotik_usernames, user_settings))
+
+
+def session_to_dict(session: VPNSession) -> dict:
+    """Собрать JSON-готовый словарь VPNSessionResponse вместе с данными пользователя."""
+    data = dict(zip(_SESSION_FIELDS, _get_session_fields(session)))
+    data["status"] = session.status.value
+    data["mikrotik_last_seen_at"] = ensure_utc(session.last_seen_at)
+    data["user"] = user_to_dict(session.user) if session.user else None
+    return data
+
+
+def session_to_response(session: VPNSession) -> VPNSessionResponse:
+    """Собрать VPNSessionResponse из VPN сессии вместе с данными пользователя."""
+    data = session_to_dict(session)
+    if data["user"] is not None:
+        data["user"] = UserResponse.model_construct(**data["user"])
+    return VPNSessionResponse.model_construct(**data)
+
+
+def session_row_to_dict(row) -> dict:
+    """
+    Собрать JSON-готовый словарь VPNSessionResponse из строки get_active_vpn_session_rows
+    (только для активных сессий: status всегда "active").
+    """
+    data = {field: row[field] for field in _SESSION_FIELDS}
+    data["status"] = VPNSessionStatus.ACTIVE.value
+    data["mikrotik_last_seen_at"] = ensure_utc(row["last_seen_at"])
+    if row["user__id"] is None:
+        data["user"] = None
+    else:
+        user = {field: row[f"user__{field}"] for field in _USER_FIELDS}
+        user["status"] = row["user__status"].value
+        user["mikrotik_usernames"] = []
+        user["require_confirmation"] = None
+        user["firewall_rule_comment"] = None
+        data["user"] = user
+    return data
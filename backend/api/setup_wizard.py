@@ -3,10 +3,12 @@ API endpoints для мастера настройки (Setup Wizard).
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Body
 from sqlalchemy.orm import Session
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+import asyncio
+import time
 from backend.database import get_db
 from backend.api.dependencies import get_current_admin, get_current_super_admin
-from backend.api.i18n_dependencies import get_translate
+from backend.api.i18n_dependencies import get_translate, get_request_translate
 from backend.api.schemas import (
     SetupWizardStatusResponse,
     SetupWizardStepResponse,
@@ -27,11 +29,31 @@ from backend.services.mikrotik_config_service import test_mikrotik_config_connec
 from backend.services.mikrotik_config_service import get_active_mikrotik_config
 from backend.services.mikrotik_config_service import get_mikrotik_config_with_decrypted_password
 from backend.models.mikrotik_config import ConnectionType
+from backend.services.settings_service import get_setting_value
 from backend.services.mikrotik_service import test_mikrotik_connection
 from backend.models.admin import Admin
 
 router = APIRouter(prefix="/setup-wizard", tags=["setup-wizard"])
 
+# Token bucket для тестов подключения (Telegram API / SSH / RouterOS API).
+# Каждый тест — блокирующий сетевой вызов на несколько секунд, поэтому частые клики
+# в UI не должны занимать все воркеры. Ключ — id администратора.
+_TEST_BUCKETS: Dict[str, Tuple[float, float]] = {}  # admin_id -> (tokens, last_refill)
+_TEST_RATE_PER_SECOND = 0.3
+_TEST_BURST = 3
+
+
+def _allow_test_request(admin_id: str, rate: float = _TEST_RATE_PER_SECOND, burst: int = _TEST_BURST) -> bool:
+    """Списать токен из bucket администратора. False — лимит исчерпан."""
+    now = time.monotonic()
+    tokens, last = _TEST_BUCKETS.get(admin_id, (float(burst), now))
+    tokens = min(float(burst), tokens + (now - last) * rate)
+    if tokens < 1.0:
+        _TEST_BUCKETS[admin_id] = (tokens, now)
+        return False
+    _TEST_BUCKETS[admin_id] = (tokens - 1.0, now)
+    return True
+
 
 @router.get("/status", response_model=SetupWizardStatusResponse)
 async def get_setup_wizard_status_endpoint(
@@ -51,7 +73,6 @@ async def get_setup_wizard_steps_endpoint(
     request: Request,
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin),
-    t=Depends(get_translate),
 ):
     """
     Получить список всех шагов мастера настройки.
@@ -67,13 +88,13 @@ async def get_setup_wizard_step_endpoint(
     request: Request,
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin),
-    t=Depends(get_translate),
 ):
     """
     Получить информацию о конкретном шаге мастера настройки.
     """
     step = get_setup_wizard_step(step_id)
     if not step:
+        t = get_request_translate(request)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=t("error.not_found"),
@@ -94,8 +115,10 @@ async def complete_setup_wizard_step_endpoint(
     Завершить шаг мастера настройки и сохранить данные.
     Требуются права супер-администратора.
     """
-    # Преобразуем Pydantic модель в словарь
-    data_dict = step_data.model_dump(exclude_unset=True, exclude_none=True)
+    # Преобразуем Pydantic модель в словарь. Для пустого тела (например, шаг review)
+    # сериализацию пропускаем, иначе выгружаем только явно переданные поля.
+    fields_set = step_data.model_fields_set
+    data_dict = step_data.model_dump(include=fields_set, exclude_none=True) if fields_set else {}
     
     try:
         result = complete_setup_wizard_step(db, step_id, data_dict)
@@ -152,8 +175,8 @@ async def complete_setup_wizard_endpoint(
                 detail=result.get("message", "Not all required steps are completed"),
             )
         
-        # Получаем обновленный статус
-        status_data = get_setup_wizard_status(db)
+        # Статус уже вычислен сервисом при завершении шага review
+        status_data = result["status"]
         
         return {"message": t("setup_wizard.completed") or "Setup wizard completed successfully", "status": status_data}
     except Exception as e:
@@ -176,6 +199,12 @@ async def test_telegram_connection_endpoint(
     Если токен не указан в query параметре, использует сохраненный токен из настроек.
     Также можно передать токен в теле запроса как JSON: {"token": "..."}
     """
+    if not _allow_test_request(current_admin.id):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=t("error.too_many_requests"),
+        )
+
     # Проверяем, есть ли токен в query параметре
     if not token:
         # Пробуем получить из body запроса
@@ -187,7 +216,6 @@ async def test_telegram_connection_endpoint(
     
     # Если токен все еще не найден, получаем из настроек БД
     if not token:
-        from backend.services.settings_service import get_setting_value
         token = get_setting_value(db, "telegram_bot_token")
         if not token:
             return SetupWizardTestResponse(
@@ -229,6 +257,12 @@ async def test_mikrotik_connection_endpoint(
     Может принимать параметры подключения из тела запроса для тестирования перед сохранением.
     Если параметры не переданы, использует сохраненную конфигурацию.
     """
+    if not _allow_test_request(current_admin.id):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=t("error.too_many_requests"),
+        )
+
     # Пробуем получить параметры подключения из тела запроса (для тестирования перед сохранением)
     body = test_params
     if not body:
@@ -281,7 +315,9 @@ async def test_mikrotik_connection_endpoint(
             connection_type_enum = ConnectionType.SSH_PASSWORD
 
         ssh_key_path = body.get("ssh_key_path") or body.get("mikrotik_ssh_key_path")
-        success, error_message = test_mikrotik_connection(
+        # Подключение к роутеру блокирующее (SSH/RouterOS API) — выполняем вне event loop
+        success, error_message = await asyncio.to_thread(
+            test_mikrotik_connection,
             host=str(host).strip(),
             port=int(port),
             username=str(username).strip(),
@@ -310,7 +346,7 @@ async def test_mikrotik_connection_endpoint(
             )
         config_id = active_config.id
     
-    success, error_message = test_mikrotik_config_connection(db, config_id)
+    success, error_message = await asyncio.to_thread(test_mikrotik_config_connection, db, config_id)
     
     if success:
         return SetupWizardTestResponse(
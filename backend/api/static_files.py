@@ -0,0 +1,85 @@
+"""
+Раздача собранного фронтенда (SPA) через Starlette StaticFiles.
+"""
+import os
+import re
+from typing import Optional
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+from starlette.routing import Match, Mount
+from starlette.staticfiles import StaticFiles
+
+# API и служебные пути, которые фронтенд не обслуживает
+RESERVED_PATH_RE = re.compile(r"^(?:api|docs|redoc|openapi\.json|health)(?:/|$)")
+
+SPA_INDEX = "index.html"
+
+# Файлы Vite в /assets содержат хэш содержимого в имени и никогда не меняются
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class SPAStaticFiles(StaticFiles):
+    """
+    StaticFiles для SPA: неизвестные пути отдают index.html (клиентский роутинг),
+    HTML всегда с Cache-Control: no-store, чтобы новый bundle подхватывался сразу.
+    index.html держится в памяти и перечитывается только при изменении mtime (после сборки фронтенда).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._index_path = os.path.join(str(self.directory), SPA_INDEX)
+        self._index_mtime: Optional[int] = None
+        self._index_body: bytes = b""
+
+    def _index_response(self) -> Response:
+        """index.html из памяти (один stat на запрос вместо open/read в threadpool)."""
+        mtime = os.stat(self._index_path).st_mtime_ns
+        if mtime != self._index_mtime:
+            with open(self._index_path, "rb") as f:
+                self._index_body = f.read()
+            self._index_mtime = mtime
+        return Response(self._index_body, media_type="text/html", headers={"Cache-Control": "no-store"})
+
+    async def get_response(self, path: str, scope):
+        if path in ("", ".", SPA_INDEX):
+            return self._index_response()
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise
+        return self._index_response()
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if str(full_path).endswith(".html"):
+            response.headers["Cache-Control"] = "no-store"
+        return response
+
+
+class SPAMount(Mount):
+    """
+    Mount для SPAStaticFiles: забирает только GET/HEAD и не-служебные пути.
+    Остальное не совпадает с этим маршрутом, и роутер отвечает как без фронтенда:
+    405 для неверного метода API, redirect_slashes, 404 для неизвестных путей /api.
+    """
+
+    def matches(self, scope):
+        if scope["type"] == "http":
+            path = scope["path"]
+            root_path = scope.get("root_path", "")
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            if scope["method"] not in ("GET", "HEAD") or RESERVED_PATH_RE.match(path.lstrip("/")):
+                return Match.NONE, {}
+        return super().matches(scope)
+
+
+class CachedAssets(StaticFiles):
+    """StaticFiles для хэшированных bundle-файлов: кэшируются браузером на год."""
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
@@ -2,11 +2,20 @@
 API endpoints для управления пользователями.
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
+from datetime import datetime
 from typing import Optional
 from backend.database import get_db
 from backend.api.dependencies import get_current_admin
 from backend.api.i18n_dependencies import get_translate
+from backend.utils.pagination import encode_cursor, decode_cursor
+from backend.utils.response_cache import (
+    get_cached_response,
+    set_cached_response,
+    invalidate_cached_responses,
+)
+from backend.api.serializers import user_to_response, user_to_dict, USER_LIST_ADAPTER
 from backend.api.schemas import (
     UserResponse,
     UserUpdate,
@@ -14,16 +23,21 @@ from backend.api.schemas import (
 )
 from backend.services.user_service import (
     get_user_by_id,
+    get_user_by_id_cached,
     get_users,
+    user_sort_key,
     count_users,
     update_user,
     delete_user,
     change_user_status,
     get_user_settings,
+    get_user_settings_row,
+    get_users_settings,
     update_user_settings,
 )
 from backend.services.user_mikrotik_account_service import (
     get_user_mikrotik_usernames,
+    get_users_mikrotik_usernames,
     set_user_mikrotik_usernames,
 )
 from backend.models.user import UserStatus
@@ -31,14 +45,20 @@ from backend.models.admin import Admin
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+# Значение статуса из запроса -> enum (без исключений на неизвестных значениях)
+_USER_STATUS_MAP = {s.value: s for s in UserStatus}
+
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к БД не блокируют event loop.
 @router.get("", response_model=UserListResponse)
-async def list_users(
+def list_users(
     request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (вместо skip)"),
     status_filter: Optional[str] = Query(None, alias="status"),
     search: Optional[str] = Query(None),
+    include_total: bool = Query(True, description="Считать общее количество (total)"),
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin),
     t=Depends(get_translate),
@@ -47,53 +67,65 @@ async def list_users(
     Получить список пользователей с фильтрацией и поиском.
     """
     # Преобразуем строку статуса в enum
-    user_status = None
-    if status_filter:
+    user_status = _USER_STATUS_MAP.get(status_filter) if status_filter else None
+    if status_filter and user_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=t("validation.invalid_format"),
+        )
+    
+    after = None
+    if cursor:
         try:
-            user_status = UserStatus(status_filter)
+            after = decode_cursor(cursor, (datetime, str))
         except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=t("validation.invalid_format"),
             )
     
+    cache_key = f"users:list:{skip}:{limit}:{cursor}:{status_filter}:{search}:{include_total}"
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    
     users = get_users(
         db=db,
         skip=skip,
         limit=limit,
+        after=after,
         status=user_status,
         search=search,
     )
-    total = count_users(db=db, status=user_status)
+    total = None
+    if include_total:
+        # COUNT(*) не зависит от страницы — кэшируем отдельно от списка (с тем же TTL)
+        count_key = f"users:count:{status_filter}"
+        total = get_cached_response(count_key)
+        if total is None:
+            total = count_users(db=db, status=user_status)
+            set_cached_response(count_key, total)
     
-    # Преобразуем enum статуса в строку для каждого пользователя
-    items = []
-    for user in users:
-        mikrotik_usernames = get_user_mikrotik_usernames(db, user.id)
-        user_settings = get_user_settings(db, user.id)
-        user_dict = {
-            "id": user.id,
-            "telegram_id": user.telegram_id,
-            "full_name": user.full_name,
-            "phone": user.phone,
-            "email": user.email,
-            "status": user.status.value,
-            "created_at": user.created_at,
-            "updated_at": user.updated_at,
-            "approved_at": user.approved_at,
-            "rejected_reason": user.rejected_reason,
-            "mikrotik_usernames": mikrotik_usernames,
-            "require_confirmation": getattr(user_settings, "require_confirmation", None) if user_settings else None,
-            "firewall_rule_comment": user_settings.firewall_rule_comment if user_settings else None,
-        }
-        items.append(UserResponse(**user_dict))
+    # Привязки и настройки всей страницы — двумя запросами вместо двух на каждого пользователя
+    user_ids = [user.id for user in users]
+    mikrotik_usernames_by_user = get_users_mikrotik_usernames(db, user_ids)
+    settings_by_user = get_users_settings(db, user_ids)
+    items = [
+        user_to_response(user, mikrotik_usernames_by_user[user.id], settings_by_user.get(user.id))
+        for user in users
+    ]
     
-    return UserListResponse(
-        items=items,
-        total=total,
-        skip=skip,
-        limit=limit,
-    )
+    # Сериализуем сразу через orjson: ответ уже соответствует UserListResponse,
+    # повторная валидация и stdlib json FastAPI на больших страницах не нужны
+    content = {
+        "items": USER_LIST_ADAPTER.dump_python(items),
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": encode_cursor(*user_sort_key(users[-1])) if len(users) == limit else None,
+    }
+    set_cached_response(cache_key, content)
+    return ORJSONResponse(content)
 
 
 @router.get("/{user_id}", response_model=UserResponse)
@@ -107,7 +139,7 @@ async def get_user(
     """
     Получить информацию о конкретном пользователе.
     """
-    user = get_user_by_id(db, user_id)
+    user = get_user_by_id_cached(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -117,22 +149,7 @@ async def get_user(
     # Преобразуем enum статуса в строку
     mikrotik_usernames = get_user_mikrotik_usernames(db, user.id)
     user_settings = get_user_settings(db, user.id)
-    user_dict = {
-        "id": user.id,
-        "telegram_id": user.telegram_id,
-        "full_name": user.full_name,
-        "phone": user.phone,
-        "email": user.email,
-        "status": user.status.value,
-        "created_at": user.created_at,
-        "updated_at": user.updated_at,
-        "approved_at": user.approved_at,
-        "rejected_reason": user.rejected_reason,
-        "mikrotik_usernames": mikrotik_usernames,
-        "require_confirmation": getattr(user_settings, "require_confirmation", None) if user_settings else None,
-        "firewall_rule_comment": user_settings.firewall_rule_comment if user_settings else None,
-    }
-    return UserResponse(**user_dict)
+    return ORJSONResponse(user_to_dict(user, mikrotik_usernames, user_settings))
 
 
 @router.put("/{user_id}", response_model=UserResponse)
@@ -155,15 +172,12 @@ async def update_user_data(
         )
     
     # Преобразуем строку статуса в enum, если указана
-    user_status = None
-    if user_update.status:
-        try:
-            user_status = UserStatus(user_update.status)
-        except ValueError:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=t("validation.invalid_format"),
-            )
+    user_status = _USER_STATUS_MAP.get(user_update.status) if user_update.status else None
+    if user_update.status and user_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=t("validation.invalid_format"),
+        )
     
     updated_user = update_user(
         db=db,
@@ -185,25 +199,11 @@ async def update_user_data(
             set_user_mikrotik_usernames(db, user_id, user_update.mikrotik_usernames)
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    invalidate_cached_responses("users:", "vpn_sessions:")
 
     mikrotik_usernames = get_user_mikrotik_usernames(db, user_id)
     user_settings = get_user_settings(db, user_id)
-    user_dict = {
-        "id": updated_user.id,
-        "telegram_id": updated_user.telegram_id,
-        "full_name": updated_user.full_name,
-        "phone": updated_user.phone,
-        "email": updated_user.email,
-        "status": updated_user.status.value,
-        "created_at": updated_user.created_at,
-        "updated_at": updated_user.updated_at,
-        "approved_at": updated_user.approved_at,
-        "rejected_reason": updated_user.rejected_reason,
-        "mikrotik_usernames": mikrotik_usernames,
-        "require_confirmation": getattr(user_settings, "require_confirmation", None) if user_settings else None,
-        "firewall_rule_comment": user_settings.firewall_rule_comment if user_settings else None,
-    }
-    return UserResponse(**user_dict)
+    return ORJSONResponse(user_to_dict(updated_user, mikrotik_usernames, user_settings))
 
 
 @router.delete("/{user_id}")
@@ -231,6 +231,7 @@ async def delete_user_endpoint(
             detail=t("user.not_found"),
         )
     
+    invalidate_cached_responses("users:", "vpn_sessions:")
     return {"message": t("user.deleted")}
 
 
@@ -246,9 +247,8 @@ async def change_user_status_endpoint(
     """
     Изменить статус пользователя.
     """
-    try:
-        status_enum = UserStatus(new_status)
-    except ValueError:
+    status_enum = _USER_STATUS_MAP.get(new_status)
+    if status_enum is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=t("validation.invalid_format"),
@@ -267,19 +267,8 @@ async def change_user_status_endpoint(
             detail=t("user.not_found"),
         )
     
-    user_dict = {
-        "id": updated_user.id,
-        "telegram_id": updated_user.telegram_id,
-        "full_name": updated_user.full_name,
-        "phone": updated_user.phone,
-        "email": updated_user.email,
-        "status": updated_user.status.value,
-        "created_at": updated_user.created_at,
-        "updated_at": updated_user.updated_at,
-        "approved_at": updated_user.approved_at,
-        "rejected_reason": updated_user.rejected_reason,
-    }
-    return UserResponse(**user_dict)
+    invalidate_cached_responses("users:", "vpn_sessions:")
+    return ORJSONResponse(user_to_dict(updated_user))
 
 
 @router.get("/{user_id}/settings")
@@ -293,15 +282,15 @@ async def get_user_settings_endpoint(
     """
     Получить настройки пользователя.
     """
-    user = get_user_by_id(db, user_id)
-    if not user:
+    # Пользователь и его настройки — одним запросом (LEFT JOIN)
+    row = get_user_settings_row(db, user_id)
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=t("user.not_found"),
         )
     
-    user_settings = get_user_settings(db, user_id)
-    if not user_settings:
+    if row["settings_id"] is None:
         # Возвращаем настройки по умолчанию
         return {
             "user_id": user_id,
@@ -313,12 +302,12 @@ async def get_user_settings_endpoint(
         }
     
     return {
-        "user_id": user_settings.user_id,
-        "firewall_rule_comment": user_settings.firewall_rule_comment,
-        "require_confirmation": getattr(user_settings, "require_confirmation", False),
-        "reminder_interval_hours": user_settings.reminder_interval_hours,
-        "session_duration_hours": getattr(user_settings, "session_duration_hours", 24),
-        "custom_notification_text": user_settings.custom_notification_text,
+        "user_id": row["user_id"],
+        "firewall_rule_comment": row["firewall_rule_comment"],
+        "require_confirmation": row["require_confirmation"],
+        "reminder_interval_hours": row["reminder_interval_hours"],
+        "session_duration_hours": row["session_duration_hours"],
+        "custom_notification_text": row["custom_notification_text"],
     }
 
 
@@ -338,13 +327,7 @@ async def update_user_settings_endpoint(
     """
     Обновить настройки пользователя.
     """
-    user = get_user_by_id(db, user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=t("user.not_found"),
-        )
-    
+    # Один upsert: существование пользователя проверяется в том же запросе
     updated_settings = update_user_settings(
         db=db,
         user_id=user_id,
@@ -357,18 +340,19 @@ async def update_user_settings_endpoint(
     
     if not updated_settings:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=t("error.internal"),
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=t("user.not_found"),
         )
     
+    invalidate_cached_responses("users:", "vpn_sessions:")
     return {
         "message": t("settings.updated"),
         "settings": {
             "user_id": updated_settings.user_id,
             "firewall_rule_comment": updated_settings.firewall_rule_comment,
-            "require_confirmation": getattr(updated_settings, "require_confirmation", False),
+            "require_confirmation": bool(updated_settings.require_confirmation),
             "reminder_interval_hours": updated_settings.reminder_interval_hours,
-            "session_duration_hours": getattr(updated_settings, "session_duration_hours", 24),
+            "session_duration_hours": updated_settings.session_duration_hours,
             "custom_notification_text": updated_settings.custom_notification_text,
         },
     }
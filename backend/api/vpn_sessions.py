@@ -2,25 +2,38 @@
 API endpoints для управления VPN сессиями.
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Body
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
+from datetime import datetime
 from typing import Optional
-from datetime import datetime, timezone
 from backend.database import get_db
 from backend.api.dependencies import get_current_admin
 from backend.api.i18n_dependencies import get_translate
+from backend.utils.pagination import encode_cursor, decode_cursor
+from backend.utils.response_cache import (
+    get_cached_response,
+    set_cached_response,
+    invalidate_cached_responses,
+)
+from backend.api.serializers import (
+    session_to_response,
+    session_to_dict,
+    session_row_to_dict,
+    SESSION_LIST_ADAPTER,
+)
 from backend.api.schemas import (
     VPNSessionCreate,
     VPNSessionResponse,
     VPNSessionListResponse,
     VPNSessionDisconnect,
     VPNSessionExtend,
-    UserResponse,
 )
 from backend.services.vpn_session_service import (
     get_vpn_session_by_id,
     create_vpn_session,
     get_vpn_sessions,
-    get_active_vpn_sessions,
+    vpn_session_sort_key,
+    get_active_vpn_session_rows,
     count_vpn_sessions,
     disconnect_vpn_session,
     expire_vpn_session,
@@ -35,27 +48,20 @@ from backend.models.admin import Admin
 
 router = APIRouter(prefix="/vpn-sessions", tags=["vpn-sessions"])
 
-def _ensure_utc(dt: datetime | None) -> datetime | None:
-    """
-    UI считает "активность" по разнице Date.now - last_seen.
-    Если отдавать naive datetime (без tz), браузер интерпретирует его как локальный часовой пояс,
-    что ломает вычисления (сервер хранит UTC).
-    Поэтому в API всегда отдаём UTC-aware datetime.
-    """
-    if not dt:
-        return None
-    if getattr(dt, "tzinfo", None) is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
+# Значение статуса из запроса -> enum (без исключений на неизвестных значениях)
+_SESSION_STATUS_MAP = {s.value: s for s in VPNSessionStatus}
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к БД не блокируют event loop.
 @router.get("", response_model=VPNSessionListResponse)
-async def list_vpn_sessions(
+def list_vpn_sessions(
     request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (вместо skip)"),
     status_filter: Optional[str] = Query(None, alias="status"),
     user_id: Optional[str] = Query(None),
+    include_total: bool = Query(True, description="Считать общее количество (total)"),
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin),
     t=Depends(get_translate),
@@ -64,10 +70,17 @@ async def list_vpn_sessions(
     Получить список VPN сессий с фильтрацией.
     """
     # Преобразуем строку статуса в enum
-    session_status = None
-    if status_filter:
+    session_status = _SESSION_STATUS_MAP.get(status_filter) if status_filter else None
+    if status_filter and session_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=t("validation.invalid_format"),
+        )
+    
+    after = None
+    if cursor:
         try:
-            session_status = VPNSessionStatus(status_filter)
+            after = decode_cursor(cursor, (int, datetime, str))
         except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -78,53 +91,35 @@ async def list_vpn_sessions(
         db=db,
         skip=skip,
         limit=limit,
+        after=after,
         status=session_status,
         user_id=user_id,
     )
-    total = count_vpn_sessions(db=db, status=session_status, user_id=user_id)
+    total = None
+    if include_total:
+        # COUNT(*) не зависит от страницы — кэшируем отдельно от списка (с тем же TTL)
+        count_key = f"vpn_sessions:count:{status_filter}:{user_id}"
+        total = get_cached_response(count_key)
+        if total is None:
+            total = count_vpn_sessions(db=db, status=session_status, user_id=user_id)
+            set_cached_response(count_key, total)
     
     # Формируем ответы с информацией о пользователях
-    items = []
-    for session in sessions:
-        session_dict = {
-            "id": session.id,
-            "user_id": session.user_id,
-            "mikrotik_username": session.mikrotik_username,
-            "mikrotik_session_id": getattr(session, "mikrotik_session_id", None),
-            "mikrotik_last_seen_at": _ensure_utc(getattr(session, "last_seen_at", None)),
-            "status": session.status.value,
-            "connected_at": session.connected_at,
-            "confirmed_at": session.confirmed_at,
-            "expires_at": session.expires_at,
-            "reminder_sent_at": session.reminder_sent_at,
-            "firewall_rule_id": session.firewall_rule_id,
-            "created_at": session.created_at,
-            "updated_at": session.updated_at,
-            "user": UserResponse(**{
-                "id": session.user.id,
-                "telegram_id": session.user.telegram_id,
-                "full_name": session.user.full_name,
-                "phone": session.user.phone,
-                "email": session.user.email,
-                "status": session.user.status.value,
-                "created_at": session.user.created_at,
-                "updated_at": session.user.updated_at,
-                "approved_at": session.user.approved_at,
-                "rejected_reason": session.user.rejected_reason,
-            }) if session.user else None,
-        }
-        items.append(VPNSessionResponse(**session_dict))
+    items = [session_to_response(session) for session in sessions]
     
-    return VPNSessionListResponse(
-        items=items,
-        total=total,
-        skip=skip,
-        limit=limit,
-    )
+    # Сериализуем сразу через orjson: ответ уже соответствует VPNSessionListResponse
+    return ORJSONResponse({
+        "items": SESSION_LIST_ADAPTER.dump_python(items),
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": encode_cursor(*vpn_session_sort_key(sessions[-1])) if len(sessions) == limit else None,
+    })
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к БД не блокируют event loop.
 @router.get("/active", response_model=VPNSessionListResponse)
-async def get_active_vpn_sessions_endpoint(
+def get_active_vpn_sessions_endpoint(
     request: Request,
     db: Session = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin),
@@ -133,45 +128,21 @@ async def get_active_vpn_sessions_endpoint(
     """
     Получить все активные VPN сессии.
     """
-    sessions = get_active_vpn_sessions(db=db)
+    cached = get_cached_response("vpn_sessions:active")
+    if cached is not None:
+        return ORJSONResponse(cached)
     
-    items = []
-    for session in sessions:
-        session_dict = {
-            "id": session.id,
-            "user_id": session.user_id,
-            "mikrotik_username": session.mikrotik_username,
-            "mikrotik_session_id": getattr(session, "mikrotik_session_id", None),
-            "mikrotik_last_seen_at": _ensure_utc(getattr(session, "last_seen_at", None)),
-            "status": session.status.value,
-            "connected_at": session.connected_at,
-            "confirmed_at": session.confirmed_at,
-            "expires_at": session.expires_at,
-            "reminder_sent_at": session.reminder_sent_at,
-            "firewall_rule_id": session.firewall_rule_id,
-            "created_at": session.created_at,
-            "updated_at": session.updated_at,
-            "user": UserResponse(**{
-                "id": session.user.id,
-                "telegram_id": session.user.telegram_id,
-                "full_name": session.user.full_name,
-                "phone": session.user.phone,
-                "email": session.user.email,
-                "status": session.user.status.value,
-                "created_at": session.user.created_at,
-                "updated_at": session.user.updated_at,
-                "approved_at": session.user.approved_at,
-                "rejected_reason": session.user.rejected_reason,
-            }) if session.user else None,
-        }
-        items.append(VPNSessionResponse(**session_dict))
+    # Строки без ORM-объектов и Pydantic-моделей: сразу словари для orjson
+    items = [session_row_to_dict(row) for row in get_active_vpn_session_rows(db)]
     
-    return VPNSessionListResponse(
-        items=items,
-        total=len(items),
-        skip=0,
-        limit=len(items),
-    )
+    content = {
+        "items": items,
+        "total": len(items),
+        "skip": 0,
+        "limit": len(items),
+    }
+    set_cached_response("vpn_sessions:active", content)
+    return ORJSONResponse(content)
 
 
 @router.get("/{session_id}", response_model=VPNSessionResponse)
@@ -192,38 +163,12 @@ async def get_vpn_session(
             detail=t("vpn.session.not_found"),
         )
     
-    session_dict = {
-        "id": vpn_session.id,
-        "user_id": vpn_session.user_id,
-        "mikrotik_username": vpn_session.mikrotik_username,
-        "mikrotik_session_id": getattr(vpn_session, "mikrotik_session_id", None),
-        "mikrotik_last_seen_at": _ensure_utc(getattr(vpn_session, "last_seen_at", None)),
-        "status": vpn_session.status.value,
-        "connected_at": vpn_session.connected_at,
-        "confirmed_at": vpn_session.confirmed_at,
-        "expires_at": vpn_session.expires_at,
-        "reminder_sent_at": vpn_session.reminder_sent_at,
-        "firewall_rule_id": vpn_session.firewall_rule_id,
-        "created_at": vpn_session.created_at,
-        "updated_at": vpn_session.updated_at,
-        "user": UserResponse(**{
-            "id": vpn_session.user.id,
-            "telegram_id": vpn_session.user.telegram_id,
-            "full_name": vpn_session.user.full_name,
-            "phone": vpn_session.user.phone,
-            "email": vpn_session.user.email,
-            "status": vpn_session.user.status.value,
-            "created_at": vpn_session.user.created_at,
-            "updated_at": vpn_session.user.updated_at,
-            "approved_at": vpn_session.user.approved_at,
-            "rejected_reason": vpn_session.user.rejected_reason,
-        }) if vpn_session.user else None,
-    }
-    return VPNSessionResponse(**session_dict)
+    return ORJSONResponse(session_to_dict(vpn_session))
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.post("", response_model=VPNSessionResponse, status_code=status.HTTP_201_CREATED)
-async def create_vpn_session_endpoint(
+def create_vpn_session_endpoint(
     session_data: VPNSessionCreate,
     request: Request,
     db: Session = Depends(get_db),
@@ -262,36 +207,13 @@ async def create_vpn_session_endpoint(
                 detail=error_message,
             )
     
-    session_dict = {
-        "id": vpn_session.id,
-        "user_id": vpn_session.user_id,
-        "mikrotik_username": vpn_session.mikrotik_username,
-        "status": vpn_session.status.value,
-        "connected_at": vpn_session.connected_at,
-        "confirmed_at": vpn_session.confirmed_at,
-        "expires_at": vpn_session.expires_at,
-        "reminder_sent_at": vpn_session.reminder_sent_at,
-        "firewall_rule_id": vpn_session.firewall_rule_id,
-        "created_at": vpn_session.created_at,
-        "updated_at": vpn_session.updated_at,
-        "user": UserResponse(**{
-            "id": vpn_session.user.id,
-            "telegram_id": vpn_session.user.telegram_id,
-            "full_name": vpn_session.user.full_name,
-            "phone": vpn_session.user.phone,
-            "email": vpn_session.user.email,
-            "status": vpn_session.user.status.value,
-            "created_at": vpn_session.user.created_at,
-            "updated_at": vpn_session.user.updated_at,
-            "approved_at": vpn_session.user.approved_at,
-            "rejected_reason": vpn_session.user.rejected_reason,
-        }) if vpn_session.user else None,
-    }
-    return VPNSessionResponse(**session_dict)
+    invalidate_cached_responses("vpn_sessions:")
+    return ORJSONResponse(session_to_dict(vpn_session), status_code=status.HTTP_201_CREATED)
 
 
+# Синхронный handler: FastAPI выполняет его в threadpool, и запросы к MikroTik не блокируют event loop.
 @router.post("/{session_id}/disconnect", response_model=VPNSessionResponse)
-async def disconnect_vpn_session_endpoint(
+def disconnect_vpn_session_endpoint(
     session_id: str,
     request: Request,
     # В UI запрос отправляется без body, поэтому делаем его необязательным
@@ -310,32 +232,8 @@ async def disconnect_vpn_session_endpoint(
             detail=t("vpn.session.not_found"),
         )
     
-    session_dict = {
-        "id": vpn_session.id,
-        "user_id": vpn_session.user_id,
-        "mikrotik_username": vpn_session.mikrotik_username,
-        "status": vpn_session.status.value,
-        "connected_at": vpn_session.connected_at,
-        "confirmed_at": vpn_session.confirmed_at,
-        "expires_at": vpn_session.expires_at,
-        "reminder_sent_at": vpn_session.reminder_sent_at,
-        "firewall_rule_id": vpn_session.firewall_rule_id,
-        "created_at": vpn_session.created_at,
-        "updated_at": vpn_session.updated_at,
-        "user": UserResponse(**{
-            "id": vpn_session.user.id,
-            "telegram_id": vpn_session.user.telegram_id,
-            "full_name": vpn_session.user.full_name,
-            "phone": vpn_session.user.phone,
-            "email": vpn_session.user.email,
-            "status": vpn_session.user.status.value,
-            "created_at": vpn_session.user.created_at,
-            "updated_at": vpn_session.user.updated_at,
-            "approved_at": vpn_session.user.approved_at,
-            "rejected_reason": vpn_session.user.rejected_reason,
-        }) if vpn_session.user else None,
-    }
-    return VPNSessionResponse(**session_dict)
+    invalidate_cached_responses("vpn_sessions:")
+    return ORJSONResponse(session_to_dict(vpn_session))
 
 
 @router.post("/{session_id}/extend", response_model=VPNSessionResponse)
@@ -364,29 +262,5 @@ async def extend_vpn_session_endpoint(
             detail=t("vpn.session.not_found"),
         )
     
-    session_dict = {
-        "id": vpn_session.id,
-        "user_id": vpn_session.user_id,
-        "mikrotik_username": vpn_session.mikrotik_username,
-        "status": vpn_session.status.value,
-        "connected_at": vpn_session.connected_at,
-        "confirmed_at": vpn_session.confirmed_at,
-        "expires_at": vpn_session.expires_at,
-        "reminder_sent_at": vpn_session.reminder_sent_at,
-        "firewall_rule_id": vpn_session.firewall_rule_id,
-        "created_at": vpn_session.created_at,
-        "updated_at": vpn_session.updated_at,
-        "user": UserResponse(**{
-            "id": vpn_session.user.id,
-            "telegram_id": vpn_session.user.telegram_id,
-            "full_name": vpn_session.user.full_name,
-            "phone": vpn_session.user.phone,
-            "email": vpn_session.user.email,
-            "status": vpn_session.user.status.value,
-            "created_at": vpn_session.user.created_at,
-            "updated_at": vpn_session.user.updated_at,
-            "approved_at": vpn_session.user.approved_at,
-            "rejected_reason": vpn_session.user.rejected_reason,
-        }) if vpn_session.user else None,
-    }
-    return VPNSessionResponse(**session_dict)
+    invalidate_cached_responses("vpn_sessions:")
+    return ORJSONResponse(session_to_dict(vpn_session))
@@ -1,7 +1,7 @@
 """
 Модуль для работы с базой данных.
 """
-from .database import get_db, init_db, engine, SessionLocal
+from .database import get_db, init_db, warm_pool, engine, SessionLocal
 from .base import Base
 
-__all__ = ["get_db", "init_db", "engine", "SessionLocal", "Base"]
+__all__ = ["get_db", "init_db", "warm_pool", "engine", "SessionLocal", "Base"]
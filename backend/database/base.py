@@ -11,6 +11,7 @@ from backend.models import (
     Setting,
     UserSetting,
     AuditLog,
+    AuditLogDaily,
     UserMikrotikAccount,
 )
 
@@ -1,16 +1,28 @@
 """
 Конфигурация и работа с базой данных SQLite.
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
-from typing import Generator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generator, List
+import logging
 import os
 from config.settings import settings
 
 
+# Размер LRU-кэша скомпилированных SQL-выражений (по умолчанию в SQLAlchemy 500).
+# Часто опрашиваемые агрегаты статистики и списки не должны из него вытесняться.
+QUERY_CACHE_SIZE = 1200
+
+# Пул соединений: запросы API и планировщика идут пачками, а операции с MikroTik (SSH/API)
+# могут занимать секунды. Пула по умолчанию (5 + 10) не хватает, и потоки ждут соединение.
+POOL_SIZE = 20
+POOL_MAX_OVERFLOW = 10
+
+logger = logging.getLogger(__name__)
+
 # Создание движка базы данных
-# Для SQLite используем StaticPool для совместимости с asyncio (если потребуется)
 if settings.DATABASE_URL.startswith("sqlite"):
     # Создаем директорию для базы данных, если её нет
     db_path = settings.DATABASE_URL.replace("sqlite:///", "")
@@ -18,15 +30,55 @@ if settings.DATABASE_URL.startswith("sqlite"):
     if db_dir and not os.path.exists(db_dir):
         os.makedirs(db_dir, exist_ok=True)
     
+    # In-memory БД существует только в рамках одного соединения — для нее нужен StaticPool.
+    # Файловой БД даем обычный пул: синхронные endpoints выполняются в threadpool FastAPI,
+    # и каждому потоку нужно собственное соединение, а не одно общее на все сессии.
+    sqlite_pool_kwargs = (
+        {"poolclass": StaticPool}
+        if ":memory:" in settings.DATABASE_URL or db_path == ""
+        else {"pool_size": POOL_SIZE, "max_overflow": POOL_MAX_OVERFLOW}
+    )
     engine = create_engine(
         settings.DATABASE_URL,
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
+        query_cache_size=QUERY_CACHE_SIZE,
+        pool_pre_ping=True,
         echo=settings.DEBUG,
+        **sqlite_pool_kwargs,
+    )
+
+    # Настройки соединения SQLite: WAL позволяет читать во время записи,
+    # synchronous=NORMAL в режиме WAL не делает fsync на каждый commit,
+    # busy_timeout ждет освобождения блокировки вместо немедленной ошибки "database is locked".
+    SQLITE_PRAGMAS = (
+        # Действует только для новой БД (до создания таблиц); существующую переводит полный VACUUM
+        # в optimize_database. Дальше свободные страницы возвращаются через incremental_vacuum.
+        "PRAGMA auto_vacuum=INCREMENTAL",
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA cache_size=-65536",
     )
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
 else:
+    # Явный размер пула и проверка соединений: сетевые СУБД закрывают простаивающие соединения
     engine = create_engine(
         settings.DATABASE_URL,
+        query_cache_size=QUERY_CACHE_SIZE,
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_recycle=1800,
+        pool_pre_ping=True,
         echo=settings.DEBUG,
     )
 
@@ -34,6 +86,41 @@ else:
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def warm_pool(size: int = settings.DB_POOL_WARM) -> None:
+    """
+    Заранее открыть соединения пула (параллельно), чтобы первые запросы после старта
+    не тратили время на установку соединений и PRAGMA.
+    """
+    pool_size = getattr(engine.pool, "size", None)
+    if callable(pool_size):
+        size = min(size, pool_size())
+    else:
+        # StaticPool (in-memory) держит одно соединение
+        size = min(size, 1)
+    if size <= 0:
+        return
+
+    def _open_connection(_):
+        connection = engine.connect()
+        try:
+            connection.exec_driver_sql("SELECT 1")
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    # Соединения открываются одновременно и только затем возвращаются в пул,
+    # иначе пул отдавал бы одно и то же соединение
+    with ThreadPoolExecutor(max_workers=size) as executor:
+        futures = [executor.submit(_open_connection, i) for i in range(size)]
+    for future in futures:
+        if future.exception() is None:
+            future.result().close()
+    for future in futures:
+        if future.exception() is not None:
+            raise future.exception()
+
+
 def get_db() -> Generator[Session, None, None]:
     """
     Генератор для получения сессии базы данных.
@@ -42,15 +129,96 @@ def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
     try:
         yield db
+    except Exception:
+        # Возвращаем соединение в пул без незавершенной транзакции
+        db.rollback()
+        raise
     finally:
         db.close()
 
 
+# Внешний (content='users') FTS5-индекс по имени/телефону/email с триггерами синхронизации.
+# users.id — строковый UUID, поэтому индекс привязан к неявному rowid таблицы.
+USERS_FTS_SCHEMA_SQL = """
+BEGIN;
+CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+    full_name, phone, email, content='users', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+    INSERT INTO users_fts(rowid, full_name, phone, email)
+    VALUES (new.rowid, new.full_name, new.phone, new.email);
+END;
+CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+    INSERT INTO users_fts(users_fts, rowid, full_name, phone, email)
+    VALUES ('delete', old.rowid, old.full_name, old.phone, old.email);
+END;
+CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE ON users BEGIN
+    INSERT INTO users_fts(users_fts, rowid, full_name, phone, email)
+    VALUES ('delete', old.rowid, old.full_name, old.phone, old.email);
+    INSERT INTO users_fts(rowid, full_name, phone, email)
+    VALUES (new.rowid, new.full_name, new.phone, new.email);
+END;
+INSERT INTO users_fts(users_fts) VALUES ('rebuild');
+COMMIT;
+"""
+
+
+# Функция триггера updated_at для PostgreSQL
+PG_SET_UPDATED_AT_SQL = """
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _updated_at_tables(base):
+    """Таблицы, в которых updated_at выставляет триггер БД (server_onupdate у TimestampMixin)."""
+    return [
+        table for table in base.metadata.sorted_tables
+        if "updated_at" in table.c and table.c.updated_at.server_onupdate is not None
+    ]
+
+
+def _sqlite_updated_at_trigger_sql(table) -> str:
+    """
+    AFTER UPDATE триггер SQLite: updated_at = CURRENT_TIMESTAMP, если изменилась хотя бы одна
+    колонка, а сам updated_at в UPDATE не задан явно. Пересоздается при каждом запуске,
+    чтобы список колонок в WHEN совпадал с текущей схемой.
+    """
+    name = table.name
+    changed = " OR ".join(
+        f"NEW.{col.name} IS NOT OLD.{col.name}"
+        for col in table.columns
+        if col.name not in ("id", "created_at", "updated_at")
+    )
+    return (
+        f"DROP TRIGGER IF EXISTS trg_{name}_updated_at;\n"
+        f"CREATE TRIGGER trg_{name}_updated_at AFTER UPDATE ON {name} FOR EACH ROW "
+        f"WHEN NEW.updated_at IS OLD.updated_at AND ({changed}) BEGIN "
+        f"UPDATE {name} SET updated_at = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid; END;"
+    )
+
+
+def _run_sqlite_batch(con, statements: List[str]) -> None:
+    """Выполнить пакет SQL одной транзакцией: при ошибке откатывается весь пакет."""
+    if not statements:
+        return
+    try:
+        con.executescript("BEGIN;\n" + "\n".join(statements) + "\nCOMMIT;")
+    except Exception:
+        con.rollback()
+        raise
+
+
 def init_db() -> None:
     """
     Инициализация базы данных: создание всех таблиц.
     """
     from backend.database.base import Base
+    from backend.models.vpn_session import LIVE_VPN_SESSION_STATUS_SQL
     
     # Создаем директорию для базы данных, если её нет
     if settings.DATABASE_URL.startswith("sqlite"):
@@ -62,45 +230,143 @@ def init_db() -> None:
     # Создаем все таблицы
     Base.metadata.create_all(bind=engine)
     # Лёгкая миграция для SQLite (create_all не добавляет новые колонки)
-    try:
-        if settings.DATABASE_URL.startswith("sqlite"):
-            import sqlite3
+    if settings.DATABASE_URL.startswith("sqlite"):
+        import sqlite3
+
+        db_path = settings.DATABASE_URL.replace("sqlite:///", "")
+        con = sqlite3.connect(db_path)
+        try:
+            cur = con.cursor()
+            # WAL переключается вне транзакции и сохраняется в файле БД
+            cur.execute("PRAGMA journal_mode=WAL;")
+            cur.execute("PRAGMA synchronous=NORMAL;")
 
-            db_path = settings.DATABASE_URL.replace("sqlite:///", "")
-            con = sqlite3.connect(db_path)
+            # Сначала только читаем схему, затем применяем изменения пакетами
+            # (транзакция и fsync на пакет вместо commit после каждого ALTER/UPDATE)
+            cols = [r[1] for r in cur.execute("PRAGMA table_info(vpn_sessions);").fetchall()]
+            user_setting_cols = [r[1] for r in cur.execute("PRAGMA table_info(user_settings);").fetchall()]
+            mt_cols = [r[1] for r in cur.execute("PRAGMA table_info(mikrotik_configs);").fetchall()]
+
+            # Обязательная часть: колонки, без которых модели не совпадают со схемой,
+            # и триггеры updated_at. Ошибка здесь останавливает запуск.
+            schema: List[str] = []
+            if "mikrotik_session_id" not in cols:
+                schema.append("ALTER TABLE vpn_sessions ADD COLUMN mikrotik_session_id VARCHAR(64);")
+            if "last_seen_at" not in cols:
+                schema.append("ALTER TABLE vpn_sessions ADD COLUMN last_seen_at DATETIME;")
+            if "require_confirmation" not in user_setting_cols:
+                schema.append("ALTER TABLE user_settings ADD COLUMN require_confirmation BOOLEAN NOT NULL DEFAULT 0;")
+            if "session_duration_hours" not in user_setting_cols:
+                schema.append("ALTER TABLE user_settings ADD COLUMN session_duration_hours INTEGER NOT NULL DEFAULT 24;")
+            if "password_fp" not in mt_cols:
+                schema.append("ALTER TABLE mikrotik_configs ADD COLUMN password_fp BLOB;")
+            if "config_version" not in mt_cols:
+                schema.append("ALTER TABLE mikrotik_configs ADD COLUMN config_version INTEGER NOT NULL DEFAULT 1;")
+            # updated_at выставляется триггерами (ORM onupdate — запасной вариант)
+            schema.extend(_sqlite_updated_at_trigger_sql(table) for table in _updated_at_tables(Base))
             try:
-                cur = con.cursor()
-                cols = [r[1] for r in cur.execute("PRAGMA table_info(vpn_sessions);").fetchall()]
-                if "mikrotik_session_id" not in cols:
-                    cur.execute("ALTER TABLE vpn_sessions ADD COLUMN mikrotik_session_id VARCHAR(64);")
-                    con.commit()
-                if "last_seen_at" not in cols:
-                    cur.execute("ALTER TABLE vpn_sessions ADD COLUMN last_seen_at DATETIME;")
-                    con.commit()
-
-                user_setting_cols = [r[1] for r in cur.execute("PRAGMA table_info(user_settings);").fetchall()]
-                if "require_confirmation" not in user_setting_cols:
-                    cur.execute("ALTER TABLE user_settings ADD COLUMN require_confirmation BOOLEAN NOT NULL DEFAULT 0;")
-                    con.commit()
-                if "session_duration_hours" not in user_setting_cols:
-                    cur.execute("ALTER TABLE user_settings ADD COLUMN session_duration_hours INTEGER NOT NULL DEFAULT 24;")
-                    con.commit()
+                _run_sqlite_batch(con, schema)
+            except Exception:
+                logger.exception("Не удалось применить миграцию схемы SQLite (%s)", db_path)
+                raise
+
+            # Необязательная часть: каждый пакет в своей транзакции, ошибка одного
+            # не откатывает остальные и не останавливает запуск
+            optional = []
+
+            # Индексы для keyset-пагинации (create_all не добавляет индексы в существующие таблицы)
+            optional.append(("индексы списков", [
+                "CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id);",
+                "CREATE INDEX IF NOT EXISTS ix_vpn_sessions_created_at_id ON vpn_sessions (created_at, id);",
+                "CREATE INDEX IF NOT EXISTS ix_vpn_sessions_active ON vpn_sessions (created_at) WHERE status = 'ACTIVE';",
+                # Составные индексы под фильтры списков: равенство по ведущим колонкам,
+                # ORDER BY created_at, id обслуживается индексом без отдельной сортировки
+                "CREATE INDEX IF NOT EXISTS ix_users_status_created_at_id ON users (status, created_at, id);",
+                "CREATE INDEX IF NOT EXISTS ix_vpn_sessions_status_created_at_id ON vpn_sessions (status, created_at, id);",
+                "CREATE INDEX IF NOT EXISTS ix_vpn_sessions_user_status_created_at_id "
+                "ON vpn_sessions (user_id, status, created_at, id);",
+                "CREATE INDEX IF NOT EXISTS ix_vpn_sessions_status_expires_at ON vpn_sessions (status, expires_at);",
+                "CREATE INDEX IF NOT EXISTS ix_vpn_sessions_username_live "
+                f"ON vpn_sessions (mikrotik_username) WHERE {LIVE_VPN_SESSION_STATUS_SQL};",
+            ]))
+
+            # Журнал аудита: составные индексы (фильтр, created_at) вместо одиночных по колонкам
+            optional.append(("индексы журнала аудита", [
+                "CREATE INDEX IF NOT EXISTS ix_audit_logs_created_at ON audit_logs (created_at);",
+                "CREATE INDEX IF NOT EXISTS ix_audit_logs_action_created_at ON audit_logs (action, created_at);",
+                "CREATE INDEX IF NOT EXISTS ix_audit_logs_user_created_at ON audit_logs (user_id, created_at);",
+                "CREATE INDEX IF NOT EXISTS ix_audit_logs_admin_created_at ON audit_logs (admin_id, created_at);",
+                "CREATE INDEX IF NOT EXISTS ix_audit_logs_entity_created_at "
+                "ON audit_logs (entity_type, entity_id, created_at);",
+                "DROP INDEX IF EXISTS ix_audit_logs_action;",
+                "DROP INDEX IF EXISTS ix_audit_logs_user_id;",
+                "DROP INDEX IF EXISTS ix_audit_logs_admin_id;",
+            ]))
+
+            # Legacy-таблица user_mappings (1:1) заменена на user_mikrotik_accounts:
+            # переносим оставшиеся сопоставления и удаляем таблицу
+            if cur.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='user_mappings';"
+            ).fetchone() is not None:
+                optional.append(("перенос user_mappings", [
+                    "INSERT OR IGNORE INTO user_mikrotik_accounts "
+                    "(id, user_id, mikrotik_username, is_active, created_at, updated_at) "
+                    "SELECT id, telegram_user_id, mikrotik_username, is_active, created_at, updated_at "
+                    "FROM user_mappings;",
+                    "DROP TABLE user_mappings;",
+                ]))
+
+            if "connection_type" in mt_cols:
+                # Нормализация/миграция типов подключения к общим значениям (.value):
+                # ssh_password / ssh_key / api / api_ssl
+                optional.append(("нормализация connection_type", [
+                    "UPDATE mikrotik_configs SET connection_type='ssh_password' WHERE connection_type IN ('SSH_PASSWORD','ssh_password');",
+                    "UPDATE mikrotik_configs SET connection_type='ssh_key' WHERE connection_type IN ('SSH_KEY','ssh_key');",
+                    "UPDATE mikrotik_configs SET connection_type='api' WHERE connection_type IN ('API','api','rest_api','routeros_api');",
+                    "UPDATE mikrotik_configs SET connection_type='api_ssl' WHERE connection_type IN ('API_SSL','api_ssl','api-ssl','routeros_api_ssl');",
+                ]))
 
+            # Не больше одной активной конфигурации MikroTik: оставляем активной последнюю
+            # измененную и создаем частичный уникальный индекс (он же для поиска активной)
+            optional.append(("единственная активная конфигурация MikroTik", [
+                "UPDATE mikrotik_configs SET is_active = 0 WHERE is_active = 1 AND id NOT IN "
+                "(SELECT id FROM mikrotik_configs WHERE is_active = 1 ORDER BY updated_at DESC LIMIT 1);",
+                "CREATE UNIQUE INDEX IF NOT EXISTS ux_mikrotik_configs_single_active "
+                "ON mikrotik_configs (is_active) WHERE is_active = 1;",
+            ]))
+
+            # Статистика для планировщика (выбор между составными индексами)
+            optional.append(("ANALYZE", ["ANALYZE;"]))
+
+            for title, statements in optional:
                 try:
-                    mt_cols = [r[1] for r in cur.execute("PRAGMA table_info(mikrotik_configs);").fetchall()]
-                    if "connection_type" in mt_cols:
-                        # Нормализация/миграция типов подключения к общим значениям (.value):
-                        # ssh_password / ssh_key / api / api_ssl
-                        cur.execute("UPDATE mikrotik_configs SET connection_type='ssh_password' WHERE connection_type IN ('SSH_PASSWORD','ssh_password');")
-                        cur.execute("UPDATE mikrotik_configs SET connection_type='ssh_key' WHERE connection_type IN ('SSH_KEY','ssh_key');")
-                        cur.execute("UPDATE mikrotik_configs SET connection_type='api' WHERE connection_type IN ('API','api','rest_api','routeros_api');")
-                        cur.execute("UPDATE mikrotik_configs SET connection_type='api_ssl' WHERE connection_type IN ('API_SSL','api_ssl','api-ssl','routeros_api_ssl');")
-                        con.commit()
+                    _run_sqlite_batch(con, statements)
                 except Exception:
-                    pass
-            finally:
-                con.close()
-    except Exception:
-        # не валим запуск; если не получилось — поле просто будет недоступно до ручной миграции
-        pass
+                    logger.warning("Миграция SQLite пропущена: %s", title, exc_info=True)
+
+            # Полнотекстовый индекс для поиска пользователей (trigram — поиск по подстроке).
+            # Необязателен: без FTS5 get_users использует LIKE.
+            try:
+                fts_exists = cur.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='users_fts';"
+                ).fetchone() is not None
+                if not fts_exists:
+                    con.executescript(USERS_FTS_SCHEMA_SQL)
+            except Exception:
+                con.rollback()
+                logger.warning("FTS5-индекс пользователей не создан, поиск использует LIKE", exc_info=True)
+        finally:
+            con.close()
+    elif engine.dialect.name == "postgresql":
+        # BEFORE UPDATE триггер: updated_at = now() только при реальном изменении строки
+        with engine.begin() as conn:
+            conn.exec_driver_sql(PG_SET_UPDATED_AT_SQL)
+            for table in _updated_at_tables(Base):
+                conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS trg_{table.name}_updated_at ON {table.name};")
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER trg_{table.name}_updated_at BEFORE UPDATE ON {table.name} "
+                    "FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.* "
+                    "AND NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at) "
+                    "EXECUTE FUNCTION set_updated_at();"
+                )
     print(f"База данных инициализирована: {settings.DATABASE_URL}")
@@ -10,7 +10,7 @@ from .mikrotik_config import MikroTikConfig
 from .setting import Setting
 from .user_setting import UserSetting
 from .audit_log import AuditLog
-from .user_mapping import UserMapping
+from .audit_log_daily import AuditLogDaily
 from .user_mikrotik_account import UserMikrotikAccount
 
 __all__ = [
@@ -23,6 +23,6 @@ __all__ = [
     "Setting",
     "UserSetting",
     "AuditLog",
-    "UserMapping",
+    "AuditLogDaily",
     "UserMikrotikAccount",
 ]
@@ -21,7 +21,7 @@ class Admin(Base, UUIDMixin, TimestampMixin):
     # Связи
     approved_users = relationship("User", foreign_keys="User.approved_by_id", back_populates="approved_by")
     registration_requests_reviewed = relationship("RegistrationRequest", foreign_keys="RegistrationRequest.reviewed_by_id", back_populates="reviewed_by")
-    audit_logs = relationship("AuditLog", back_populates="admin")
+    audit_logs = relationship("AuditLog", back_populates="admin", lazy="raise")
     
     def __repr__(self):
         return f"<Admin(id={self.id}, username={self.username}, is_active={self.is_active})>"
@@ -1,7 +1,8 @@
 """
 Модель журнала аудита.
 """
-from sqlalchemy import Column, String, ForeignKey, Text
+from sqlalchemy import Column, String, ForeignKey, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from .base import Base, UUIDMixin, TimestampMixin
 
@@ -9,17 +10,30 @@ from .base import Base, UUIDMixin, TimestampMixin
 class AuditLog(Base, UUIDMixin, TimestampMixin):
     """Запись в журнале аудита."""
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        # Журнал фильтруется по пользователю/администратору/действию и сортируется по created_at DESC.
+        # Составные индексы покрывают и одиночные фильтры (левый префикс), и сортировку.
+        Index("ix_audit_logs_created_at", "created_at"),
+        Index("ix_audit_logs_action_created_at", "action", "created_at"),
+        Index("ix_audit_logs_user_created_at", "user_id", "created_at"),
+        Index("ix_audit_logs_admin_created_at", "admin_id", "created_at"),
+        # Журнал по конкретной сущности: entity_type (+ entity_id)
+        Index("ix_audit_logs_entity_created_at", "entity_type", "entity_id", "created_at"),
+    )
     
-    user_id = Column(String(36), ForeignKey("users.id"), nullable=True, index=True)
-    admin_id = Column(String(36), ForeignKey("admins.id"), nullable=True, index=True)
-    action = Column(String(100), nullable=False, index=True)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=True)
+    admin_id = Column(String(36), ForeignKey("admins.id"), nullable=True)
+    action = Column(String(100), nullable=False)
     entity_type = Column(String(50), nullable=True)
     entity_id = Column(String(36), nullable=True)
-    details = Column(Text, nullable=True)  # JSON данные
+    # JSON данные: на SQLite хранятся как текст (совместимо с прежними записями),
+    # на PostgreSQL — JSONB. Сериализация/десериализация выполняется типом колонки.
+    details = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"), nullable=True)
     ip_address = Column(String(45), nullable=True)
     
-    # Связи
-    admin = relationship("Admin", back_populates="audit_logs")
+    # Связи. Списки журнала сериализуют только колонки: случайная ленивая загрузка
+    # связи на каждую строку (N+1) должна падать, а не выполнять SELECT молча.
+    admin = relationship("Admin", back_populates="audit_logs", lazy="raise")
     
     def __repr__(self):
         return f"<AuditLog(id={self.id}, action={self.action}, created_at={self.created_at})>"
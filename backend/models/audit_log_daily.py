@@ -0,0 +1,24 @@
+"""
+Модель дневной сводки журнала аудита.
+"""
+from sqlalchemy import Column, Date, Integer, String
+from .base import Base
+
+
+class AuditLogDaily(Base):
+    """
+    Количество записей аудита за день по (action, entity_type).
+
+    Графики и сводки читают O(дней × действий) строк вместо сканирования audit_logs.
+    Счетчики увеличивает писатель журнала аудита, ежедневная задача пересчитывает последние дни.
+    """
+    __tablename__ = "audit_log_daily"
+    
+    day = Column(Date, primary_key=True)
+    action = Column(String(100), primary_key=True)
+    # Пустая строка вместо NULL: NULL не участвует в конфликте первичного ключа при upsert
+    entity_type = Column(String(50), primary_key=True, default="")
+    count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<AuditLogDaily(day={self.day}, action={self.action}, count={self.count})>"
@@ -1,7 +1,7 @@
 """
 Базовая модель для всех моделей базы данных.
 """
-from sqlalchemy import Column, DateTime, String
+from sqlalchemy import Column, DateTime, FetchedValue, String
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 import uuid
@@ -10,9 +10,21 @@ Base = declarative_base()
 
 
 class TimestampMixin:
-    """Mixin для добавления полей created_at и updated_at."""
+    """
+    Mixin для добавления полей created_at и updated_at.
+
+    updated_at выставляет ORM (onupdate) в каждом UPDATE; триггер БД (см. init_db) обновляет его
+    при изменениях в обход ORM (сырой SQL, другой процесс), если UPDATE не задал updated_at сам.
+    onupdate остается и запасным вариантом на случай, если триггеры не созданы.
+    """
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    updated_at = Column(
+        DateTime,
+        server_default=func.now(),
+        onupdate=func.now(),
+        server_onupdate=FetchedValue(),
+        nullable=False,
+    )
 
 
 class UUIDMixin:
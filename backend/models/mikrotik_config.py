@@ -1,7 +1,7 @@
 """
 Модель конфигурации MikroTik роутера.
 """
-from sqlalchemy import Column, String, Integer, Boolean, Enum as SQLEnum, DateTime
+from sqlalchemy import Column, String, Integer, Boolean, Enum as SQLEnum, DateTime, Index, LargeBinary, text
 from sqlalchemy.orm import relationship
 import enum
 from .base import Base, UUIDMixin, TimestampMixin
@@ -19,12 +19,25 @@ class ConnectionType(str, enum.Enum):
 class MikroTikConfig(Base, UUIDMixin, TimestampMixin):
     """Конфигурация подключения к MikroTik роутеру."""
     __tablename__ = "mikrotik_configs"
+    __table_args__ = (
+        # Активной может быть только одна конфигурация: частичный уникальный индекс
+        # и поддерживает это правило, и служит для поиска активной конфигурации
+        Index(
+            "ux_mikrotik_configs_single_active",
+            "is_active",
+            unique=True,
+            sqlite_where=text("is_active = 1"),
+            postgresql_where=text("is_active"),
+        ),
+    )
     
     name = Column(String(100), nullable=False)
     host = Column(String(255), nullable=False)
     port = Column(Integer, default=22, nullable=False)
     username = Column(String(100), nullable=False)
     password = Column(String(255), nullable=True)  # Зашифрован
+    # HMAC-SHA256 пароля: проверка "пароль не изменился" без расшифровки
+    password_fp = Column(LargeBinary(32), nullable=True)
     ssh_key_path = Column(String(500), nullable=True)
     # Важно: храним именно .value ('ssh_password'/'api'...), а не имя enum ('SSH_PASSWORD'/'API'...),
     # чтобы совместить UI/настройки и данные БД.
@@ -41,6 +54,15 @@ class MikroTikConfig(Base, UUIDMixin, TimestampMixin):
     is_active = Column(Boolean, default=True, nullable=False)
     
     last_connection_test = Column(DateTime, nullable=True)
+    # Счетчик изменений строки: растет при каждом UPDATE (ORM и Core), в отличие от updated_at
+    # (CURRENT_TIMESTAMP с точностью до секунды). По нему кэш активной конфигурации видит изменения.
+    config_version = Column(
+        Integer,
+        default=1,
+        server_default=text("1"),
+        onupdate=text("config_version + 1"),
+        nullable=False,
+    )
     
     def __repr__(self):
         return f"<MikroTikConfig(id={self.id}, name={self.name}, host={self.host}, is_active={self.is_active})>"
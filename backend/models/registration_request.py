@@ -19,7 +19,12 @@ class RegistrationRequest(Base, UUIDMixin, TimestampMixin):
     __tablename__ = "registration_requests"
     
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
-    status = Column(SQLEnum(RegistrationRequestStatus), default=RegistrationRequestStatus.PENDING, nullable=False)
+    # VARCHAR без типа ENUM в СУБД (native_enum=False): новые статусы не требуют ALTER TYPE
+    status = Column(
+        SQLEnum(RegistrationRequestStatus, native_enum=False, length=16),
+        default=RegistrationRequestStatus.PENDING,
+        nullable=False,
+    )
     
     requested_at = Column(DateTime, nullable=False)
     reviewed_by_id = Column(String(36), ForeignKey("admins.id"), nullable=True)
@@ -1,7 +1,7 @@
 """
 Модель пользователя системы.
 """
-from sqlalchemy import Column, String, BigInteger, Text, ForeignKey, Enum as SQLEnum, DateTime
+from sqlalchemy import Column, String, BigInteger, Text, ForeignKey, Enum as SQLEnum, DateTime, Index
 from sqlalchemy.orm import relationship
 import enum
 from .base import Base, UUIDMixin, TimestampMixin
@@ -19,12 +19,19 @@ class UserStatus(str, enum.Enum):
 class User(Base, UUIDMixin, TimestampMixin):
     """Пользователь системы."""
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset-пагинация списка пользователей (ORDER BY created_at DESC, id DESC)
+        Index("ix_users_created_at_id", "created_at", "id"),
+        # Фильтр по статусу с той же сортировкой
+        Index("ix_users_status_created_at_id", "status", "created_at", "id"),
+    )
     
     telegram_id = Column(BigInteger, unique=True, nullable=False, index=True)
     full_name = Column(String(255), nullable=True)
     phone = Column(String(20), nullable=True)
     email = Column(String(255), nullable=True)
-    status = Column(SQLEnum(UserStatus), default=UserStatus.PENDING, nullable=False)
+    # VARCHAR без типа ENUM в СУБД (native_enum=False): новые статусы не требуют ALTER TYPE
+    status = Column(SQLEnum(UserStatus, native_enum=False, length=16), default=UserStatus.PENDING, nullable=False)
     rejected_reason = Column(Text, nullable=True)
     
     # Связь с администратором, который одобрил регистрацию
@@ -36,8 +43,6 @@ class User(Base, UUIDMixin, TimestampMixin):
     vpn_sessions = relationship("VPNSession", back_populates="user", cascade="all, delete-orphan")
     registration_requests = relationship("RegistrationRequest", back_populates="user", cascade="all, delete-orphan")
     user_settings = relationship("UserSetting", back_populates="user", uselist=False, cascade="all, delete-orphan")
-    # Legacy: старое сопоставление (1:1). Оставлено для обратной совместимости.
-    mikrotik_mapping = relationship("UserMapping", back_populates="user", uselist=False, cascade="all, delete-orphan")
     # Привязка нескольких MikroTik-аккаунтов на пользователя
     mikrotik_accounts = relationship("UserMikrotikAccount", back_populates="user", cascade="all, delete-orphan")
     
@@ -1,7 +1,7 @@
 """
 Модель VPN сессии.
 """
-from sqlalchemy import Column, String, ForeignKey, Enum as SQLEnum, DateTime
+from sqlalchemy import Column, String, ForeignKey, Enum as SQLEnum, DateTime, Index, text
 from sqlalchemy.orm import relationship
 import enum
 from .base import Base, UUIDMixin, TimestampMixin
@@ -18,15 +18,52 @@ class VPNSessionStatus(str, enum.Enum):
     DISCONNECTED = "disconnected"
 
 
+# "Живые" статусы: сессия еще не истекла и не отключена.
+# Условие записано литералами, чтобы SQLite мог применить частичный индекс к запросу с тем же условием.
+LIVE_VPN_SESSION_STATUSES = (
+    VPNSessionStatus.REQUESTED,
+    VPNSessionStatus.CONNECTED,
+    VPNSessionStatus.CONFIRMED,
+    VPNSessionStatus.ACTIVE,
+    VPNSessionStatus.REMINDER_SENT,
+)
+LIVE_VPN_SESSION_STATUS_SQL = "status IN ({})".format(", ".join(f"'{s.name}'" for s in LIVE_VPN_SESSION_STATUSES))
+
+
 class VPNSession(Base, UUIDMixin, TimestampMixin):
     """VPN сессия пользователя."""
     __tablename__ = "vpn_sessions"
+    __table_args__ = (
+        # Keyset-пагинация списка сессий (ORDER BY ..., created_at DESC, id DESC)
+        Index("ix_vpn_sessions_created_at_id", "created_at", "id"),
+        # Частичный индекс только по активным сессиям (часто опрашиваемый /vpn-sessions/active).
+        # SQLEnum хранит имена членов enum, поэтому 'ACTIVE'.
+        Index(
+            "ix_vpn_sessions_active",
+            "created_at",
+            sqlite_where=text("status = 'ACTIVE'"),
+            postgresql_where=text("status = 'ACTIVE'"),
+        ),
+        # Фильтры списка сессий (status и/или user_id) с сортировкой по created_at
+        Index("ix_vpn_sessions_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_vpn_sessions_user_status_created_at_id", "user_id", "status", "created_at", "id"),
+        # Поиск истекших сессий планировщиком: status IN (...) AND expires_at < now
+        Index("ix_vpn_sessions_status_expires_at", "status", "expires_at"),
+        # Сверка с активными подключениями MikroTik: живые сессии по mikrotik_username
+        Index(
+            "ix_vpn_sessions_username_live",
+            "mikrotik_username",
+            sqlite_where=text(LIVE_VPN_SESSION_STATUS_SQL),
+            postgresql_where=text(LIVE_VPN_SESSION_STATUS_SQL),
+        ),
+    )
     
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
     mikrotik_username = Column(String(100), nullable=False)
     # ID сессии на MikroTik (".id" из /ppp active или /user-manager session)
     mikrotik_session_id = Column(String(64), nullable=True, index=True)
-    status = Column(SQLEnum(VPNSessionStatus), default=VPNSessionStatus.REQUESTED, nullable=False)
+    # VARCHAR без типа ENUM в СУБД (native_enum=False): новые статусы не требуют ALTER TYPE
+    status = Column(SQLEnum(VPNSessionStatus, native_enum=False, length=16), default=VPNSessionStatus.REQUESTED, nullable=False)
     
     connected_at = Column(DateTime, nullable=True)
     confirmed_at = Column(DateTime, nullable=True)
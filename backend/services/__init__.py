@@ -3,15 +3,20 @@
 """
 from .auth_service import (
     authenticate_admin,
+    authenticate_admin_async,
+    verify_password_async,
+    get_password_hash_async,
     create_access_token,
     create_refresh_token,
     verify_token,
     get_admin_by_username,
     get_admin_by_id,
+    invalidate_admin_cache,
     create_admin,
 )
 from .user_service import (
     get_user_by_id,
+    invalidate_user_cache,
     get_user_by_telegram_id,
     create_user,
     update_user,
@@ -42,6 +47,7 @@ from .vpn_session_service import (
     expire_vpn_session,
     get_vpn_sessions,
     get_active_vpn_sessions,
+    get_active_vpn_session_rows,
     count_vpn_sessions,
     get_user_vpn_sessions,
     extend_session,
@@ -52,6 +58,7 @@ from .settings_service import (
     get_all_settings,
     get_setting_value,
     set_setting,
+    ensure_default_settings,
     delete_setting,
     get_settings_dict,
     get_categories,
@@ -65,11 +72,13 @@ from .mikrotik_config_service import (
     delete_mikrotik_config,
     test_mikrotik_config_connection,
     get_mikrotik_config_with_decrypted_password,
+    get_active_mikrotik_config_decrypted,
 )
 from .mikrotik_service import (
     MikroTikConnectionError,
     get_mikrotik_users,
     create_mikrotik_user,
+    bulk_create_mikrotik_users,
     delete_mikrotik_user,
     get_firewall_rules,
     enable_firewall_rule,
@@ -79,11 +88,15 @@ from .mikrotik_service import (
 )
 from .audit_service import (
     create_audit_log,
+    create_audit_log_sync,
+    audit_log_buffer,
     get_audit_logs,
     get_audit_log_by_id,
     count_audit_logs,
     get_user_audit_logs,
     get_admin_audit_logs,
+    get_audit_stats,
+    refresh_audit_log_daily,
 )
 from .stats_service import (
     get_overview_stats,
@@ -113,14 +126,19 @@ from .setup_wizard_service import (
 __all__ = [
     # Auth
     "authenticate_admin",
+    "authenticate_admin_async",
+    "verify_password_async",
+    "get_password_hash_async",
     "create_access_token",
     "create_refresh_token",
     "verify_token",
     "get_admin_by_username",
     "get_admin_by_id",
+    "invalidate_admin_cache",
     "create_admin",
     # User
     "get_user_by_id",
+    "invalidate_user_cache",
     "get_user_by_telegram_id",
     "create_user",
     "update_user",
@@ -149,6 +167,7 @@ __all__ = [
     "expire_vpn_session",
     "get_vpn_sessions",
     "get_active_vpn_sessions",
+    "get_active_vpn_session_rows",
     "count_vpn_sessions",
     "get_user_vpn_sessions",
     "extend_session",
@@ -158,6 +177,7 @@ __all__ = [
     "get_all_settings",
     "get_setting_value",
     "set_setting",
+    "ensure_default_settings",
     "delete_setting",
     "get_settings_dict",
     "get_categories",
@@ -170,10 +190,12 @@ __all__ = [
     "delete_mikrotik_config",
     "test_mikrotik_config_connection",
     "get_mikrotik_config_with_decrypted_password",
+    "get_active_mikrotik_config_decrypted",
     # MikroTik Service
     "MikroTikConnectionError",
     "get_mikrotik_users",
     "create_mikrotik_user",
+    "bulk_create_mikrotik_users",
     "delete_mikrotik_user",
     "get_firewall_rules",
     "enable_firewall_rule",
@@ -182,11 +204,15 @@ __all__ = [
     "test_mikrotik_connection",
     # Audit
     "create_audit_log",
+    "create_audit_log_sync",
+    "audit_log_buffer",
     "get_audit_logs",
     "get_audit_log_by_id",
     "count_audit_logs",
     "get_user_audit_logs",
     "get_admin_audit_logs",
+    "get_audit_stats",
+    "refresh_audit_log_daily",
     # Stats
     "get_overview_stats",
     "get_users_stats",
@@ -1,14 +1,115 @@
 """
 Сервис для работы с журналом аудита.
 """
-from typing import Optional, List
-from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
+import atexit
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Optional, List, Tuple
+from datetime import date, datetime, time as dt_time
+from sqlalchemy.orm import Session, raiseload
+from sqlalchemy import and_, or_, desc, func, select, text, bindparam, Date, DateTime
+from backend.database import SessionLocal
 from backend.models.audit_log import AuditLog
+from backend.models.audit_log_daily import AuditLogDaily
 from backend.models.user import User
 from backend.models.admin import Admin
-import json
+
+logger = logging.getLogger(__name__)
+
+# Буфер записей аудита: пачка пишется одной транзакцией при наборе размера или по таймеру
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_INTERVAL_SECONDS = 0.5
+
+
+class AuditLogBuffer:
+    """
+    Очередь записей аудита с фоновым потоком-писателем.
+
+    Вызывающий код не ждет commit/fsync: запись попадает в очередь, а поток собирает
+    до AUDIT_BATCH_SIZE записей (или ждет не дольше AUDIT_FLUSH_INTERVAL_SECONDS)
+    и вставляет их одним executemany в отдельной сессии.
+    """
+
+    def __init__(self, batch_size: int = AUDIT_BATCH_SIZE, interval: float = AUDIT_FLUSH_INTERVAL_SECONDS):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[dict]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def put(self, record: dict) -> None:
+        """Поставить запись в очередь (поток-писатель запускается при первой записи)."""
+        if self._thread is None:
+            self._start()
+        self._queue.put(record)
+
+    def flush(self) -> None:
+        """Дождаться записи в БД всего, что уже поставлено в очередь."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    @classmethod
+    def _write(cls, batch: List[dict]) -> None:
+        try:
+            cls._insert(batch)
+            return
+        except Exception:
+            if len(batch) == 1:
+                logger.exception("Не удалось записать запись журнала аудита %s (%s)", batch[0].get("id"), batch[0].get("action"))
+                return
+            logger.warning("Пакет журнала аудита (%d записей) не записан, пробуем по одной", len(batch), exc_info=True)
+        # Одна плохая запись не должна уносить весь пакет: пишем по одной и логируем только сбойные
+        for row in batch:
+            try:
+                cls._insert([row])
+            except Exception:
+                logger.exception("Не удалось записать запись журнала аудита %s (%s)", row.get("id"), row.get("action"))
+
+    @staticmethod
+    def _insert(rows: List[dict]) -> None:
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(AuditLog, rows)
+            bump_audit_log_daily(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+audit_log_buffer = AuditLogBuffer()
+# Не теряем хвост очереди при штатном завершении процесса (скрипты, бот)
+atexit.register(audit_log_buffer.flush)
 
 
 def create_audit_log(
@@ -20,23 +121,163 @@ def create_audit_log(
     admin_id: Optional[str] = None,
     details: Optional[dict] = None,
     ip_address: Optional[str] = None,
+) -> str:
+    """
+    Создать запись в журнале аудита (асинхронно, через audit_log_buffer).
+    Возвращает ID будущей записи; запись появится в БД в течение AUDIT_FLUSH_INTERVAL_SECONDS.
+    """
+    log_id = str(uuid.uuid4())
+    audit_log_buffer.put({
+        "id": log_id,
+        "user_id": user_id,
+        "admin_id": admin_id,
+        "action": action,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        # Копия: вызывающий код может изменить словарь до записи в БД
+        "details": dict(details) if details else None,
+        "ip_address": ip_address,
+        # Время события, а не момента записи пачки
+        "created_at": datetime.utcnow(),
+    })
+    return log_id
+
+
+def create_audit_log_sync(
+    db: Session,
+    action: str,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    admin_id: Optional[str] = None,
+    details: Optional[dict] = None,
+    ip_address: Optional[str] = None,
 ) -> AuditLog:
-    """Создать запись в журнале аудита."""
+    """Создать запись в журнале аудита сразу (commit в текущей сессии)."""
+    created_at = datetime.utcnow()
     audit_log = AuditLog(
+        created_at=created_at,
         user_id=user_id,
         admin_id=admin_id,
         action=action,
         entity_type=entity_type,
         entity_id=entity_id,
-        details=json.dumps(details) if details else None,
+        details=details or None,
         ip_address=ip_address,
     )
     db.add(audit_log)
+    bump_audit_log_daily(db, [{
+        "created_at": created_at,
+        "action": action,
+        "entity_type": entity_type,
+    }])
     db.commit()
     db.refresh(audit_log)
     return audit_log
 
 
+# Инкремент дневных счетчиков (upsert поддерживают SQLite 3.24+ и PostgreSQL)
+_BUMP_AUDIT_LOG_DAILY_SQL = text("""
+INSERT INTO audit_log_daily (day, action, entity_type, count)
+VALUES (:day, :action, :entity_type, :count)
+ON CONFLICT (day, action, entity_type) DO UPDATE SET count = audit_log_daily.count + excluded.count
+""").bindparams(bindparam("day", type_=Date))
+
+# Пересчет дневных счетчиков из audit_logs начиная с указанного дня.
+# WHERE обязателен: без него SQLite не разбирает INSERT ... SELECT ... ON CONFLICT.
+_REFRESH_AUDIT_LOG_DAILY_SQL = text("""
+INSERT INTO audit_log_daily (day, action, entity_type, count)
+SELECT date(created_at), action, COALESCE(entity_type, ''), COUNT(*)
+FROM audit_logs
+WHERE created_at >= :since
+GROUP BY 1, 2, 3
+ON CONFLICT (day, action, entity_type) DO UPDATE SET count = excluded.count
+""").bindparams(bindparam("since", type_=DateTime))
+
+
+def bump_audit_log_daily(db: Session, records: List[dict]) -> None:
+    """Увеличить дневные счетчики для новых записей аудита (в транзакции вызывающего кода)."""
+    counts = Counter(
+        ((record.get("created_at") or datetime.utcnow()).date(), record["action"], record.get("entity_type") or "")
+        for record in records
+    )
+    db.execute(_BUMP_AUDIT_LOG_DAILY_SQL, [
+        {"day": day, "action": action, "entity_type": entity_type, "count": count}
+        for (day, action, entity_type), count in counts.items()
+    ])
+
+
+def refresh_audit_log_daily(db: Session, since: Optional[date] = None) -> None:
+    """
+    Пересчитать дневную сводку аудита с дня since (по умолчанию — целиком).
+    Исправляет расхождения счетчиков (например, записи, вставленные в обход сервиса).
+    """
+    since_dt = datetime.combine(since, dt_time.min) if since else datetime(1970, 1, 1)
+    db.execute(_REFRESH_AUDIT_LOG_DAILY_SQL, {"since": since_dt})
+    db.commit()
+
+
+def ensure_audit_log_daily(db: Session) -> None:
+    """Заполнить сводку из audit_logs, если она пуста (первый запуск после обновления)."""
+    if db.execute(select(AuditLogDaily.day).limit(1)).first() is not None:
+        return
+    if db.execute(select(AuditLog.id).limit(1)).first() is None:
+        return
+    refresh_audit_log_daily(db)
+
+
+def get_audit_stats(
+    db: Session,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    action: Optional[str] = None,
+) -> List[AuditLogDaily]:
+    """Получить дневную сводку журнала аудита (по дням, затем по действию)."""
+    stmt = select(AuditLogDaily)
+    if start_day:
+        stmt = stmt.where(AuditLogDaily.day >= start_day)
+    if end_day:
+        stmt = stmt.where(AuditLogDaily.day <= end_day)
+    if action:
+        stmt = stmt.where(AuditLogDaily.action == action)
+    stmt = stmt.order_by(AuditLogDaily.day, AuditLogDaily.action, AuditLogDaily.entity_type)
+    return list(db.scalars(stmt))
+
+
+# Базовые запросы строятся один раз: SQLAlchemy кэширует скомпилированный SQL по структуре
+# выражения, а WHERE собирается в фиксированном порядке колонок — одинаковый набор
+# фильтров дает одинаковый ключ кэша
+# Страница вместе с общим количеством: COUNT(*) OVER() считается по тому же отфильтрованному набору
+_AUDIT_LOGS_SELECT = select(AuditLog, func.count().over().label("total")).options(raiseload("*"))
+_AUDIT_LOGS_COUNT = select(func.count()).select_from(AuditLog)
+_AUDIT_LOGS_ORDER = desc(AuditLog.created_at)
+
+
+def _audit_log_filters(
+    user_id: Optional[str] = None,
+    admin_id: Optional[str] = None,
+    action: Optional[str] = None,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> list:
+    """Условия WHERE только для заданных фильтров."""
+    equals = (
+        (AuditLog.user_id, user_id),
+        (AuditLog.admin_id, admin_id),
+        (AuditLog.action, action),
+        (AuditLog.entity_type, entity_type),
+        (AuditLog.entity_id, entity_id),
+    )
+    clauses = [column == value for column, value in equals if value]
+    if start_date:
+        clauses.append(AuditLog.created_at >= start_date)
+    if end_date:
+        clauses.append(AuditLog.created_at <= end_date)
+    return clauses
+
+
 def get_audit_logs(
     db: Session,
     skip: int = 0,
@@ -48,29 +289,57 @@ def get_audit_logs(
     entity_id: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-) -> List[AuditLog]:
-    """Получить записи журнала аудита с фильтрацией."""
-    query = db.query(AuditLog)
-    
-    if user_id:
-        query = query.filter(AuditLog.user_id == user_id)
-    if admin_id:
-        query = query.filter(AuditLog.admin_id == admin_id)
-    if action:
-        query = query.filter(AuditLog.action == action)
-    if entity_type:
-        query = query.filter(AuditLog.entity_type == entity_type)
-    if entity_id:
-        query = query.filter(AuditLog.entity_id == entity_id)
-    if start_date:
-        query = query.filter(AuditLog.created_at >= start_date)
-    if end_date:
-        query = query.filter(AuditLog.created_at <= end_date)
-    
-    # Сортировка: новые записи первыми
-    query = query.order_by(desc(AuditLog.created_at))
-    
-    return query.offset(skip).limit(limit).all()
+) -> Tuple[List[AuditLog], int]:
+    """
+    Получить записи журнала аудита с фильтрацией (без загрузки связей), новые первыми,
+    и общее количество записей по фильтрам — одним запросом.
+    """
+    clauses = _audit_log_filters(user_id, admin_id, action, entity_type, entity_id, start_date, end_date)
+    stmt = _AUDIT_LOGS_SELECT.where(*clauses).order_by(_AUDIT_LOGS_ORDER).offset(skip).limit(limit)
+    rows = db.execute(stmt).all()
+    if rows:
+        return [row[0] for row in rows], rows[0].total
+    # Пустая страница не несет total: за пределами выборки считаем отдельно
+    total = db.execute(_AUDIT_LOGS_COUNT.where(*clauses)).scalar_one() if skip else 0
+    return [], total
+
+
+# Колонки для сводных списков (без details/ip_address): строки Row, без ORM-объектов и identity map
+AUDIT_LOG_SLIM_COLUMNS = (
+    AuditLog.id,
+    AuditLog.action,
+    AuditLog.entity_type,
+    AuditLog.entity_id,
+    AuditLog.user_id,
+    AuditLog.admin_id,
+    AuditLog.created_at,
+)
+_AUDIT_LOGS_SLIM_SELECT = select(*AUDIT_LOG_SLIM_COLUMNS, func.count().over().label("total"))
+
+
+def get_audit_logs_slim(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    user_id: Optional[str] = None,
+    admin_id: Optional[str] = None,
+    action: Optional[str] = None,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> Tuple[List[Any], int]:
+    """
+    Облегченный вариант get_audit_logs: только колонки AUDIT_LOG_SLIM_COLUMNS в виде Row
+    (доступ через row._mapping) и общее количество записей по фильтрам.
+    """
+    clauses = _audit_log_filters(user_id, admin_id, action, entity_type, entity_id, start_date, end_date)
+    stmt = _AUDIT_LOGS_SLIM_SELECT.where(*clauses).order_by(_AUDIT_LOGS_ORDER).offset(skip).limit(limit)
+    rows = db.execute(stmt).all()
+    if rows:
+        return rows, rows[0].total
+    total = db.execute(_AUDIT_LOGS_COUNT.where(*clauses)).scalar_one() if skip else 0
+    return [], total
 
 
 def count_audit_logs(
@@ -81,29 +350,16 @@ def count_audit_logs(
     entity_type: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    entity_id: Optional[str] = None,
 ) -> int:
-    """Получить количество записей в журнале аудита."""
-    query = db.query(AuditLog)
-    
-    if user_id:
-        query = query.filter(AuditLog.user_id == user_id)
-    if admin_id:
-        query = query.filter(AuditLog.admin_id == admin_id)
-    if action:
-        query = query.filter(AuditLog.action == action)
-    if entity_type:
-        query = query.filter(AuditLog.entity_type == entity_type)
-    if start_date:
-        query = query.filter(AuditLog.created_at >= start_date)
-    if end_date:
-        query = query.filter(AuditLog.created_at <= end_date)
-    
-    return query.count()
+    """Получить количество записей в журнале аудита (без страницы записей)."""
+    clauses = _audit_log_filters(user_id, admin_id, action, entity_type, entity_id, start_date, end_date)
+    return db.execute(_AUDIT_LOGS_COUNT.where(*clauses)).scalar_one()
 
 
 def get_audit_log_by_id(db: Session, log_id: str) -> Optional[AuditLog]:
     """Получить запись журнала аудита по ID."""
-    return db.query(AuditLog).filter(AuditLog.id == log_id).first()
+    return db.query(AuditLog).options(raiseload("*")).filter(AuditLog.id == log_id).first()
 
 
 def get_user_audit_logs(
@@ -111,8 +367,8 @@ def get_user_audit_logs(
     user_id: str,
     skip: int = 0,
     limit: int = 100,
-) -> List[AuditLog]:
-    """Получить журнал аудита для конкретного пользователя."""
+) -> Tuple[List[AuditLog], int]:
+    """Получить журнал аудита для конкретного пользователя (записи и общее количество)."""
     return get_audit_logs(db, skip=skip, limit=limit, user_id=user_id)
 
 
@@ -121,6 +377,6 @@ def get_admin_audit_logs(
     admin_id: str,
     skip: int = 0,
     limit: int = 100,
-) -> List[AuditLog]:
-    """Получить журнал аудита для конкретного администратора."""
+) -> Tuple[List[AuditLog], int]:
+    """Получить журнал аудита для конкретного администратора (записи и общее количество)."""
     return get_audit_logs(db, skip=skip, limit=limit, admin_id=admin_id)
@@ -1,18 +1,34 @@
 """
 Сервис для аутентификации администраторов.
 """
+import asyncio
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 import base64
 import hashlib
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from config.settings import settings
 from backend.models.admin import Admin
 
 # Контекст для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+)
+
+# Кэш администраторов по ID: admin_id -> (expires_at, снимок колонок Admin).
+# Единственный кэш администраторов: им пользуются и get_current_admin (кэш токенов хранит
+# только admin_id), и refresh. Администраторы меняются редко; изменения в этом модуле
+# и мастере настройки сбрасывают запись через invalidate_admin_cache().
+_ADMIN_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_ADMIN_CACHE_TTL_SECONDS = 30.0
+_ADMIN_CACHE_MAX_SIZE = 512
+_ADMIN_COLUMN_KEYS = tuple(attr.key for attr in sa_inspect(Admin).column_attrs)
 
 
 def _normalize_password_for_bcrypt(password: str) -> str:
@@ -43,37 +59,46 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(_normalize_password_for_bcrypt(password))
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Проверка пароля в потоке: bcrypt занимает CPU на ~100 мс и не должен блокировать event loop."""
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Хеширование пароля в потоке (см. verify_password_async)."""
+    return await asyncio.to_thread(get_password_hash, password)
+
+
+# Параметры JWT не меняются во время работы: ключ и список алгоритмов вычисляются один раз.
+# Используем JWT_SECRET_KEY если указан, иначе SECRET_KEY
+_JWT_SECRET = settings.JWT_SECRET_KEY or settings.SECRET_KEY
+_JWT_ALGORITHMS = [settings.JWT_ALGORITHM]
+_ACCESS_TOKEN_TTL_SECONDS = settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES * 60
+_REFRESH_TOKEN_TTL_SECONDS = settings.JWT_REFRESH_TOKEN_EXPIRE_DAYS * 86400
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Создание JWT токена для доступа."""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire, "type": "access"})
-    # Используем JWT_SECRET_KEY если указан, иначе SECRET_KEY
-    secret_key = settings.JWT_SECRET_KEY or settings.SECRET_KEY
-    encoded_jwt = jwt.encode(to_encode, secret_key, algorithm=settings.JWT_ALGORITHM)
-    return encoded_jwt
+    # exp — целые секунды Unix time (как и требует JWT), без datetime
+    ttl = int(expires_delta.total_seconds()) if expires_delta else _ACCESS_TOKEN_TTL_SECONDS
+    to_encode["exp"] = int(time.time()) + ttl
+    to_encode["type"] = "access"
+    return jwt.encode(to_encode, _JWT_SECRET, algorithm=_JWT_ALGORITHMS[0])
 
 
 def create_refresh_token(data: dict) -> str:
     """Создание refresh токена."""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=settings.JWT_REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
-    # Используем JWT_SECRET_KEY если указан, иначе SECRET_KEY
-    secret_key = settings.JWT_SECRET_KEY or settings.SECRET_KEY
-    encoded_jwt = jwt.encode(to_encode, secret_key, algorithm=settings.JWT_ALGORITHM)
-    return encoded_jwt
+    to_encode["exp"] = int(time.time()) + _REFRESH_TOKEN_TTL_SECONDS
+    to_encode["type"] = "refresh"
+    return jwt.encode(to_encode, _JWT_SECRET, algorithm=_JWT_ALGORITHMS[0])
 
 
 def verify_token(token: str, token_type: str = "access") -> Optional[dict]:
     """Проверка и декодирование JWT токена."""
     try:
-        # Используем JWT_SECRET_KEY если указан, иначе SECRET_KEY
-        secret_key = settings.JWT_SECRET_KEY or settings.SECRET_KEY
-        payload = jwt.decode(token, secret_key, algorithms=[settings.JWT_ALGORITHM])
+        payload = jwt.decode(token, _JWT_SECRET, algorithms=_JWT_ALGORITHMS)
         if payload.get("type") != token_type:
             return None
         return payload
@@ -81,29 +106,72 @@ def verify_token(token: str, token_type: str = "access") -> Optional[dict]:
         return None
 
 
-def authenticate_admin(db: Session, username: str, password: str) -> Optional[Admin]:
-    """Аутентификация администратора по логину и паролю."""
+def _get_admin_for_login(db: Session, username: str) -> Optional[Admin]:
+    """Активный администратор с указанным логином (кандидат для проверки пароля)."""
     admin = db.query(Admin).filter(Admin.username == username).first()
-    if not admin:
-        return None
-    if not admin.is_active:
+    if not admin or not admin.is_active:
         return None
-    if not verify_password(password, admin.password_hash):
-        return None
-    # Обновляем время последнего входа
+    return admin
+
+
+def _complete_admin_login(db: Session, admin: Admin) -> Admin:
+    """Отметить успешный вход: время последнего входа и сброс кэша администратора."""
     admin.last_login = datetime.utcnow()
     db.commit()
+    invalidate_admin_cache(admin.id)
     return admin
 
 
+def authenticate_admin(db: Session, username: str, password: str) -> Optional[Admin]:
+    """Аутентификация администратора по логину и паролю."""
+    admin = _get_admin_for_login(db, username)
+    if admin is None or not verify_password(password, admin.password_hash):
+        return None
+    return _complete_admin_login(db, admin)
+
+
+async def authenticate_admin_async(db: Session, username: str, password: str) -> Optional[Admin]:
+    """Аутентификация администратора для async endpoints: проверка bcrypt выполняется в потоке."""
+    admin = _get_admin_for_login(db, username)
+    if admin is None or not await verify_password_async(password, admin.password_hash):
+        return None
+    return _complete_admin_login(db, admin)
+
+
 def get_admin_by_username(db: Session, username: str) -> Optional[Admin]:
     """Получение администратора по имени пользователя."""
     return db.query(Admin).filter(Admin.username == username).first()
 
 
+def invalidate_admin_cache(admin_id: Optional[str] = None) -> None:
+    """Сбросить кэшированного администратора (вызывать после изменения); без admin_id — всех."""
+    if admin_id is None:
+        _ADMIN_CACHE.clear()
+    else:
+        _ADMIN_CACHE.pop(admin_id, None)
+
+
 def get_admin_by_id(db: Session, admin_id: str) -> Optional[Admin]:
     """Получение администратора по ID."""
-    return db.query(Admin).filter(Admin.id == admin_id).first()
+    cached = _ADMIN_CACHE.get(admin_id)
+    if cached is not None:
+        expires_at, snapshot = cached
+        if expires_at > time.monotonic():
+            # Присоединяем снимок к сессии без SELECT (load=False)
+            admin = Admin(**snapshot)
+            make_transient_to_detached(admin)
+            return db.merge(admin, load=False)
+        _ADMIN_CACHE.pop(admin_id, None)
+
+    admin = db.query(Admin).filter(Admin.id == admin_id).first()
+    if admin is not None:
+        if len(_ADMIN_CACHE) >= _ADMIN_CACHE_MAX_SIZE:
+            _ADMIN_CACHE.clear()
+        _ADMIN_CACHE[admin_id] = (
+            time.monotonic() + _ADMIN_CACHE_TTL_SECONDS,
+            {k: getattr(admin, k) for k in _ADMIN_COLUMN_KEYS},
+        )
+    return admin
 
 
 def create_admin(
@@ -126,4 +194,5 @@ def create_admin(
     db.add(admin)
     db.commit()
     db.refresh(admin)
+    invalidate_admin_cache(admin.id)
     return admin
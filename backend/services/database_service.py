@@ -4,6 +4,8 @@
 import os
 import shutil
 import sqlite3
+import tempfile
+from operator import itemgetter
 from pathlib import Path
 from datetime import datetime
 from typing import Optional, Dict, Any, Tuple
@@ -14,6 +16,10 @@ from backend.database import engine
 import zipfile
 import tarfile
 
+# Имена файлов резервных копий: mikrotik_2fa_backup_<timestamp>.db[.zip]
+BACKUP_PREFIX = "mikrotik_2fa_backup_"
+BACKUP_SUFFIXES = (".db", ".zip", ".tar.gz")
+
 
 def get_database_info(db: Session) -> Dict[str, Any]:
     """Получить информацию о базе данных."""
@@ -31,24 +37,19 @@ def get_database_info(db: Session) -> Dict[str, Any]:
     size = os.path.getsize(db_path)
     size_human = _format_size(size)
     
-    # Получаем версию SQLite
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT sqlite_version()")
-    sqlite_version = cursor.fetchone()[0]
-    
-    # Получаем количество таблиц и записей
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = cursor.fetchall()
-    table_counts = {}
-    
-    for table in tables:
-        table_name = table[0]
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-        count = cursor.fetchone()[0]
-        table_counts[table_name] = count
-    
-    conn.close()
+    # Соединение из пула движка (PRAGMA и кэш страниц уже настроены)
+    with engine.connect() as conn:
+        # Получаем версию SQLite
+        sqlite_version = conn.exec_driver_sql("SELECT sqlite_version()").scalar()
+        
+        # Получаем количество таблиц и записей: все COUNT(*) одним запросом
+        tables = [row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table'")]
+        table_counts = {}
+        if tables:
+            count_sql = " UNION ALL ".join(
+                "SELECT ?, COUNT(*) FROM \"{}\"".format(name.replace('"', '""')) for name in tables
+            )
+            table_counts = dict(conn.exec_driver_sql(count_sql, tuple(tables)).all())
     
     # Получаем время последнего изменения
     mtime = os.path.getmtime(db_path)
@@ -66,13 +67,31 @@ def get_database_info(db: Session) -> Dict[str, Any]:
     }
 
 
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+
+
 def _format_size(size_bytes: int) -> str:
     """Форматировать размер в человекочитаемый формат."""
-    for unit in ['B', 'KB', 'MB', 'GB']:
-        if size_bytes < 1024.0:
-            return f"{size_bytes:.2f} {unit}"
-        size_bytes /= 1024.0
-    return f"{size_bytes:.2f} TB"
+    # Единица определяется по длине числа в битах (каждые 10 бит — следующая единица), без цикла делений
+    magnitude = abs(int(size_bytes))
+    idx = min((magnitude.bit_length() - 1) // 10, 4) if magnitude else 0
+    return f"{size_bytes / (1 << (idx * 10)):.2f} {_SIZE_UNITS[idx]}"
+
+
+# Страниц за шаг online backup: между шагами писатели могут продолжать работу
+BACKUP_PAGES_PER_STEP = 1024
+
+
+def _backup_sqlite(db_path: str, target: sqlite3.Connection) -> None:
+    """
+    Скопировать БД в соединение target через SQLite online backup API.
+    В отличие от копирования файла, учитывает блокировки и незавершенные транзакции WAL.
+    """
+    src = sqlite3.connect(db_path)
+    try:
+        src.backup(target, pages=BACKUP_PAGES_PER_STEP)
+    finally:
+        src.close()
 
 
 def create_backup(
@@ -97,24 +116,69 @@ def create_backup(
     
     # Формируем имя файла резервной копии
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_filename = f"mikrotik_2fa_backup_{timestamp}.db"
+    backup_filename = f"{BACKUP_PREFIX}{timestamp}.db"
     backup_path = os.path.join(backup_dir, backup_filename)
     
-    # Копируем файл базы данных
-    shutil.copy2(db_path, backup_path)
-    
-    # Компрессия, если требуется
+    # Компрессия: снимок БД пишется во временный файл рядом с архивом и оттуда потоково сжимается,
+    # чтобы вся база не держалась в памяти
     if compress:
         compressed_path = backup_path + ".zip"
-        with zipfile.ZipFile(compressed_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(backup_path, backup_filename)
-        # Удаляем несжатый файл
-        os.remove(backup_path)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{backup_filename}.", suffix=".tmp", dir=backup_dir)
+        os.close(fd)
+        try:
+            snapshot = sqlite3.connect(tmp_path)
+            try:
+                _backup_sqlite(db_path, snapshot)
+            finally:
+                snapshot.close()
+            # Уровень 1: страницы SQLite хорошо сжимаются и на минимальном уровне, а CPU тратится в разы меньше
+            with zipfile.ZipFile(compressed_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
+                zipf.write(tmp_path, arcname=backup_filename)
+        finally:
+            os.remove(tmp_path)
         return compressed_path, os.path.basename(compressed_path)
     
+    # Копируем базу данных (согласованный снимок, а не сырой файл)
+    dst = sqlite3.connect(backup_path)
+    try:
+        _backup_sqlite(db_path, dst)
+    finally:
+        dst.close()
+    
     return backup_path, backup_filename
 
 
+# Размер блока при распаковке БД из архива
+RESTORE_CHUNK_SIZE = 1024 * 1024
+
+
+def _extract_db_from_archive(backup_file_path: str, target_path: str) -> bool:
+    """
+    Распаковать .db файл из архива потоком прямо в target_path.
+    Возвращает False, если файл не архив (тогда он сам является файлом БД).
+    """
+    if backup_file_path.endswith('.zip'):
+        with zipfile.ZipFile(backup_file_path, 'r') as zipf:
+            # Находим .db файл в архиве
+            db_files = [f for f in zipf.namelist() if f.endswith('.db')]
+            if not db_files:
+                raise ValueError("No .db file found in backup archive")
+            with zipf.open(db_files[0]) as src, open(target_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, RESTORE_CHUNK_SIZE)
+        return True
+    if backup_file_path.endswith('.tar.gz') or backup_file_path.endswith('.tgz'):
+        with tarfile.open(backup_file_path, 'r:gz') as tarf:
+            # Находим .db файл в архиве
+            members = [m for m in tarf.getmembers() if m.isfile() and m.name.endswith('.db')]
+            if not members:
+                raise ValueError("No .db file found in backup archive")
+            src = tarf.extractfile(members[0])
+            with src, open(target_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, RESTORE_CHUNK_SIZE)
+        return True
+    return False
+
+
 def restore_backup(
     backup_file_path: str,
     create_backup_before_restore: bool = True,
@@ -132,71 +196,50 @@ def restore_backup(
     if create_backup_before_restore and os.path.exists(db_path):
         create_backup()
     
-    # Определяем, является ли файл архивом
-    extracted_path = None
-    if backup_file_path.endswith('.zip'):
-        # Распаковываем ZIP архив
-        backup_dir = os.path.dirname(backup_file_path) or "."
-        with zipfile.ZipFile(backup_file_path, 'r') as zipf:
-            # Находим .db файл в архиве
-            db_files = [f for f in zipf.namelist() if f.endswith('.db')]
-            if not db_files:
-                raise ValueError("No .db file found in backup archive")
-            extracted_file = db_files[0]
-            zipf.extract(extracted_file, backup_dir)
-            extracted_path = os.path.join(backup_dir, extracted_file)
-    elif backup_file_path.endswith('.tar.gz') or backup_file_path.endswith('.tgz'):
-        # Распаковываем TAR.GZ архив
-        backup_dir = os.path.dirname(backup_file_path) or "."
-        with tarfile.open(backup_file_path, 'r:gz') as tarf:
-            # Находим .db файл в архиве
-            db_files = [f for f in tarf.getnames() if f.endswith('.db')]
-            if not db_files:
-                raise ValueError("No .db file found in backup archive")
-            extracted_file = db_files[0]
-            tarf.extract(extracted_file, backup_dir)
-            extracted_path = os.path.join(backup_dir, extracted_file)
-    else:
-        # Обычный .db файл
-        extracted_path = backup_file_path
-    
-    # Проверяем, что файл существует
-    if not os.path.exists(extracted_path):
-        raise FileNotFoundError(f"Backup file not found: {extracted_path}")
-    
-    # Валидация: проверяем, что это действительно SQLite база данных
-    try:
-        conn = sqlite3.connect(extracted_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = cursor.fetchall()
-        conn.close()
-        
-        if not tables:
-            raise ValueError("Backup file does not contain any tables")
-    except sqlite3.Error as e:
-        raise ValueError(f"Invalid SQLite database file: {str(e)}")
-    
-    # Копируем файл базы данных
-    # Сначала создаем резервную копию текущей БД (если еще не создана)
-    if create_backup_before_restore and os.path.exists(db_path):
-        # Уже создали выше, но на всякий случай еще раз
-        pass
-    
     # Убеждаемся, что директория существует
     db_dir = os.path.dirname(db_path)
     if db_dir and not os.path.exists(db_dir):
         os.makedirs(db_dir, exist_ok=True)
     
-    # Копируем файл
-    shutil.copy2(extracted_path, db_path)
-    
-    # Удаляем временный распакованный файл, если это был архив
-    if extracted_path != backup_file_path and os.path.exists(extracted_path):
+    # Архив распаковывается один раз — рядом с БД; обычный .db файл используется как есть
+    extracted_path = db_path + ".restore"
+    try:
+        if not _extract_db_from_archive(backup_file_path, extracted_path):
+            extracted_path = backup_file_path
+        
+        # Проверяем, что файл существует
+        if not os.path.exists(extracted_path):
+            raise FileNotFoundError(f"Backup file not found: {extracted_path}")
+        
+        # Валидация: проверяем, что это действительно целая SQLite база данных
         try:
-            os.remove(extracted_path)
-        except Exception:
-            pass
+            src = sqlite3.connect(extracted_path)
+            try:
+                check = src.execute("PRAGMA quick_check").fetchone()
+                if not check or check[0] != "ok":
+                    raise ValueError(f"Backup file is corrupted: {check[0] if check else 'unknown error'}")
+                if src.execute("SELECT name FROM sqlite_master WHERE type='table' LIMIT 1").fetchone() is None:
+                    raise ValueError("Backup file does not contain any tables")
+                
+                # Записываем копию в рабочую БД через online backup API: SQLite сам берет блокировки
+                # и корректно обновляет WAL, поэтому открытые соединения пула (и бота) видят новые данные
+                # без подмены файла под ними
+                dst = sqlite3.connect(db_path)
+                try:
+                    src.backup(dst, pages=BACKUP_PAGES_PER_STEP)
+                finally:
+                    dst.close()
+            finally:
+                src.close()
+        except sqlite3.Error as e:
+            raise ValueError(f"Invalid SQLite database file: {str(e)}")
+    finally:
+        # Удаляем временный распакованный файл, если это был архив
+        if extracted_path != backup_file_path and os.path.exists(extracted_path):
+            try:
+                os.remove(extracted_path)
+            except Exception:
+                pass
 
 
 def verify_database_integrity(db: Session) -> Tuple[bool, Optional[str]]:
@@ -210,12 +253,9 @@ def verify_database_integrity(db: Session) -> Tuple[bool, Optional[str]]:
         return False, "Database file not found"
     
     try:
-        # Используем SQLite команду integrity_check
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA integrity_check")
-        result = cursor.fetchone()
-        conn.close()
+        # Используем SQLite команду integrity_check (соединение из пула движка)
+        with engine.connect() as conn:
+            result = conn.exec_driver_sql("PRAGMA integrity_check").first()
         
         if result and result[0] == "ok":
             return True, None
@@ -225,9 +265,27 @@ def verify_database_integrity(db: Session) -> Tuple[bool, Optional[str]]:
         return False, str(e)
 
 
-def optimize_database(db: Session) -> Dict[str, Any]:
+# Сколько свободных страниц возвращать за один вызов incremental_vacuum
+INCREMENTAL_VACUUM_PAGES = 1000
+# PRAGMA auto_vacuum: 2 = INCREMENTAL
+_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _database_size(conn) -> int:
+    """Размер БД по числу страниц (без stat файла)."""
+    page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+    page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+    return page_count * page_size
+
+
+def optimize_database(db: Session, full: bool = False) -> Dict[str, Any]:
     """
-    Оптимизировать базу данных SQLite (VACUUM, ANALYZE).
+    Оптимизировать базу данных SQLite.
+
+    По умолчанию — incremental_vacuum (короткая блокировка) и PRAGMA optimize (ANALYZE только
+    для таблиц с устаревшей статистикой). Полный VACUUM + ANALYZE блокирует запись на время
+    перезаписи файла: выполняется при full=True или если БД еще не в режиме auto_vacuum=INCREMENTAL
+    (VACUUM заодно переводит ее в этот режим).
     """
     db_path = settings.DATABASE_URL.replace("sqlite:///", "")
     
@@ -235,23 +293,31 @@ def optimize_database(db: Session) -> Dict[str, Any]:
         raise FileNotFoundError(f"Database file not found: {db_path}")
     
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Получаем размер до оптимизации
-        size_before = os.path.getsize(db_path)
-        
-        # Выполняем VACUUM
-        cursor.execute("VACUUM")
-        
-        # Выполняем ANALYZE для обновления статистики
-        cursor.execute("ANALYZE")
-        
-        conn.commit()
-        conn.close()
+        # VACUUM нельзя выполнять внутри транзакции: соединение из пула в режиме AUTOCOMMIT
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            
+            # Получаем размер до оптимизации
+            size_before = _database_size(conn)
+            
+            auto_vacuum = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if full or auto_vacuum != _AUTO_VACUUM_INCREMENTAL:
+                conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+                # Выполняем VACUUM
+                conn.exec_driver_sql("VACUUM")
+                # Выполняем ANALYZE для обновления статистики
+                conn.exec_driver_sql("ANALYZE")
+            else:
+                # incremental_vacuum освобождает по странице на шаг выполнения, а execute драйвера
+                # делает только первый шаг — executescript выполняет прагму до конца
+                conn.connection.driver_connection.executescript(
+                    f"PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES});"
+                )
+                conn.exec_driver_sql("PRAGMA optimize")
+            
+            # Получаем размер после оптимизации
+            size_after = _database_size(conn)
         
-        # Получаем размер после оптимизации
-        size_after = os.path.getsize(db_path)
         size_saved = size_before - size_after
         
         return {
@@ -276,22 +342,22 @@ def get_backup_list(backup_dir: Optional[str] = None) -> list[Dict[str, Any]]:
     if not os.path.exists(backup_dir):
         return []
     
+    # scandir: DirEntry.stat() — один stat() на файл вместо отдельных getsize/getmtime
     backups = []
-    for filename in os.listdir(backup_dir):
-        if filename.startswith("mikrotik_2fa_backup_") and (filename.endswith(".db") or filename.endswith(".zip") or filename.endswith(".tar.gz")):
-            file_path = os.path.join(backup_dir, filename)
-            size = os.path.getsize(file_path)
-            mtime = os.path.getmtime(file_path)
-            
+    with os.scandir(backup_dir) as entries:
+        for entry in entries:
+            if not entry.name.startswith(BACKUP_PREFIX) or not entry.name.endswith(BACKUP_SUFFIXES):
+                continue
+            st = entry.stat()
             backups.append({
-                "filename": filename,
-                "path": file_path,
-                "size": size,
-                "size_human": _format_size(size),
-                "created_at": datetime.fromtimestamp(mtime).isoformat(),
+                "filename": entry.name,
+                "path": entry.path,
+                "size": st.st_size,
+                "size_human": _format_size(st.st_size),
+                "created_at": datetime.fromtimestamp(st.st_mtime).isoformat(),
             })
     
     # Сортируем по дате создания (новые первыми)
-    backups.sort(key=lambda x: x["created_at"], reverse=True)
+    backups.sort(key=itemgetter("created_at"), reverse=True)
     
     return backups
@@ -1,11 +1,13 @@
 """
 Сервис для работы с конфигурациями MikroTik в базе данных.
 """
+import hmac
 from typing import Optional, List
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, load_only, raiseload
 from backend.models.mikrotik_config import MikroTikConfig, ConnectionType
-from backend.services.settings_service import encrypt_value, decrypt_value, set_setting
+from backend.services.settings_service import encrypt_value, decrypt_value, fingerprint_value, set_setting
 
 
 def _sync_active_mikrotik_connection_type_setting(db: Session, config: MikroTikConfig) -> None:
@@ -23,19 +25,68 @@ def _sync_active_mikrotik_connection_type_setting(db: Session, config: MikroTikC
         pass
 
 
+def _invalidate_active_config_cache() -> None:
+    """Сбросить кэш активной конфигурации в mikrotik_service (локальный импорт: циклическая зависимость)."""
+    from backend.services.mikrotik_service import invalidate_active_config_cache
+
+    invalidate_active_config_cache()
+
+
+def is_stored_password(stored: Optional[str], password: str, stored_fp: Optional[bytes] = None) -> bool:
+    """
+    Совпадает ли пароль с сохраненным: UI может вернуть тот же пароль или уже зашифрованное значение.
+    Тогда шифровать заново не нужно (лишний Fernet и новый шифротекст в строке).
+    Если есть отпечаток пароля, сравнивается HMAC; расшифровка нужна только для строк без отпечатка.
+    """
+    if not stored:
+        return False
+    if password == stored:
+        return True
+    if stored_fp is not None:
+        return hmac.compare_digest(stored_fp, fingerprint_value(password))
+    return decrypt_value(stored) == password
+
+
 def get_mikrotik_config_by_id(db: Session, config_id: str) -> Optional[MikroTikConfig]:
     """Получить конфигурацию MikroTik по ID."""
-    return db.query(MikroTikConfig).filter(MikroTikConfig.id == config_id).first()
+    return db.query(MikroTikConfig).options(raiseload("*")).filter(MikroTikConfig.id == config_id).first()
 
 
 def get_active_mikrotik_config(db: Session) -> Optional[MikroTikConfig]:
     """Получить активную конфигурацию MikroTik."""
-    return db.query(MikroTikConfig).filter(MikroTikConfig.is_active == True).first()
+    # Именно "= 1", а не IS TRUE: иначе SQLite не использует частичный индекс ux_mikrotik_configs_single_active
+    return (
+        db.query(MikroTikConfig)
+        .options(raiseload("*"))
+        .filter(MikroTikConfig.is_active == True)  # noqa: E712
+        .first()
+    )
+
+
+# Колонки для списка конфигураций (MikroTikConfigResponse): зашифрованный пароль списку не нужен
+_CONFIG_LIST_COLUMNS = (
+    MikroTikConfig.id,
+    MikroTikConfig.name,
+    MikroTikConfig.host,
+    MikroTikConfig.port,
+    MikroTikConfig.username,
+    MikroTikConfig.ssh_key_path,
+    MikroTikConfig.connection_type,
+    MikroTikConfig.is_active,
+    MikroTikConfig.last_connection_test,
+    MikroTikConfig.created_at,
+    MikroTikConfig.updated_at,
+)
 
 
 def get_all_mikrotik_configs(db: Session) -> List[MikroTikConfig]:
-    """Получить все конфигурации MikroTik."""
-    return db.query(MikroTikConfig).order_by(MikroTikConfig.name).all()
+    """Получить все конфигурации MikroTik (без загрузки пароля)."""
+    return (
+        db.query(MikroTikConfig)
+        .options(load_only(*_CONFIG_LIST_COLUMNS), raiseload("*"))
+        .order_by(MikroTikConfig.name)
+        .all()
+    )
 
 
 def create_mikrotik_config(
@@ -51,13 +102,20 @@ def create_mikrotik_config(
 ) -> MikroTikConfig:
     """Создать новую конфигурацию MikroTik."""
     # Если эта конфигурация должна быть активной, деактивируем все остальные
+    # (до вставки: уникальный индекс не допускает двух активных строк)
     if is_active:
-        db.query(MikroTikConfig).update({MikroTikConfig.is_active: False})
+        # Затрагиваем только активную строку (по частичному индексу), а не всю таблицу;
+        # synchronize_session=False: сессию синхронизировать не нужно, commit все равно сбросит объекты
+        db.query(MikroTikConfig).filter(MikroTikConfig.is_active == True).update(  # noqa: E712
+            {MikroTikConfig.is_active: False}, synchronize_session=False
+        )
     
     # Шифруем пароль, если указан
     encrypted_password = None
+    password_fp = None
     if password:
         encrypted_password = encrypt_value(password)
+        password_fp = fingerprint_value(password)
     
     config = MikroTikConfig(
         name=name,
@@ -65,12 +123,14 @@ def create_mikrotik_config(
         port=port,
         username=username,
         password=encrypted_password,
+        password_fp=password_fp,
         ssh_key_path=ssh_key_path,
         connection_type=connection_type,
         is_active=is_active,
     )
     db.add(config)
     db.commit()
+    _invalidate_active_config_cache()
     db.refresh(config)
     _sync_active_mikrotik_connection_type_setting(db, config)
     return config
@@ -89,33 +149,56 @@ def update_mikrotik_config(
     is_active: Optional[bool] = None,
 ) -> Optional[MikroTikConfig]:
     """Обновить конфигурацию MikroTik."""
-    config = get_mikrotik_config_by_id(db, config_id)
-    if not config:
-        return None
-    
-    # Если эта конфигурация должна стать активной, деактивируем все остальные
-    if is_active is True:
-        db.query(MikroTikConfig).filter(MikroTikConfig.id != config_id).update({MikroTikConfig.is_active: False})
-    
+    changes = {}
     if name is not None:
-        config.name = name
+        changes["name"] = name
     if host is not None:
-        config.host = host
+        changes["host"] = host
     if port is not None:
-        config.port = port
+        changes["port"] = port
     if username is not None:
-        config.username = username
+        changes["username"] = username
     if password is not None:
-        # Шифруем новый пароль
-        config.password = encrypt_value(password)
+        stored = db.execute(
+            select(MikroTikConfig.password, MikroTikConfig.password_fp).where(MikroTikConfig.id == config_id)
+        ).first()
+        if stored is None or not is_stored_password(stored.password, password, stored.password_fp):
+            # Шифруем новый пароль
+            changes["password"] = encrypt_value(password)
+            changes["password_fp"] = fingerprint_value(password)
     if ssh_key_path is not None:
-        config.ssh_key_path = ssh_key_path
+        changes["ssh_key_path"] = ssh_key_path
     if connection_type is not None:
-        config.connection_type = connection_type
+        changes["connection_type"] = connection_type
     if is_active is not None:
-        config.is_active = is_active
+        changes["is_active"] = is_active
+    
+    if not changes:
+        return get_mikrotik_config_by_id(db, config_id)
+    
+    # Если эта конфигурация должна стать активной, деактивируем все остальные
+    # (до UPDATE самой строки: уникальный индекс не допускает двух активных)
+    if is_active is True:
+        db.query(MikroTikConfig).filter(
+            MikroTikConfig.is_active == True,  # noqa: E712
+            MikroTikConfig.id != config_id,
+        ).update({MikroTikConfig.is_active: False}, synchronize_session=False)
+    
+    # UPDATE ... RETURNING: изменение и получение строки одним запросом вместо SELECT + UPDATE
+    config = db.execute(
+        update(MikroTikConfig)
+        .where(MikroTikConfig.id == config_id)
+        .values(**changes)
+        .returning(MikroTikConfig),
+        execution_options={"synchronize_session": False},
+    ).scalar_one_or_none()
+    if config is None:
+        db.rollback()
+        return None
     
     db.commit()
+    _invalidate_active_config_cache()
+    # После commit объект сброшен; перечитываем вместе с updated_at, выставленным триггером
     db.refresh(config)
     _sync_active_mikrotik_connection_type_setting(db, config)
     return config
@@ -129,6 +212,7 @@ def delete_mikrotik_config(db: Session, config_id: str) -> bool:
     
     db.delete(config)
     db.commit()
+    _invalidate_active_config_cache()
     return True
 
 
@@ -165,12 +249,8 @@ def test_mikrotik_config_connection(db: Session, config_id: str) -> tuple[bool,
     return success, error
 
 
-def get_mikrotik_config_with_decrypted_password(db: Session, config_id: str) -> Optional[dict]:
-    """Получить конфигурацию с расшифрованным паролем (только для использования внутри системы)."""
-    config = get_mikrotik_config_by_id(db, config_id)
-    if not config:
-        return None
-    
+def _config_to_decrypted_dict(config: MikroTikConfig) -> dict:
+    """Словарь конфигурации с расшифрованным паролем."""
     password = None
     if config.password:
         try:
@@ -187,6 +267,25 @@ def get_mikrotik_config_with_decrypted_password(db: Session, config_id: str) ->
         "password": password,
         "ssh_key_path": config.ssh_key_path,
         "connection_type": config.connection_type.value,
+        # Enum кладем в словарь один раз, чтобы вызовы MikroTik не разбирали строку заново
+        "connection_type_enum": config.connection_type,
         "is_active": config.is_active,
         "last_connection_test": config.last_connection_test,
+        "config_version": config.config_version,
     }
+
+
+def get_mikrotik_config_with_decrypted_password(db: Session, config_id: str) -> Optional[dict]:
+    """Получить конфигурацию с расшифрованным паролем (только для использования внутри системы)."""
+    config = get_mikrotik_config_by_id(db, config_id)
+    if not config:
+        return None
+    return _config_to_decrypted_dict(config)
+
+
+def get_active_mikrotik_config_decrypted(db: Session) -> Optional[dict]:
+    """Получить активную конфигурацию с расшифрованным паролем одним запросом."""
+    config = get_active_mikrotik_config(db)
+    if not config:
+        return None
+    return _config_to_decrypted_dict(config)
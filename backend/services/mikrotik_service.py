@@ -2,18 +2,24 @@
 Сервис для взаимодействия с MikroTik роутером через SSH и RouterOS API.
 """
 import paramiko
-import json
+import codecs
+import hashlib
 import re
+import select as io_select
 import ssl
-from typing import Optional, List, Dict, Any
+import sys
+import threading
+import time
+import uuid
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Union
 from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+from backend.database import SessionLocal
 from backend.models.mikrotik_config import MikroTikConfig, ConnectionType
 from backend.services.settings_service import get_settings_dict, set_setting, get_setting_value
-from backend.services.mikrotik_config_service import (
-    get_active_mikrotik_config as get_active_config_db,
-    get_mikrotik_config_with_decrypted_password,
-)
+from backend.services.mikrotik_config_service import get_active_mikrotik_config_decrypted
 
 
 class MikroTikConnectionError(Exception):
@@ -21,15 +27,88 @@ class MikroTikConnectionError(Exception):
     pass
 
 
+def _auth_fingerprint(secret: Optional[str]) -> str:
+    """Отпечаток пароля/ключа для ключа пула (сам секрет в ключе не хранится)."""
+    return hashlib.sha256((secret or "").encode("utf-8")).hexdigest()
+
+
+# Пул SSH-подключений: TCP + обмен ключами + аутентификация на роутере занимают сотни мс,
+# а команда — единицы. Каждая команда выполняется в своем канале, поэтому подключение
+# можно отдавать следующей операции, пока transport жив. Простаивающие дольше
+# _SSH_POOL_MAX_IDLE_SECONDS закрываются при следующем обращении к пулу.
+_SSH_POOL_MAX_IDLE_SECONDS = 120.0
+_SSH_POOL_MAX_PER_KEY = 4
+# (host, port, username, отпечаток пароля, путь к ключу) -> [(paramiko.SSHClient, last_used)]
+_SSH_POOL: Dict[tuple, List[tuple]] = {}
+_SSH_POOL_LOCK = threading.Lock()
+
+# Вывод команды читается кусками и декодируется по мере получения, а не одним буфером bytes
+_SSH_READ_CHUNK_SIZE = 4096
+_utf8_decoder = codecs.getincrementaldecoder("utf-8")
+
+
+def _ssh_transport_is_active(client: paramiko.SSHClient) -> bool:
+    transport = client.get_transport()
+    return transport is not None and transport.is_active()
+
+
+def _checkout_ssh(key: tuple) -> Optional[paramiko.SSHClient]:
+    """Взять живое SSH-подключение из пула или None."""
+    now = time.monotonic()
+    expired: List[paramiko.SSHClient] = []
+    found: Optional[paramiko.SSHClient] = None
+    with _SSH_POOL_LOCK:
+        for pool_key, idle in list(_SSH_POOL.items()):
+            fresh = []
+            for client, last_used in idle:
+                if now - last_used > _SSH_POOL_MAX_IDLE_SECONDS:
+                    expired.append(client)
+                else:
+                    fresh.append((client, last_used))
+            _SSH_POOL[pool_key] = fresh
+        idle = _SSH_POOL.get(key) or []
+        while idle and found is None:
+            client, _ = idle.pop()
+            if _ssh_transport_is_active(client):
+                found = client
+            else:
+                expired.append(client)
+    for client in expired:
+        client.close()
+    return found
+
+
+def _checkin_ssh(key: tuple, client: paramiko.SSHClient) -> None:
+    """Вернуть SSH-подключение в пул (оборванные и лишние закрываются)."""
+    if _ssh_transport_is_active(client):
+        with _SSH_POOL_LOCK:
+            idle = _SSH_POOL.setdefault(key, [])
+            if len(idle) < _SSH_POOL_MAX_PER_KEY:
+                idle.append((client, time.monotonic()))
+                return
+    client.close()
+
+
 class MikroTikSSHClient:
     """Клиент для работы с MikroTik через SSH."""
     
-    def __init__(self, host: str, port: int, username: str, password: Optional[str] = None, ssh_key_path: Optional[str] = None):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: Optional[str] = None,
+        ssh_key_path: Optional[str] = None,
+        pooled: bool = True,
+    ):
         self.host = host
         self.port = port
         self.username = username
         self.password = password
         self.ssh_key_path = ssh_key_path
+        # pooled=False — всегда новое подключение (проверка подключения из UI)
+        self.pooled = pooled
+        self._pool_key = (host, int(port), username, _auth_fingerprint(password), ssh_key_path)
         self.client: Optional[paramiko.SSHClient] = None
 
     def _load_private_key(self, path: str):
@@ -61,7 +140,11 @@ class MikroTikSSHClient:
         )
     
     def connect(self) -> None:
-        """Подключиться к MikroTik."""
+        """Подключиться к MikroTik (или взять подключение из пула)."""
+        if self.pooled:
+            self.client = _checkout_ssh(self._pool_key)
+            if self.client is not None:
+                return
         try:
             self.client = paramiko.SSHClient()
             self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -146,41 +229,180 @@ class MikroTikSSHClient:
     
     def execute_command(self, command: str) -> str:
         """Выполнить команду на MikroTik."""
+        return "".join(self.iter_command_output(command)).strip()
+
+    def iter_command_output(self, command: str) -> Iterator[str]:
+        """
+        Выполнить команду на MikroTik и отдавать вывод текстом по мере получения.
+
+        stdout читается кусками по _SSH_READ_CHUNK_SIZE через инкрементальный UTF-8 декодер
+        (многобайтный символ на границе куска дожидается продолжения), поэтому вывод
+        не держится в памяти целиком в bytes и разбор может идти параллельно с передачей.
+        """
         if not self.client:
             raise MikroTikConnectionError("Not connected to MikroTik")
         
         try:
             stdin, stdout, stderr = self.client.exec_command(command)
-            output = stdout.read().decode('utf-8')
+            decoder = _utf8_decoder()
+            while True:
+                chunk = stdout.read(_SSH_READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                text = decoder.decode(chunk)
+                if text:
+                    yield text
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text
             error = stderr.read().decode('utf-8')
             
             if error:
                 raise MikroTikConnectionError(f"MikroTik command error: {error}")
-            
-            return output.strip()
         except Exception as e:
             raise MikroTikConnectionError(f"Failed to execute command: {str(e)}")
     
+    def execute_many(self, commands: List[str]) -> List[str]:
+        """
+        Выполнить несколько команд одним скриптом в одном SSH-канале (вместо канала на команду).
+
+        Каждая команда обернута в :do/on-error, чтобы ошибка одной не прерывала остальные
+        (ее вывод начинается с "failure:"), а после нее печатается уникальный маркер,
+        по которому общий вывод делится на выводы отдельных команд.
+        """
+        if not commands:
+            return []
+        marker = f"<<<END_{uuid.uuid4().hex[:12]}_"
+        script = "\n".join(
+            f':do {{ {command} }} on-error={{ :put "failure: command {i} failed" }}\n:put "{marker}{i}>>>"'
+            for i, command in enumerate(commands)
+        )
+        rest = self.execute_command(script)
+        outputs: List[str] = []
+        for i in range(len(commands)):
+            chunk, found, rest = rest.partition(f"{marker}{i}>>>")
+            if not found:
+                # Скрипт прерван целиком (например, синтаксическая ошибка)
+                raise MikroTikConnectionError(f"MikroTik batch aborted at command {i}: {chunk.strip()}")
+            outputs.append(chunk.strip())
+        return outputs
+
+    def __enter__(self) -> "MikroTikSSHClient":
+        """Подключение на время блока with: по выходу оно возвращается в пул (см. disconnect)."""
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.disconnect()
+
     def disconnect(self) -> None:
-        """Отключиться от MikroTik."""
-        if self.client:
-            self.client.close()
-            self.client = None
+        """Отключиться от MikroTik: живое подключение возвращается в пул."""
+        client, self.client = self.client, None
+        if client is None:
+            return
+        if self.pooled:
+            _checkin_ssh(self._pool_key, client)
+        else:
+            client.close()
+
+
+# Пул подключений RouterOS API: login и (для API-SSL) TLS handshake выполняются один раз,
+# следующие операции берут готовое подключение. Перед выдачей сокет проверяется локально
+# (без запроса к роутеру); подключение, простоявшее дольше _API_POOL_PROBE_AFTER_SECONDS,
+# дополнительно проверяется /system/identity/print, дольше _API_POOL_MAX_IDLE_SECONDS — закрывается.
+_API_POOL_PROBE_AFTER_SECONDS = 30.0
+_API_POOL_MAX_IDLE_SECONDS = 300.0
+_API_POOL_MAX_PER_KEY = 4
+# (host, port, username, отпечаток пароля, use_ssl) -> [(api, last_used)]
+_API_POOL: Dict[tuple, List[tuple]] = {}
+_API_POOL_LOCK = threading.Lock()
+
+
+def _close_routeros_api(api) -> None:
+    try:
+        if hasattr(api, "close"):
+            api.close()
+    except Exception:  # noqa: BLE001
+        pass
+
+
+def _routeros_api_socket_is_open(api) -> Optional[bool]:
+    """
+    Локальная проверка сокета простаивающего подключения без обмена с роутером.
+
+    В простое роутер ничего не присылает: если сокет доступен для чтения, это закрытие
+    соединения (EOF) или !fatal — подключение непригодно. None — сокет недоступен
+    (другая версия librouteros), тогда остается только проверка запросом.
+    """
+    sock = getattr(getattr(getattr(api, "protocol", None), "transport", None), "sock", None)
+    if sock is None:
+        return None
+    try:
+        if isinstance(sock, ssl.SSLSocket) and sock.pending():
+            return False
+        readable, _, _ = io_select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+
+def _checkout_routeros_api(key: tuple):
+    """Взять живое подключение из пула или None."""
+    while True:
+        with _API_POOL_LOCK:
+            idle = _API_POOL.get(key)
+            if not idle:
+                return None
+            api, last_used = idle.pop()
+        idle_for = time.monotonic() - last_used
+        if idle_for > _API_POOL_MAX_IDLE_SECONDS:
+            _close_routeros_api(api)
+            continue
+        socket_open = _routeros_api_socket_is_open(api)
+        if socket_open is False:
+            _close_routeros_api(api)
+            continue
+        # Запрос к роутеру — только для долго простоявших: разорванное без FIN соединение
+        # локально не видно
+        if idle_for > _API_POOL_PROBE_AFTER_SECONDS:
+            try:
+                tuple(api("/system/identity/print"))
+            except Exception:  # noqa: BLE001
+                _close_routeros_api(api)
+                continue
+        return api
+
+
+def _checkin_routeros_api(key: tuple, api) -> None:
+    """Вернуть подключение в пул (лишние сверх _API_POOL_MAX_PER_KEY закрываются)."""
+    with _API_POOL_LOCK:
+        idle = _API_POOL.setdefault(key, [])
+        if len(idle) < _API_POOL_MAX_PER_KEY:
+            idle.append((api, time.monotonic()))
+            return
+    _close_routeros_api(api)
 
 
 class MikroTikAPIClient:
     """Клиент для работы с MikroTik через RouterOS API (8728/8729)."""
 
-    def __init__(self, host: str, port: int, username: str, password: str, use_ssl: bool = False):
+    def __init__(self, host: str, port: int, username: str, password: str, use_ssl: bool = False, pooled: bool = True):
         self.host = host
         self.port = int(port)
         self.username = username
         self.password = password
         self.use_ssl = use_ssl
+        # pooled=False — всегда новое подключение (проверка подключения из UI)
+        self.pooled = pooled
+        self._pool_key = (self.host, self.port, self.username, _auth_fingerprint(password), use_ssl)
         self._api = None
 
     def connect(self) -> None:
-        """Подключиться к RouterOS API."""
+        """Подключиться к RouterOS API (или взять подключение из пула)."""
+        if self.pooled:
+            self._api = _checkout_routeros_api(self._pool_key)
+            if self._api is not None:
+                return
         try:
             from librouteros import connect as ros_connect  # local import: optional dependency
 
@@ -201,15 +423,29 @@ class MikroTikAPIClient:
         except Exception as e:
             raise MikroTikConnectionError(f"Failed to connect to MikroTik RouterOS API: {str(e)}")
 
+    def __enter__(self) -> "MikroTikAPIClient":
+        """Подключение на время блока with: по выходу оно возвращается в пул (см. disconnect)."""
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # Исключение из блока with видно в sys.exc_info(): disconnect закроет подключение
+        self.disconnect()
+
     def disconnect(self) -> None:
-        """Отключиться."""
-        try:
-            if self._api is None:
-                return
-            if hasattr(self._api, "close"):
-                self._api.close()
-        finally:
-            self._api = None
+        """
+        Отключиться: подключение возвращается в пул.
+
+        Если disconnect вызван из finally или блока with при исключении, подключение
+        может быть в неизвестном состоянии — оно закрывается, а не возвращается в пул.
+        """
+        api, self._api = self._api, None
+        if api is None:
+            return
+        if self.pooled and sys.exc_info()[1] is None:
+            _checkin_routeros_api(self._pool_key, api)
+        else:
+            _close_routeros_api(api)
 
     def path(self, path: str):
         if self._api is None:
@@ -223,6 +459,20 @@ class MikroTikAPIClient:
             raise MikroTikConnectionError("Not connected to MikroTik RouterOS API")
         return self._api(cmd)
 
+    def query(self, path: str, **filters: str) -> List[Dict[str, Any]]:
+        """
+        print с фильтрами на стороне роутера: query(path, chain="forward") -> '?chain=forward'.
+        Роутер возвращает только подходящие записи вместо всей таблицы.
+        """
+        if self._api is None:
+            raise MikroTikConnectionError("Not connected to MikroTik RouterOS API")
+        cmd = "/" + (path or "").strip("/") + "/print"
+        words = [f"?{key}={value}" for key, value in filters.items()]
+        if len(words) > 1:
+            # Условия RouterOS API складываются стеком: "?#&" объединяет их через AND
+            words.append("?#" + "&" * (len(words) - 1))
+        return list(self._api.rawCmd(cmd, *words))
+
 
 # get_active_mikrotik_config теперь импортируется из mikrotik_config_service
 
@@ -241,28 +491,26 @@ def test_mikrotik_connection(
     """
     try:
         if connection_type == ConnectionType.SSH_PASSWORD or connection_type == ConnectionType.SSH_KEY:
-            client = MikroTikSSHClient(
+            with MikroTikSSHClient(
                 host=host,
                 port=port,
                 username=username,
                 password=password if connection_type == ConnectionType.SSH_PASSWORD else None,
                 ssh_key_path=ssh_key_path if connection_type == ConnectionType.SSH_KEY else None,
-            )
-            client.connect()
-            # Выполняем простую команду для проверки
-            client.execute_command("/system identity print")
-            client.disconnect()
+                pooled=False,
+            ) as client:
+                # Выполняем простую команду для проверки
+                client.execute_command("/system identity print")
         elif connection_type in {ConnectionType.API, ConnectionType.API_SSL}:
-            client = MikroTikAPIClient(
+            with MikroTikAPIClient(
                 host=host,
                 port=port,
                 username=username,
                 password=password or "",
                 use_ssl=(connection_type == ConnectionType.API_SSL),
-            )
-            client.connect()
-            client.call("/system/identity/print")
-            client.disconnect()
+                pooled=False,
+            ) as client:
+                client.call("/system/identity/print")
         else:
             return False, "Unsupported connection type"
         
@@ -273,34 +521,109 @@ def test_mikrotik_connection(
         return False, f"Unexpected error: {str(e)}"
 
 
+# Активная конфигурация с расшифрованным паролем: каждая операция с MikroTik начинается с нее,
+# а меняется она редко. Пароль хранится только в памяти процесса и никуда не логируется.
+# Изменения через mikrotik_config_service сбрасывают кэш сразу (version), изменения из другого
+# процесса (Telegram-бот) подхватываются по TTL. По истечении TTL сначала читается только
+# (id, config_version) активной строки: если они не изменились, кэш продлевается без расшифровки,
+# а если БД недоступна — используется последняя известная конфигурация.
+_ACTIVE_CONFIG_CACHE_TTL_SECONDS = 30.0
+_ACTIVE_CONFIG_CACHE: Dict[str, Any] = {"value": None, "expires_at": 0.0, "version": 0}
+_ACTIVE_CONFIG_LOCK = threading.Lock()
+
+
+def invalidate_active_config_cache() -> None:
+    """Сбросить кэш активной конфигурации (вызывать после изменения конфигураций MikroTik)."""
+    with _ACTIVE_CONFIG_LOCK:
+        _ACTIVE_CONFIG_CACHE["value"] = None
+        _ACTIVE_CONFIG_CACHE["expires_at"] = 0.0
+        _ACTIVE_CONFIG_CACHE["version"] += 1
+
+
 def _get_active_config_dict(db: Session) -> Dict[str, Any]:
     """Вспомогательная функция для получения активной конфигурации с расшифрованным паролем."""
-    active_config = get_active_config_db(db)
-    if not active_config:
-        raise MikroTikConnectionError("No active MikroTik configuration found")
-    config_data = get_mikrotik_config_with_decrypted_password(db, active_config.id)
+    with _ACTIVE_CONFIG_LOCK:
+        cached = _ACTIVE_CONFIG_CACHE["value"]
+        if cached is not None and time.monotonic() < _ACTIVE_CONFIG_CACHE["expires_at"]:
+            return dict(cached)
+        version = _ACTIVE_CONFIG_CACHE["version"]
+
+    if cached is not None:
+        try:
+            stamp = _load_active_config_stamp()
+        except SQLAlchemyError:
+            # БД временно недоступна (например, занята записью): роутер от этого не зависит
+            return dict(cached)
+        if stamp == (cached["id"], cached["config_version"]):
+            with _ACTIVE_CONFIG_LOCK:
+                if _ACTIVE_CONFIG_CACHE["version"] == version:
+                    _ACTIVE_CONFIG_CACHE["expires_at"] = time.monotonic() + _ACTIVE_CONFIG_CACHE_TTL_SECONDS
+            return dict(cached)
+
+    config_data = _load_active_config_dict()
+
+    with _ACTIVE_CONFIG_LOCK:
+        # Если конфигурацию изменили, пока шло чтение из БД, результат не кэшируем
+        if _ACTIVE_CONFIG_CACHE["version"] == version:
+            _ACTIVE_CONFIG_CACHE["value"] = config_data
+            _ACTIVE_CONFIG_CACHE["expires_at"] = time.monotonic() + _ACTIVE_CONFIG_CACHE_TTL_SECONDS
+    return dict(config_data)
+
+
+def _load_active_config_stamp() -> Optional[tuple]:
+    """(id, config_version) активной конфигурации: легкий запрос по частичному индексу, без пароля."""
+    with SessionLocal() as config_db:
+        row = config_db.execute(
+            select(MikroTikConfig.id, MikroTikConfig.config_version).where(
+                MikroTikConfig.is_active == True  # noqa: E712
+            )
+        ).first()
+    return tuple(row) if row is not None else None
+
+
+def _load_active_config_dict() -> Dict[str, Any]:
+    """
+    Прочитать активную конфигурацию из БД и расшифровать пароль.
+
+    Чтение идет в отдельной короткой сессии: соединение возвращается в пул сразу,
+    а не удерживается сессией вызывающего на все время SSH/API-операции с роутером.
+    """
+    with SessionLocal() as config_db:
+        config_data = get_active_mikrotik_config_decrypted(config_db)
     if not config_data:
-        raise MikroTikConnectionError("Failed to decrypt MikroTik configuration")
+        raise MikroTikConnectionError("No active MikroTik configuration found")
     return config_data
 
 
-def _is_routeros_api_connection_type(connection_type_value: Any) -> bool:
+# ConnectionType — str-enum, поэтому множество совпадает и с enum, и со строковым значением
+_ROUTEROS_API_CONNECTION_TYPES = frozenset({ConnectionType.API, ConnectionType.API_SSL})
+
+
+def _is_routeros_api_connection_type(connection_type: Any) -> bool:
     """
     Проверка типа подключения для RouterOS API.
     """
-    ct = str(connection_type_value or "").strip()
-    return ct in {ConnectionType.API.value, ConnectionType.API_SSL.value}
+    return connection_type in _ROUTEROS_API_CONNECTION_TYPES
 
 
 def _get_routeros_api_client_from_config(config_data: Dict[str, Any]) -> MikroTikAPIClient:
-    ct = str(config_data.get("connection_type") or "").strip()
-    use_ssl = ct == ConnectionType.API_SSL.value
     return MikroTikAPIClient(
         host=config_data["host"],
         port=int(config_data["port"]),
         username=config_data["username"],
         password=config_data.get("password") or "",
-        use_ssl=use_ssl,
+        use_ssl=config_data["connection_type_enum"] is ConnectionType.API_SSL,
+    )
+
+
+def _get_ssh_client_from_config(config_data: Dict[str, Any]) -> MikroTikSSHClient:
+    connection_type_enum = config_data["connection_type_enum"]
+    return MikroTikSSHClient(
+        host=config_data["host"],
+        port=config_data["port"],
+        username=config_data["username"],
+        password=config_data["password"] if connection_type_enum is ConnectionType.SSH_PASSWORD else None,
+        ssh_key_path=config_data["ssh_key_path"] if connection_type_enum is ConnectionType.SSH_KEY else None,
     )
 
 
@@ -328,10 +651,8 @@ def get_mikrotik_users_with_info(db: Session) -> tuple[List[Dict[str, Any]], str
     config_data = _get_active_config_dict(db)
 
     try:
-        if _is_routeros_api_connection_type(config_data["connection_type"]):
-            client = _get_routeros_api_client_from_config(config_data)
-            client.connect()
-            try:
+        if _is_routeros_api_connection_type(config_data["connection_type_enum"]):
+            with _get_routeros_api_client_from_config(config_data) as client:
                 def _normalize_user_list(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
                     for u in items:
                         if isinstance(u, dict):
@@ -363,34 +684,21 @@ def get_mikrotik_users_with_info(db: Session) -> tuple[List[Dict[str, Any]], str
                 if secrets:
                     warning = "User Manager не установлен/недоступен на MikroTik — отображаем PPP secrets."
                 return secrets, "ppp_secret", warning
-            finally:
-                client.disconnect()
         else:
             # SSH подключение
-            connection_type_enum = ConnectionType(config_data["connection_type"])
-            client = MikroTikSSHClient(
-                host=config_data["host"],
-                port=config_data["port"],
-                username=config_data["username"],
-                password=config_data["password"] if connection_type_enum == ConnectionType.SSH_PASSWORD else None,
-                ssh_key_path=config_data["ssh_key_path"] if connection_type_enum == ConnectionType.SSH_KEY else None,
-            )
-            client.connect()
-            # 1) пробуем User Manager (RouterOS v7: /user-manager)
-            output = client.execute_command("/user-manager user print detail")
-            if not _is_routeros_cli_error_output(output):
-                client.disconnect()
-                return _parse_user_manager_output(output), "user_manager", None
-
-            # 1b) старый путь (встречается в некоторых сборках/доках)
-            output = client.execute_command("/tool user-manager user print detail")
-            if not _is_routeros_cli_error_output(output):
-                client.disconnect()
-                return _parse_user_manager_output(output), "user_manager", None
-
-            # 2) fallback на PPP secrets
-            output = client.execute_command("/ppp secret print detail")
-            client.disconnect()
+            with _get_ssh_client_from_config(config_data) as client:
+                # 1) пробуем User Manager (RouterOS v7: /user-manager)
+                output = client.execute_command("/user-manager user print detail")
+                if not _is_routeros_cli_error_output(output):
+                    return _parse_user_manager_output(output), "user_manager", None
+
+                # 1b) старый путь (встречается в некоторых сборках/доках)
+                output = client.execute_command("/tool user-manager user print detail")
+                if not _is_routeros_cli_error_output(output):
+                    return _parse_user_manager_output(output), "user_manager", None
+
+                # 2) fallback на PPP secrets
+                output = client.execute_command("/ppp secret print detail")
             secrets = _parse_ppp_print_detail_output(output, username_key="name")
             warning = (
                 None
@@ -404,64 +712,101 @@ def get_mikrotik_users_with_info(db: Session) -> tuple[List[Dict[str, Any]], str
         raise MikroTikConnectionError(f"Failed to get MikroTik users: {str(e)}")
 
 
-def _parse_user_output(output: str) -> List[Dict[str, Any]]:
-    """Парсинг вывода команды /user print detail (упрощенный вариант)."""
-    # Это упрощенный парсер, в реальности нужен более сложный парсинг
-    users = []
-    lines = output.split('\n')
-    current_user = {}
-    
-    for line in lines:
-        line = line.strip()
-        if line.startswith('Flags:'):
-            if current_user:
-                users.append(current_user)
-                current_user = {}
-        elif '=' in line:
-            parts = line.split('=', 1)
-            if len(parts) == 2:
-                key = parts[0].strip()
-                value = parts[1].strip()
-                current_user[key] = value
-    
-    if current_user:
-        users.append(current_user)
-    
-    return users
+# Маркеры ошибок RouterOS CLI; сообщение об ошибке всегда в начале вывода
+_CLI_ERR_MARKERS = ("bad command name", "no such item", "input does not match", "syntax error")
+_CLI_ERR_HEAD_CHARS = 256
 
 
 def _is_routeros_cli_error_output(output: str) -> bool:
     """
     RouterOS иногда пишет ошибки в stdout (а не в stderr),
     поэтому проверяем текст вывода на типичные маркеры ошибок.
+    Смотрим только начало вывода: большой print detail не копируется целиком.
     """
-    text = (output or "").strip().lower()
-    if not text:
+    if not output:
         return False
-    return (
-        "bad command name" in text
-        or "no such item" in text
-        or "input does not match" in text
-        or "syntax error" in text
-        or text.startswith("failure:")
-    )
+    head = output[:_CLI_ERR_HEAD_CHARS].lstrip().lower()
+    if not head:
+        return False
+    return head.startswith("failure:") or any(marker in head for marker in _CLI_ERR_MARKERS)
+
+
+_ROS_QUOTE_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    '"': '\\"',
+    "$": "\\$",
+    "\r": "\\r",
+    "\n": "\\n",
+    "\t": "\\t",
+})
+_ROS_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+
+
+def _ros_quote(value: Any) -> str:
+    """
+    Значение в кавычках для команды RouterOS CLI.
+    Экранируются \\, ", $ (подстановка переменных) и \\r, \\n, \\t — иначе перевод строки
+    завершил бы команду и начал новую. Прочие управляющие символы отклоняются.
+    """
+    text = str(value)
+    if _ROS_CONTROL_CHARS.search(text):
+        raise ValueError("Control characters are not allowed in RouterOS values")
+    return f'"{text.translate(_ROS_QUOTE_ESCAPES)}"'
+
+
+_ROS_REGEX_SPECIAL = frozenset("\\^$.|?*+()[]{}")
+
+
+def _ros_icase_regex(text: str) -> Optional[str]:
+    """
+    POSIX-регулярка RouterOS для поиска подстроки без учета регистра ('vpn' -> '[vV][pP][nN]').
+    Для не-ASCII строк возвращает None: классы [аА] из многобайтных символов RouterOS не понимает.
+    """
+    if not text.isascii():
+        return None
+    parts = []
+    for ch in text:
+        if ch.isalpha():
+            parts.append(f"[{ch.lower()}{ch.upper()}]")
+        elif ch in _ROS_REGEX_SPECIAL:
+            parts.append("\\" + ch)
+        else:
+            parts.append(ch)
+    return "".join(parts)
 
 
 # ВАЖНО: RouterOS часто использует ключи вида ".id=*1", поэтому поддерживаем точку в имени ключа.
 # Также значения часто НЕ в кавычках (chain=forward, action=accept, .id=*1),
 # поэтому используем \S+ (а не литеральное \\S+).
-_KV_RE = re.compile(r'([A-Za-z0-9_.-]+)=("([^"\\]|\\.)*"|\S+)')
+# Группы: (ключ, значение в кавычках без кавычек, значение без кавычек) — findall разбирает
+# весь текст за один проход в C, без отдельного объекта Match на каждую пару.
+_KV_RE = re.compile(r'([A-Za-z0-9_.-]+)=(?:"((?:[^"\\]|\\.)*)"|(\S+))')
+
+# Начало записи в выводе print detail: индекс и (необязательно) флаги — "0 X ...", "1   ..."
+_ROS_RECORD_START_RE = re.compile(r"^[ \t]*(\d+)(?=[ \t]|$)(?:[ \t]+([A-Z]+)(?=[ \t]|$))?", re.M)
 
 
 def _parse_kv_pairs_from_line(line: str) -> Dict[str, str]:
-    result: Dict[str, str] = {}
-    for m in _KV_RE.finditer(line):
-        key = m.group(1)
-        value = m.group(2)
-        if value.startswith('"') and value.endswith('"') and len(value) >= 2:
-            value = value[1:-1]
-        result[key] = value
-    return result
+    # Для совпавшей альтернативы вторая группа пустая: у значения без кавычек quoted == ""
+    return {key: quoted or bare for key, quoted, bare in _KV_RE.findall(line)}
+
+
+def _split_ros_comments(text: str) -> tuple[str, Optional[str]]:
+    """Убрать из текста комментарии ';;;'. Returns: (текст без комментариев, последний комментарий)."""
+    if ";;;" not in text:
+        return text, None
+    kept = []
+    comment: Optional[str] = None
+    for line in text.split("\n"):
+        before, sep, after = line.partition(";;;")
+        kept.append(before)
+        if sep and after.strip():
+            comment = after.strip()
+    return "\n".join(kept), comment
+
+
+_ROS_TRUE_VALUES = frozenset({"true", "yes", "enabled", "enable", "1"})
+_ROS_FALSE_VALUES = frozenset({"false", "no", "disabled", "disable", "0"})
 
 
 def _normalize_bool(value: Any) -> Optional[bool]:
@@ -473,9 +818,9 @@ def _normalize_bool(value: Any) -> Optional[bool]:
     if isinstance(value, (int, float)):
         return bool(value)
     s = str(value).strip().lower()
-    if s in {"true", "yes", "enabled", "enable", "1"}:
+    if s in _ROS_TRUE_VALUES:
         return True
-    if s in {"false", "no", "disabled", "disable", "0"}:
+    if s in _ROS_FALSE_VALUES:
         return False
     return None
 
@@ -535,38 +880,42 @@ def _split_routeros_index_and_flags(line: str) -> tuple[Optional[int], str, str]
     return None, "", line.strip()
 
 
+# Комментарий RouterOS ";;;" до конца строки
+_ROS_COMMENT_RE = re.compile(r";;;[^\n]*")
+# Строка print detail: (индекс, флаги, остаток); индекс и флаги необязательны
+_PPP_LINE_RE = re.compile(r"^[ \t]*(?:(\d+)(?=\s|$)(?:[ \t]+([A-Z]+)(?=\s|$))?)?[ \t]*(.*)$", re.M)
+
+
 def _parse_ppp_print_detail_output(output: str, username_key: str = "name") -> List[Dict[str, Any]]:
     """
     Парсинг вывода RouterOS `print detail` для PPP сущностей (`/ppp secret` и `/ppp active`).
     Учитывает формат "одна запись в одной строке" (с индексом в начале).
+
+    Комментарии ";;;" вырезаются одной заменой по всему выводу, индекс, флаги и остаток
+    строки дает одна регулярка, пары key=value — один findall по остатку.
     """
     items: List[Dict[str, Any]] = []
-    for raw_line in (output or "").splitlines():
-        line = raw_line.strip()
-        if not line or line.startswith("Flags:") or line.startswith("#"):
+    text = output or ""
+    if ";;;" in text:
+        text = _ROS_COMMENT_RE.sub("", text)
+    for number, flags, rest in _PPP_LINE_RE.findall(text):
+        # Заголовки "Flags: ..." и "# ..." (у них нет индекса)
+        if not number and (rest.startswith("Flags:") or rest.startswith("#")):
             continue
-        # убираем комментарии RouterOS ";;;" (если есть)
-        if ";;;" in line:
-            line = line.split(";;;", 1)[0].strip()
-        number, flags, rest = _split_routeros_index_and_flags(line)
-        # для PPP вывод обычно "одна запись в одной строке"; index/flags (если есть) отрезаем
-        line = rest
 
-        kv = _parse_kv_pairs_from_line(line)
+        kv = _parse_kv_pairs_from_line(rest)
         if not kv:
             continue
 
-        if number is not None:
-            kv["number"] = number
+        if number:
+            kv["number"] = int(number)
 
-        # disabled: либо флаг X, либо поле disabled=
-        disabled_from_flags = True if "X" in (flags or "") else None
-        disabled_from_field = _normalize_bool(kv.get("disabled"))
-        kv["disabled"] = (
-            disabled_from_field
-            if disabled_from_field is not None
-            else disabled_from_flags
-        )
+        # disabled: поле disabled=, иначе флаг X
+        disabled = kv.get("disabled")
+        if disabled is not None:
+            disabled = disabled.strip().lower()
+            disabled = True if disabled in _ROS_TRUE_VALUES else False if disabled in _ROS_FALSE_VALUES else None
+        kv["disabled"] = disabled if disabled is not None else (True if "X" in flags else None)
 
         # нормализуем "user" для совместимости с логикой сессий
         if "user" not in kv:
@@ -591,10 +940,8 @@ def create_mikrotik_user(
     config_data = _get_active_config_dict(db)
     
     try:
-        if _is_routeros_api_connection_type(config_data["connection_type"]):
-            client = _get_routeros_api_client_from_config(config_data)
-            client.connect()
-            try:
+        if _is_routeros_api_connection_type(config_data["connection_type_enum"]):
+            with _get_routeros_api_client_from_config(config_data) as client:
                 # 1) User Manager
                 try:
                     um = client.path("user-manager/user")
@@ -615,44 +962,108 @@ def create_mikrotik_user(
                         data["profile"] = profile
                     secrets.add(**data)
                     return {"name": username, "status": "created"}
-            finally:
-                client.disconnect()
         else:
             # SSH подключение
-            connection_type_enum = ConnectionType(config_data["connection_type"])
-            client = MikroTikSSHClient(
-                host=config_data["host"],
-                port=config_data["port"],
-                username=config_data["username"],
-                password=config_data["password"] if connection_type_enum == ConnectionType.SSH_PASSWORD else None,
-                ssh_key_path=config_data["ssh_key_path"] if connection_type_enum == ConnectionType.SSH_KEY else None,
-            )
-            client.connect()
-            # 1) User Manager
-            out = client.execute_command(
-                f'/tool user-manager user add customer="admin" username="{username}" password="{password}"'
+            with _get_ssh_client_from_config(config_data) as client:
+                # 1) User Manager
+                name = _ros_quote(username)
+                out = client.execute_command(
+                    f'/tool user-manager user add customer="admin" username={name} password={_ros_quote(password)}'
+                )
+                if _is_routeros_cli_error_output(out):
+                    # 2) PPP secret fallback
+                    cmd = f"/ppp secret add name={name} password={_ros_quote(password)} service=any"
+                    if profile:
+                        cmd += f" profile={_ros_quote(profile)}"
+                    out2 = client.execute_command(cmd)
+                    if _is_routeros_cli_error_output(out2):
+                        raise MikroTikConnectionError(f"Failed to create PPP secret: {out2 or out}")
+                else:
+                    if profile:
+                        try:
+                            client.execute_command(
+                                f'/tool user-manager user create-and-activate-profile customer="admin" numbers={name} profile={_ros_quote(profile)}'
+                            )
+                        except Exception:
+                            pass
+            return {"name": username, "status": "created"}
+    except Exception as e:
+        raise MikroTikConnectionError(f"Failed to create MikroTik user: {str(e)}")
+
+
+def bulk_create_mikrotik_users(db: Session, users: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Создать несколько VPN пользователей за одно подключение.
+
+    users: [{"username": ..., "password": ..., "profile": ... (необязательно)}, ...]
+    Returns: для каждого пользователя {"name", "status": "created"} или {"name", "status": "error", "error"}.
+    По SSH все команды выполняются одним скриптом (MikroTikSSHClient.execute_many).
+    """
+    if not users:
+        return []
+    config_data = _get_active_config_dict(db)
+    results: List[Dict[str, Any]] = []
+
+    try:
+        if _is_routeros_api_connection_type(config_data["connection_type_enum"]):
+            with _get_routeros_api_client_from_config(config_data) as client:
+                # API-команды и так идут по одному подключению; порядок попыток — как в create_mikrotik_user
+                for item in users:
+                    username = item["username"]
+                    try:
+                        try:
+                            client.path("user-manager/user").add(
+                                customer="admin", username=username, password=item["password"]
+                            )
+                        except Exception:
+                            data: Dict[str, Any] = {"name": username, "password": item["password"], "service": "any"}
+                            if item.get("profile"):
+                                data["profile"] = item["profile"]
+                            client.path("ppp/secret").add(**data)
+                        results.append({"name": username, "status": "created"})
+                    except Exception as e:  # noqa: BLE001
+                        results.append({"name": username, "status": "error", "error": str(e)})
+            return results
+
+        # SSH: User Manager или PPP secrets выбираются один раз для всей пачки
+        with _get_ssh_client_from_config(config_data) as client:
+            use_user_manager = not _is_routeros_cli_error_output(
+                client.execute_command("/tool user-manager user print count-only")
             )
+            commands: List[str] = []
+            owners: List[int] = []
+            for index, item in enumerate(users):
+                name = _ros_quote(item["username"])
+                password = _ros_quote(item["password"])
+                profile = item.get("profile")
+                if use_user_manager:
+                    commands.append(f'/tool user-manager user add customer="admin" username={name} password={password}')
+                    owners.append(index)
+                    if profile:
+                        # Ошибка активации профиля не считается ошибкой создания (как в create_mikrotik_user)
+                        commands.append(
+                            f'/tool user-manager user create-and-activate-profile customer="admin" numbers={name} profile={_ros_quote(profile)}'
+                        )
+                        owners.append(-1)
+                else:
+                    cmd = f"/ppp secret add name={name} password={password} service=any"
+                    if profile:
+                        cmd += f" profile={_ros_quote(profile)}"
+                    commands.append(cmd)
+                    owners.append(index)
+            outputs = client.execute_many(commands)
+
+        for index, out in zip(owners, outputs):
+            if index < 0:
+                continue
+            name = users[index]["username"]
             if _is_routeros_cli_error_output(out):
-                # 2) PPP secret fallback
-                cmd = f'/ppp secret add name="{username}" password="{password}" service=any'
-                if profile:
-                    cmd += f' profile="{profile}"'
-                out2 = client.execute_command(cmd)
-                if _is_routeros_cli_error_output(out2):
-                    client.disconnect()
-                    raise MikroTikConnectionError(f"Failed to create PPP secret: {out2 or out}")
+                results.append({"name": name, "status": "error", "error": out})
             else:
-                if profile:
-                    try:
-                        client.execute_command(
-                            f'/tool user-manager user create-and-activate-profile customer="admin" numbers="{username}" profile="{profile}"'
-                        )
-                    except Exception:
-                        pass
-            client.disconnect()
-            return {"name": username, "status": "created"}
+                results.append({"name": name, "status": "created"})
+        return results
     except Exception as e:
-        raise MikroTikConnectionError(f"Failed to create MikroTik user: {str(e)}")
+        raise MikroTikConnectionError(f"Failed to create MikroTik users: {str(e)}")
 
 
 def delete_mikrotik_user(
@@ -663,54 +1074,36 @@ def delete_mikrotik_user(
     config_data = _get_active_config_dict(db)
     
     try:
-        if _is_routeros_api_connection_type(config_data["connection_type"]):
-            client = _get_routeros_api_client_from_config(config_data)
-            client.connect()
-            try:
-                # 1) User Manager
+        if _is_routeros_api_connection_type(config_data["connection_type_enum"]):
+            with _get_routeros_api_client_from_config(config_data) as client:
+                # Запись ищет роутер (?name=...), вместо выгрузки всей таблицы пользователей
+                # 1) User Manager (v7: name, старые версии: username)
                 for um_path in ("user-manager/user", "tool/user-manager/user"):
                     try:
-                        um = client.path(um_path)
-                        users = list(um)
-                        for u in users:
-                            if u.get("username") == username or u.get("name") == username:
-                                rid = u.get(".id") or u.get("id")
-                                if rid:
-                                    um.remove(rid)
-                                    return
+                        matches = client.query(um_path, name=username) or client.query(um_path, username=username)
+                        for u in matches:
+                            rid = u.get(".id") or u.get("id")
+                            if rid:
+                                client.path(um_path).remove(rid)
+                                return
                     except Exception:
                         pass
 
                 # 2) PPP secret fallback
-                secrets = client.path("ppp/secret")
-                items = list(secrets)
-                for s in items:
-                    if s.get("name") == username:
-                        rid = s.get(".id") or s.get("id")
-                        if rid:
-                            secrets.remove(rid)
-                            return
+                for s in client.query("ppp/secret", name=username):
+                    rid = s.get(".id") or s.get("id")
+                    if rid:
+                        client.path("ppp/secret").remove(rid)
+                        return
                 raise MikroTikConnectionError(f"User {username} not found")
-            finally:
-                client.disconnect()
         else:
             # SSH подключение
-            connection_type_enum = ConnectionType(config_data["connection_type"])
-            client = MikroTikSSHClient(
-                host=config_data["host"],
-                port=config_data["port"],
-                username=config_data["username"],
-                password=config_data["password"] if connection_type_enum == ConnectionType.SSH_PASSWORD else None,
-                ssh_key_path=config_data["ssh_key_path"] if connection_type_enum == ConnectionType.SSH_KEY else None,
-            )
-            client.connect()
-            out = client.execute_command(f'/tool user-manager user remove [find username="{username}"]')
-            if _is_routeros_cli_error_output(out):
-                out2 = client.execute_command(f'/ppp secret remove [find name="{username}"]')
-                if _is_routeros_cli_error_output(out2):
-                    client.disconnect()
-                    raise MikroTikConnectionError(f"User {username} not found")
-            client.disconnect()
+            with _get_ssh_client_from_config(config_data) as client:
+                out = client.execute_command(f"/tool user-manager user remove [find username={_ros_quote(username)}]")
+                if _is_routeros_cli_error_output(out):
+                    out2 = client.execute_command(f"/ppp secret remove [find name={_ros_quote(username)}]")
+                    if _is_routeros_cli_error_output(out2):
+                        raise MikroTikConnectionError(f"User {username} not found")
     except Exception as e:
         raise MikroTikConnectionError(f"Failed to delete MikroTik user: {str(e)}")
 
@@ -724,43 +1117,37 @@ def get_firewall_rules(
     config_data = _get_active_config_dict(db)
     
     try:
-        if _is_routeros_api_connection_type(config_data["connection_type"]):
-            client = _get_routeros_api_client_from_config(config_data)
-            client.connect()
-            try:
-                rules = list(client.path("ip/firewall/filter"))
+        if _is_routeros_api_connection_type(config_data["connection_type_enum"]):
+            with _get_routeros_api_client_from_config(config_data) as client:
+                # chain фильтрует роутер; поиск подстроки в комментарии API-запросы не поддерживают
+                rules = client.query("ip/firewall/filter", chain=chain) if chain else list(client.path("ip/firewall/filter"))
                 for r in rules:
                     b = _normalize_bool(r.get("disabled"))
                     if b is not None:
                         r["disabled"] = b
-                if chain:
-                    rules = [r for r in rules if r.get("chain") == chain]
                 if comment:
                     needle = str(comment).lower()
                     rules = [r for r in rules if needle in str(r.get("comment", "")).lower()]
                 return rules
-            finally:
-                client.disconnect()
         else:
             # SSH подключение
-            connection_type_enum = ConnectionType(config_data["connection_type"])
-            client = MikroTikSSHClient(
-                host=config_data["host"],
-                port=config_data["port"],
-                username=config_data["username"],
-                password=config_data["password"] if connection_type_enum == ConnectionType.SSH_PASSWORD else None,
-                ssh_key_path=config_data["ssh_key_path"] if connection_type_enum == ConnectionType.SSH_KEY else None,
-            )
-            client.connect()
+            # Фильтруем на роутере: по сети передаются только подходящие правила
+            conditions = []
+            if chain:
+                conditions.append(f"chain={_ros_quote(chain)}")
+            comment_regex = _ros_icase_regex(str(comment)) if comment else None
+            if comment_regex:
+                conditions.append(f"comment~{_ros_quote(comment_regex)}")
             cmd = "/ip firewall filter print detail"
-            output = client.execute_command(cmd)
-            client.disconnect()
-            # Парсим вывод (упрощенный вариант)
-            rules = _parse_firewall_output(output)
+            if conditions:
+                cmd += " where " + " and ".join(conditions)
+            with _get_ssh_client_from_config(config_data) as client:
+                # Разбираем вывод по мере чтения из канала, не собирая его в одну строку
+                rules = _parse_firewall_output(client.iter_command_output(cmd))
             
-            if chain:
-                rules = [r for r in rules if r.get("chain") == chain]
-            if comment:
+            # Оба условия уже проверил роутер; в Python остается только не-ASCII комментарий,
+            # для которого регулярку без учета регистра не построить
+            if comment and comment_regex is None:
                 needle = str(comment).lower()
                 rules = [r for r in rules if needle in str(r.get("comment", "")).lower()]
             
@@ -769,7 +1156,34 @@ def get_firewall_rules(
         raise MikroTikConnectionError(f"Failed to get firewall rules: {str(e)}")
 
 
-def _parse_firewall_output(output: str) -> List[Dict[str, Any]]:
+def _iter_ros_print_segments(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Разбить поток вывода print detail на сегменты: сначала текст до первой записи
+    (заголовок Flags, может быть пустым), затем по сегменту на запись.
+
+    Запись отдается, как только в потоке появилось начало следующей. Начала ищутся
+    только в полных строках: индекс на границе куска может быть еще не дочитан.
+    """
+    buf = ""
+    for chunk in chunks:
+        buf += chunk
+        complete = buf.rfind("\n") + 1
+        # С позиции 1: начало текущего сегмента (позиция 0) границей не считается
+        cut = 0
+        for m in _ROS_RECORD_START_RE.finditer(buf, 1, complete):
+            yield buf[cut : m.start()]
+            cut = m.start()
+        if cut:
+            buf = buf[cut:]
+    # Последний сегмент ищем до конца текста: после него ничего не придет
+    cut = 0
+    for m in _ROS_RECORD_START_RE.finditer(buf, 1):
+        yield buf[cut : m.start()]
+        cut = m.start()
+    yield buf[cut:]
+
+
+def _parse_firewall_output(output: Union[str, Iterable[str], None]) -> List[Dict[str, Any]]:
     """
     Парсинг вывода RouterOS `/ip firewall filter print detail`.
 
@@ -779,68 +1193,40 @@ def _parse_firewall_output(output: str) -> List[Dict[str, Any]]:
       1   chain=... ...
     Комментарий может быть:
       - inline: `0   ;;; BASE: ...`
-      - отдельной строкой: `;;; BASE: ...`
+      - отдельной строкой: `;;; BASE: ...` (относится к следующей записи)
+
+    output — строка или поток кусков текста (SSHClient.iter_command_output): записи
+    разбираются по мере поступления. Пары key=value каждой записи — одним findall по ее тексту.
     """
+    chunks = (output or "",) if output is None or isinstance(output, str) else output
     rules: List[Dict[str, Any]] = []
-    pending_comment: Optional[str] = None
-    current: Optional[Dict[str, Any]] = None
-    current_flags: str = ""
-
-    for raw_line in (output or "").splitlines():
-        line = raw_line.strip()
-        if not line or line.startswith("Flags:") or line.startswith("#"):
-            continue
 
-        # Комментарий может быть отдельной строкой или inline
-        if ";;;" in line:
-            before, after = line.split(";;;", 1)
-            comment_text = after.strip()
-            if comment_text:
-                pending_comment = comment_text
-            line = before.strip()
-            if not line:
-                continue
-
-        # Новая запись начинается со строки с индексом
-        if line[:1].isdigit():
-            if current:
-                # нормализуем disabled если не установлен из поля
-                if "disabled" not in current or current["disabled"] is None:
-                    current["disabled"] = True if "X" in (current_flags or "") else False
-                rules.append(current)
-
-            number, flags, rest = _split_routeros_index_and_flags(line)
-            current_flags = flags or ""
-            current = {}
-            if number is not None:
-                current["number"] = number
-            # переносим pending comment на запись
-            if pending_comment:
-                current["comment"] = pending_comment
-                pending_comment = None
-
-            kv = _parse_kv_pairs_from_line(rest)
-            if kv:
-                current.update(kv)
-            continue
-
-        # continuation line для текущей записи
-        if current is None:
+    pending_comment: Optional[str] = None
+    for segment in _iter_ros_print_segments(chunks):
+        m = _ROS_RECORD_START_RE.match(segment)
+        if m is None:
+            # Текст до первой записи
+            _, pending_comment = _split_ros_comments(segment)
             continue
-        kv = _parse_kv_pairs_from_line(line)
-        if kv:
-            current.update(kv)
-
-    if current:
-        if "disabled" not in current or current["disabled"] is None:
-            current["disabled"] = True if "X" in (current_flags or "") else False
-        rules.append(current)
-
-    # Нормализуем disabled поле, если оно строковое
-    for r in rules:
-        b = _normalize_bool(r.get("disabled"))
-        if b is not None:
-            r["disabled"] = b
+        body = segment[m.end() :]
+        # ";;;" в строке с индексом — комментарий этой записи, отдельной строкой — следующей
+        head, nl, tail = body.partition("\n")
+        head, inline_comment = _split_ros_comments(head)
+        tail, next_comment = _split_ros_comments(tail)
+
+        rule: Dict[str, Any] = {"number": int(m.group(1))}
+        comment = inline_comment or pending_comment
+        if comment:
+            rule["comment"] = comment
+        pending_comment = next_comment
+        rule.update(_parse_kv_pairs_from_line(head + nl + tail))
+
+        disabled = _normalize_bool(rule.get("disabled"))
+        if disabled is not None:
+            rule["disabled"] = disabled
+        elif rule.get("disabled") is None:
+            rule["disabled"] = "X" in (m.group(2) or "")
+        rules.append(rule)
 
     return rules
 
@@ -853,36 +1239,23 @@ def enable_firewall_rule(
     config_data = _get_active_config_dict(db)
     
     try:
-        if _is_routeros_api_connection_type(config_data["connection_type"]):
+        if _is_routeros_api_connection_type(config_data["connection_type_enum"]):
             if str(rule_id).isdigit():
                 raise MikroTikConnectionError(
                     "RouterOS API требует rule .id (например *1). Получен номер правила. Обновите список правил и используйте поле .id."
                 )
-            client = _get_routeros_api_client_from_config(config_data)
-            client.connect()
-            try:
+            with _get_routeros_api_client_from_config(config_data) as client:
                 fw = client.path("ip/firewall/filter")
                 fw.update(**{".id": rule_id, "disabled": False})
-            finally:
-                client.disconnect()
         else:
             # SSH подключение
-            connection_type_enum = ConnectionType(config_data["connection_type"])
-            client = MikroTikSSHClient(
-                host=config_data["host"],
-                port=config_data["port"],
-                username=config_data["username"],
-                password=config_data["password"] if connection_type_enum == ConnectionType.SSH_PASSWORD else None,
-                ssh_key_path=config_data["ssh_key_path"] if connection_type_enum == ConnectionType.SSH_KEY else None,
-            )
-            client.connect()
-            # На некоторых RouterOS в выводе print detail может не быть .id, зато есть номер правила.
-            # Поддерживаем оба варианта: либо .id=*XX, либо numbers=NN.
-            if str(rule_id).isdigit():
-                client.execute_command(f"/ip firewall filter enable numbers={rule_id}")
-            else:
-                client.execute_command(f'/ip firewall filter enable [find .id="{rule_id}"]')
-            client.disconnect()
+            with _get_ssh_client_from_config(config_data) as client:
+                # На некоторых RouterOS в выводе print detail может не быть .id, зато есть номер правила.
+                # Поддерживаем оба варианта: либо .id=*XX, либо numbers=NN.
+                if str(rule_id).isdigit():
+                    client.execute_command(f"/ip firewall filter enable numbers={_ros_quote(rule_id)}")
+                else:
+                    client.execute_command(f"/ip firewall filter enable [find .id={_ros_quote(rule_id)}]")
     except Exception as e:
         raise MikroTikConnectionError(f"Failed to enable firewall rule: {str(e)}")
 
@@ -895,34 +1268,21 @@ def disable_firewall_rule(
     config_data = _get_active_config_dict(db)
     
     try:
-        if _is_routeros_api_connection_type(config_data["connection_type"]):
+        if _is_routeros_api_connection_type(config_data["connection_type_enum"]):
             if str(rule_id).isdigit():
                 raise MikroTikConnectionError(
                     "RouterOS API требует rule .id (например *1). Получен номер правила. Обновите список правил и используйте поле .id."
                 )
-            client = _get_routeros_api_client_from_config(config_data)
-            client.connect()
-            try:
+            with _get_routeros_api_client_from_config(config_data) as client:
                 fw = client.path("ip/firewall/filter")
                 fw.update(**{".id": rule_id, "disabled": True})
-            finally:
-                client.disconnect()
         else:
             # SSH подключение
-            connection_type_enum = ConnectionType(config_data["connection_type"])
-            client = MikroTikSSHClient(
-                host=config_data["host"],
-                port=config_data["port"],
-                username=config_data["username"],
-                password=config_data["password"] if connection_type_enum == ConnectionType.SSH_PASSWORD else None,
-                ssh_key_path=config_data["ssh_key_path"] if connection_type_enum == ConnectionType.SSH_KEY else None,
-            )
-            client.connect()
-            if str(rule_id).isdigit():
-                client.execute_command(f"/ip firewall filter disable numbers={rule_id}")
-            else:
-                client.execute_command(f'/ip firewall filter disable [find .id="{rule_id}"]')
-            client.disconnect()
+            with _get_ssh_client_from_config(config_data) as client:
+                if str(rule_id).isdigit():
+                    client.execute_command(f"/ip firewall filter disable numbers={_ros_quote(rule_id)}")
+                else:
+                    client.execute_command(f"/ip firewall filter disable [find .id={_ros_quote(rule_id)}]")
     except Exception as e:
         raise MikroTikConnectionError(f"Failed to disable firewall rule: {str(e)}")
 
@@ -943,10 +1303,8 @@ def get_user_manager_users(db: Session) -> Dict[str, Any]:
     config_data = _get_active_config_dict(db)
     
     try:
-        if _is_routeros_api_connection_type(config_data["connection_type"]):
-            client = _get_routeros_api_client_from_config(config_data)
-            client.connect()
-            try:
+        if _is_routeros_api_connection_type(config_data["connection_type_enum"]):
+            with _get_routeros_api_client_from_config(config_data) as client:
                 users: List[Dict[str, Any]] = []
                 for um_path in ("user-manager/user", "tool/user-manager/user"):
                     try:
@@ -961,31 +1319,20 @@ def get_user_manager_users(db: Session) -> Dict[str, Any]:
                     if b is not None:
                         u["disabled"] = b
                 return {"users": users, "total": len(users)}
-            finally:
-                client.disconnect()
         else:
             # SSH подключение
-            connection_type_enum = ConnectionType(config_data["connection_type"])
-            client = MikroTikSSHClient(
-                host=config_data["host"],
-                port=config_data["port"],
-                username=config_data["username"],
-                password=config_data["password"] if connection_type_enum == ConnectionType.SSH_PASSWORD else None,
-                ssh_key_path=config_data["ssh_key_path"] if connection_type_enum == ConnectionType.SSH_KEY else None,
-            )
-            client.connect()
-            # Выполняем команду для получения пользователей User Manager
-            try:
-                # RouterOS v7
-                output = client.execute_command("/user-manager user print detail")
-                if _is_routeros_cli_error_output(output):
-                    # fallback: старый путь
-                    output = client.execute_command("/tool user-manager user print detail")
-                users = [] if _is_routeros_cli_error_output(output) else _parse_user_manager_output(output)
-            except:
-                # Если User Manager не установлен или недоступен, возвращаем пустой список
-                users = []
-            client.disconnect()
+            with _get_ssh_client_from_config(config_data) as client:
+                # Выполняем команду для получения пользователей User Manager
+                try:
+                    # RouterOS v7
+                    output = client.execute_command("/user-manager user print detail")
+                    if _is_routeros_cli_error_output(output):
+                        # fallback: старый путь
+                        output = client.execute_command("/tool user-manager user print detail")
+                    users = [] if _is_routeros_cli_error_output(output) else _parse_user_manager_output(output)
+                except:
+                    # Если User Manager не установлен или недоступен, возвращаем пустой список
+                    users = []
             return {"users": users, "total": len(users)}
     except Exception as e:
         raise MikroTikConnectionError(f"Failed to get User Manager users: {str(e)}")
@@ -1119,10 +1466,8 @@ def get_user_manager_sessions(db: Session) -> List[Dict[str, Any]]:
     """
     config_data = _get_active_config_dict(db)
     try:
-        if _is_routeros_api_connection_type(config_data["connection_type"]):
-            client = _get_routeros_api_client_from_config(config_data)
-            client.connect()
-            try:
+        if _is_routeros_api_connection_type(config_data["connection_type_enum"]):
+            with _get_routeros_api_client_from_config(config_data) as client:
                 sessions: List[Dict[str, Any]] = []
 
                 # User Manager sessions: возвращаем ВСЕ сессии, но active считаем только по явному флагу A / active=true.
@@ -1150,39 +1495,30 @@ def get_user_manager_sessions(db: Session) -> List[Dict[str, Any]]:
                 sessions.extend(um_sessions)
 
                 return sessions
-            finally:
-                client.disconnect()
         # SSH
-        connection_type_enum = ConnectionType(config_data["connection_type"])
-        client = MikroTikSSHClient(
-            host=config_data["host"],
-            port=config_data["port"],
-            username=config_data["username"],
-            password=config_data["password"] if connection_type_enum == ConnectionType.SSH_PASSWORD else None,
-            ssh_key_path=config_data["ssh_key_path"] if connection_type_enum == ConnectionType.SSH_KEY else None,
-        )
-        client.connect()
-        sessions: List[Dict[str, Any]] = []
-
-        # 1) User Manager sessions (если команда есть)
-        # Оптимизация: запрашиваем только активные (флаг A), иначе вывод может быть очень большим
-        output_um = client.execute_command("/user-manager session print detail where active")
-        if _is_routeros_cli_error_output(output_um):
-            # fallback: полный вывод (если where active не поддерживается)
-            output_um = client.execute_command("/user-manager session print detail")
-        if _is_routeros_cli_error_output(output_um):
-            # fallback: старый путь
-            output_um = client.execute_command("/tool user-manager session print detail where active")
+        with _get_ssh_client_from_config(config_data) as client:
+            # 1) User Manager sessions (если команда есть)
+            # Оптимизация: запрашиваем только активные (флаг A), иначе вывод может быть очень большим
+            output_um = client.execute_command("/user-manager session print detail where active")
             if _is_routeros_cli_error_output(output_um):
-                output_um = client.execute_command("/tool user-manager session print detail")
+                # fallback: полный вывод (если where active не поддерживается)
+                output_um = client.execute_command("/user-manager session print detail")
+            if _is_routeros_cli_error_output(output_um):
+                # fallback: старый путь
+                output_um = client.execute_command("/tool user-manager session print detail where active")
+                if _is_routeros_cli_error_output(output_um):
+                    output_um = client.execute_command("/tool user-manager session print detail")
+
+            # 2) PPP active sessions (фактические подключения)
+            output_ppp = client.execute_command("/ppp active print detail")
+
+        sessions: List[Dict[str, Any]] = []
         if not _is_routeros_cli_error_output(output_um):
             um = _parse_user_manager_session_output(output_um)
             for s in um:
                 s["source"] = "user_manager_session"
             sessions.extend(um)
 
-        # 2) PPP active sessions (фактические подключения)
-        output_ppp = client.execute_command("/ppp active print detail")
         if not _is_routeros_cli_error_output(output_ppp):
             ppp = _parse_ppp_print_detail_output(output_ppp, username_key="name")
             for s in ppp:
@@ -1197,7 +1533,6 @@ def get_user_manager_sessions(db: Session) -> List[Dict[str, Any]]:
                     )
             sessions.extend(ppp)
 
-        client.disconnect()
         return sessions
     except Exception as e:
         raise MikroTikConnectionError(f"Failed to get User Manager sessions: {str(e)}")
@@ -1208,67 +1543,53 @@ def set_user_manager_user_disabled(db: Session, mikrotik_username: str, disabled
     config_data = _get_active_config_dict(db)
 
     try:
-        if _is_routeros_api_connection_type(config_data["connection_type"]):
+        if _is_routeros_api_connection_type(config_data["connection_type_enum"]):
             # RouterOS API ожидает boolean-поля как строки "true"/"false"
             disabled_value = "true" if bool(disabled) else "false"
-            client = _get_routeros_api_client_from_config(config_data)
-            client.connect()
-            try:
-                # 1) User Manager
+            with _get_routeros_api_client_from_config(config_data) as client:
+                # Запись ищет роутер (?name=...), вместо выгрузки всей таблицы пользователей
+                # 1) User Manager (v7: name, старые версии: username)
                 for um_path in ("user-manager/user", "tool/user-manager/user"):
                     try:
-                        um = client.path(um_path)
-                        users = list(um)
-                        for u in users:
-                            if u.get("username") == mikrotik_username or u.get("name") == mikrotik_username:
-                                rid = u.get(".id") or u.get("id")
-                                if rid:
-                                    um.update(**{".id": rid, "disabled": disabled_value})
-                                    return
+                        matches = client.query(um_path, name=mikrotik_username) or client.query(
+                            um_path, username=mikrotik_username
+                        )
+                        for u in matches:
+                            rid = u.get(".id") or u.get("id")
+                            if rid:
+                                client.path(um_path).update(**{".id": rid, "disabled": disabled_value})
+                                return
                     except Exception:
                         continue
 
                 # 2) PPP secret fallback
-                secrets = client.path("ppp/secret")
-                items = list(secrets)
-                for s in items:
-                    if s.get("name") == mikrotik_username:
-                        rid = s.get(".id") or s.get("id")
-                        if rid:
-                            secrets.update(**{".id": rid, "disabled": disabled_value})
-                            return
+                for s in client.query("ppp/secret", name=mikrotik_username):
+                    rid = s.get(".id") or s.get("id")
+                    if rid:
+                        client.path("ppp/secret").update(**{".id": rid, "disabled": disabled_value})
+                        return
                 raise MikroTikConnectionError(f"VPN user '{mikrotik_username}' not found (no User Manager, no PPP secret)")
-            finally:
-                client.disconnect()
 
         # SSH
-        connection_type_enum = ConnectionType(config_data["connection_type"])
-        client = MikroTikSSHClient(
-            host=config_data["host"],
-            port=config_data["port"],
-            username=config_data["username"],
-            password=config_data["password"] if connection_type_enum == ConnectionType.SSH_PASSWORD else None,
-            ssh_key_path=config_data["ssh_key_path"] if connection_type_enum == ConnectionType.SSH_KEY else None,
-        )
-        client.connect()
-        # 1) User Manager
-        # RouterOS v7 использует /user-manager и поле name=
-        cmd = f'/user-manager user set [find name="{mikrotik_username}"] disabled={"yes" if disabled else "no"}'
-        out = client.execute_command(cmd)
-        if _is_routeros_cli_error_output(out):
-            # fallback: старый путь (/tool user-manager)
-            cmd_old = f'/tool user-manager user set [find username="{mikrotik_username}"] disabled={"yes" if disabled else "no"}'
-            out_old = client.execute_command(cmd_old)
-            if _is_routeros_cli_error_output(out_old):
-                # 2) fallback: PPP secret
-                cmd2 = f'/ppp secret set [find name="{mikrotik_username}"] disabled={"yes" if disabled else "no"}'
-                out2 = client.execute_command(cmd2)
-                if _is_routeros_cli_error_output(out2):
-                    client.disconnect()
-                    raise MikroTikConnectionError(
-                        f"Failed to set VPN user '{mikrotik_username}' disabled={disabled}: {out2 or out_old or out}"
-                    )
-        client.disconnect()
+        with _get_ssh_client_from_config(config_data) as client:
+            # 1) User Manager
+            # RouterOS v7 использует /user-manager и поле name=
+            name = _ros_quote(mikrotik_username)
+            disabled_value = "yes" if disabled else "no"
+            cmd = f"/user-manager user set [find name={name}] disabled={disabled_value}"
+            out = client.execute_command(cmd)
+            if _is_routeros_cli_error_output(out):
+                # fallback: старый путь (/tool user-manager)
+                cmd_old = f"/tool user-manager user set [find username={name}] disabled={disabled_value}"
+                out_old = client.execute_command(cmd_old)
+                if _is_routeros_cli_error_output(out_old):
+                    # 2) fallback: PPP secret
+                    cmd2 = f"/ppp secret set [find name={name}] disabled={disabled_value}"
+                    out2 = client.execute_command(cmd2)
+                    if _is_routeros_cli_error_output(out2):
+                        raise MikroTikConnectionError(
+                            f"Failed to set VPN user '{mikrotik_username}' disabled={disabled}: {out2 or out_old or out}"
+                        )
     except Exception as e:
         raise MikroTikConnectionError(f"Failed to set User Manager user disabled={disabled}: {str(e)}")
 
@@ -1285,10 +1606,8 @@ def terminate_active_sessions_for_username(db: Session, mikrotik_username: str)
 
     config_data = _get_active_config_dict(db)
     try:
-        if _is_routeros_api_connection_type(config_data["connection_type"]):
-            client = _get_routeros_api_client_from_config(config_data)
-            client.connect()
-            try:
+        if _is_routeros_api_connection_type(config_data["connection_type_enum"]):
+            with _get_routeros_api_client_from_config(config_data) as client:
                 removed = 0
                 errors: list[str] = []
 
@@ -1297,12 +1616,11 @@ def terminate_active_sessions_for_username(db: Session, mikrotik_username: str)
                 ppp_ids: list[str] = []
                 try:
                     ppp = client.path("ppp/active")
-                    items = list(ppp) or []
+                    # Подключения пользователя отбирает роутер; в разных профилях поле может называться name/user
+                    items = client.query("ppp/active", name=mikrotik_username) or client.query(
+                        "ppp/active", user=mikrotik_username
+                    )
                     for s in items:
-                        # В разных профилях поле может называться name/user
-                        u = s.get("name") or s.get("user") or s.get("username")
-                        if u != mikrotik_username:
-                            continue
                         rid = s.get(".id") or s.get("id")
                         if rid:
                             ppp_ids.append(str(rid))
@@ -1321,18 +1639,11 @@ def terminate_active_sessions_for_username(db: Session, mikrotik_username: str)
                 for um_path in ("user-manager/session", "tool/user-manager/session"):
                     try:
                         um = client.path(um_path)
-                        try:
-                            from librouteros.query import Key  # type: ignore[import-not-found]
-
-                            active_key = Key("active")
-                            items = list(um.select().where(active_key == True))  # noqa: E712
-                        except Exception:
-                            items = list(um) or []
+                        # Сессии пользователя отбирает роутер (?user=...), активность проверяем здесь:
+                        # у одного пользователя сессий единицы
+                        items = client.query(um_path, user=mikrotik_username)
 
                         for s in items:
-                            u = s.get("user") or s.get("username") or s.get("name")
-                            if u != mikrotik_username:
-                                continue
                             if _normalize_bool(s.get("active")) is not True:
                                 continue
                             rid = s.get(".id") or s.get("id")
@@ -1359,37 +1670,25 @@ def terminate_active_sessions_for_username(db: Session, mikrotik_username: str)
                         "or insufficient permissions (need write policy for ppp and User Manager paths). "
                         f"Details: {'; '.join(errors[:5])}"
                     )
-            finally:
-                client.disconnect()
             return
 
         # SSH
-        connection_type_enum = ConnectionType(config_data["connection_type"])
-        client = MikroTikSSHClient(
-            host=config_data["host"],
-            port=config_data["port"],
-            username=config_data["username"],
-            password=config_data["password"] if connection_type_enum == ConnectionType.SSH_PASSWORD else None,
-            ssh_key_path=config_data["ssh_key_path"] if connection_type_enum == ConnectionType.SSH_KEY else None,
-        )
-        client.connect()
-        try:
+        with _get_ssh_client_from_config(config_data) as client:
             # 1) PPP active remove
-            cmd_ppp = f'/ppp active remove [find name="{mikrotik_username}"]'
+            name = _ros_quote(mikrotik_username)
+            cmd_ppp = f"/ppp active remove [find name={name}]"
             out_ppp = client.execute_command(cmd_ppp)
             if _is_routeros_cli_error_output(out_ppp):
                 # иногда user вместо name
-                cmd_ppp2 = f'/ppp active remove [find user="{mikrotik_username}"]'
+                cmd_ppp2 = f"/ppp active remove [find user={name}]"
                 client.execute_command(cmd_ppp2)
 
             # 2) User Manager session remove (разные пути на разных версиях)
-            cmd_um = f'/user-manager session remove [find user="{mikrotik_username}" and active]'
+            cmd_um = f"/user-manager session remove [find user={name} and active]"
             out_um = client.execute_command(cmd_um)
             if _is_routeros_cli_error_output(out_um):
-                cmd_um2 = f'/tool user-manager session remove [find user="{mikrotik_username}"]'
+                cmd_um2 = f"/tool user-manager session remove [find user={name}]"
                 client.execute_command(cmd_um2)
-        finally:
-            client.disconnect()
     except MikroTikConnectionError:
         raise
     except Exception as e:
@@ -7,7 +7,12 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_
 from backend.models.user import User, UserStatus
 from backend.models.registration_request import RegistrationRequest, RegistrationRequestStatus
-from backend.services.user_service import create_user, change_user_status, get_user_by_telegram_id
+from backend.services.user_service import (
+    create_user,
+    change_user_status,
+    get_user_by_telegram_id,
+    invalidate_user_cache,
+)
 
 
 def create_registration_request(
@@ -42,6 +47,7 @@ def create_registration_request(
         if email:
             user.email = email
         db.commit()
+        invalidate_user_cache(user.id)
 
     # Если уже есть ожидающий запрос, не создаем дубликат
     existing_pending = (
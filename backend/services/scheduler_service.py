@@ -2,6 +2,7 @@
 Сервис для работы с планировщиком задач (APScheduler).
 Обеспечивает фоновые операции: мониторинг VPN подключений, напоминания, проверка истекших сессий.
 """
+import asyncio
 import logging
 from typing import Optional
 from datetime import datetime, timedelta
@@ -13,6 +14,9 @@ from sqlalchemy.orm import Session
 from backend.database import SessionLocal
 from backend.services.vpn_session_service import (
     get_sessions_by_status,
+    get_expired_sessions,
+    get_sessions_without_expiry,
+    touch_live_sessions,
     update_vpn_session_status,
     mark_session_as_expired,
     get_active_vpn_session_for_user,
@@ -21,7 +25,7 @@ from backend.services.vpn_session_service import (
     mark_session_as_connected,
 )
 from backend.services.mikrotik_service import get_user_manager_sessions
-from backend.models.vpn_session import VPNSession, VPNSessionStatus
+from backend.models.vpn_session import VPNSession, VPNSessionStatus, LIVE_VPN_SESSION_STATUSES
 from backend.models.user import User
 from config.settings import settings
 from backend.services.settings_service import get_setting_value
@@ -50,22 +54,33 @@ class SchedulerService:
     def __init__(self):
         self.scheduler: Optional[AsyncIOScheduler] = None
     
-    def start(self):
-        """Запустить планировщик задач."""
+    @staticmethod
+    def load_check_interval_seconds() -> int:
+        """
+        Интервал проверки подключений (секунды) — из настроек, иначе дефолт 60s.
+        Обращается к БД, поэтому при старте приложения вызывается в отдельном потоке.
+        """
+        db = SessionLocal()
+        try:
+            return int(get_setting_value(db, "vpn_connection_check_interval_seconds", 60) or 60)
+        except Exception:
+            return 60
+        finally:
+            db.close()
+    
+    def start(self, check_interval_seconds: Optional[int] = None):
+        """
+        Запустить планировщик задач.
+        AsyncIOScheduler привязывается к текущему event loop, поэтому вызывать из потока event loop.
+        """
         if self.scheduler and self.scheduler.running:
             logger.warning("Планировщик уже запущен")
             return
         
         self.scheduler = AsyncIOScheduler()
 
-        # Интервал проверки подключений (секунды) — из настроек, иначе дефолт 60s
-        db = SessionLocal()
-        try:
-            check_interval_seconds = int(get_setting_value(db, "vpn_connection_check_interval_seconds", 60) or 60)
-        except Exception:
-            check_interval_seconds = 60
-        finally:
-            db.close()
+        if check_interval_seconds is None:
+            check_interval_seconds = self.load_check_interval_seconds()
 
         # Логируем в оба логгера: uvicorn.error точно попадает в journal/systemd.
         msg = f"Планировщик задач: интервал проверки VPN подключений = {check_interval_seconds}s"
@@ -106,6 +121,15 @@ class SchedulerService:
             replace_existing=True,
         )
         
+        # Пересчет дневной сводки аудита (каждый день в 3:30 и один раз сразу после запуска)
+        self.scheduler.add_job(
+            self.refresh_audit_stats,
+            trigger=CronTrigger(hour=3, minute=30),
+            id="refresh_audit_stats",
+            replace_existing=True,
+            next_run_time=datetime.now(),
+        )
+        
         self.scheduler.start()
         logger.info("Планировщик задач запущен")
         uvicorn_logger.info("Планировщик задач запущен")
@@ -130,16 +154,7 @@ class SchedulerService:
             confirmation_timeout_seconds = int(get_setting_value(db, "vpn_confirmation_timeout_seconds", 300) or 300)
 
             # Берем все релевантные сессии (включая REQUESTED, чтобы отловить факт подключения)
-            connected_sessions = get_sessions_by_status(
-                db,
-                [
-                    VPNSessionStatus.REQUESTED,
-                    VPNSessionStatus.CONNECTED,
-                    VPNSessionStatus.CONFIRMED,
-                    VPNSessionStatus.ACTIVE,
-                    VPNSessionStatus.REMINDER_SENT,
-                ],
-            )
+            connected_sessions = get_sessions_by_status(db, list(LIVE_VPN_SESSION_STATUSES))
             
             if not connected_sessions:
                 logger.debug("Нет активных подключенных сессий для проверки")
@@ -147,7 +162,9 @@ class SchedulerService:
             
             # Получаем список активных подключений из MikroTik
             try:
-                sessions = get_user_manager_sessions(db)
+                # Запрос к MikroTik блокирующий (SSH/RouterOS API) — выполняем вне event loop,
+                # чтобы API и бот не простаивали на время опроса роутера
+                sessions = await asyncio.to_thread(get_user_manager_sessions, db)
                 # Отслеживаем подключения через User Manager (активные = active=true / флаг A).
                 active_candidates = [
                     s
@@ -182,6 +199,15 @@ class SchedulerService:
                 logger.error(f"Ошибка при получении пользователей MikroTik: {e}")
                 return
 
+            # Обновляем last_seen_at всем живым сессиям подключенных пользователей одним UPDATE,
+            # чтобы не отключать сессию из-за кратковременных сбоев. Commit сбрасывает загруженные
+            # объекты — перечитываем список одним SELECT, а не по запросу на каждую сессию.
+            try:
+                if touch_live_sessions(db, list(active_usernames), datetime.utcnow()):
+                    connected_sessions = get_sessions_by_status(db, list(LIVE_VPN_SESSION_STATUSES))
+            except Exception:
+                db.rollback()
+
             # Защита от ложных срабатываний: не рвём сессии мгновенно.
             interval_seconds = int(get_setting_value(db, "vpn_connection_check_interval_seconds", 60) or 60)
             disconnect_grace_seconds = max(30, interval_seconds * 2)
@@ -194,12 +220,6 @@ class SchedulerService:
                 mikrotik_username = session.mikrotik_username
                 
                 if mikrotik_username in active_usernames:
-                    # Обновляем last_seen_at, чтобы не отключать сессию из-за кратковременных сбоев
-                    try:
-                        session.last_seen_at = datetime.utcnow()
-                        db.commit()
-                    except Exception:
-                        db.rollback()
                     # Факт подключения обнаружен
                     if session.status == VPNSessionStatus.REQUESTED:
                         # 1) ставим CONNECTED (фиксируем connected_at)
@@ -229,7 +249,8 @@ class SchedulerService:
                                 except Exception as e:
                                     logger.error(f"Ошибка при отправке запроса подтверждения: {e}")
                         else:
-                            mark_session_as_confirmed(db, session.id)
+                            # Включение firewall-правила ходит в MikroTik
+                            await asyncio.to_thread(mark_session_as_confirmed, db, session.id)
                             logger.info(f"Сессия {session.id} подтверждена автоматически (require_confirmation=false)")
                             if NOTIFICATIONS_AVAILABLE:
                                 try:
@@ -262,7 +283,8 @@ class SchedulerService:
                                     except Exception as e:
                                         logger.error(f"Ошибка при отправке уведомления об отключении: {e}")
                         else:
-                            mark_session_as_confirmed(db, session.id)
+                            # Включение firewall-правила ходит в MikroTik
+                            await asyncio.to_thread(mark_session_as_confirmed, db, session.id)
                             logger.info(f"Сессия {session.id} подтверждена (auto) при активном подключении")
                 else:
                     # Пользователь отключен, но статус еще показывает подключение
@@ -298,47 +320,36 @@ class SchedulerService:
         db = SessionLocal()
         
         try:
-            # Получаем все активные сессии
-            active_sessions = get_sessions_by_status(
-                db,
-                [
-                    VPNSessionStatus.REQUESTED,
-                    VPNSessionStatus.CONNECTED,
-                    VPNSessionStatus.CONFIRMED,
-                    VPNSessionStatus.ACTIVE,
-                    VPNSessionStatus.REMINDER_SENT,
-                ]
-            )
-            
+            open_statuses = list(LIVE_VPN_SESSION_STATUSES)
             now = datetime.utcnow()
             expired_count = 0
             
-            for session in active_sessions:
-                # Проверяем, истекла ли сессия
-                if session.expires_at and session.expires_at < now:
-                    mark_session_as_expired(db, session.id)
-                    expired_count += 1
-                    logger.info(f"Сессия {session.id} отмечена как истекшая")
-                    
-                    # Отправить уведомление пользователю
-                    if NOTIFICATIONS_AVAILABLE:
-                        try:
-                            await notify_session_expired(session)
-                        except Exception as e:
-                            logger.error(f"Ошибка при отправке уведомления об истечении: {e}")
-                elif not session.expires_at:
-                    # Если expires_at не установлен, устанавливаем его на основе created_at
-                    # (по умолчанию 24 часа, но если есть user_settings.session_duration_hours — используем его)
-                    if session.created_at:
-                        try:
-                            from backend.services.user_service import get_user_settings as _get_user_settings
-                            us = _get_user_settings(db, session.user_id)
-                            duration_hours = int(getattr(us, "session_duration_hours", 24) or 24) if us else 24
-                        except Exception:
-                            duration_hours = 24
-                        expires_at = session.created_at + timedelta(hours=duration_hours)
-                        session.expires_at = expires_at
-                        db.commit()
+            # Только истекшие сессии (индекс status, expires_at), а не все открытые
+            for session in get_expired_sessions(db, open_statuses, now):
+                mark_session_as_expired(db, session.id)
+                expired_count += 1
+                logger.info(f"Сессия {session.id} отмечена как истекшая")
+                
+                # Отправить уведомление пользователю
+                if NOTIFICATIONS_AVAILABLE:
+                    try:
+                        await notify_session_expired(session)
+                    except Exception as e:
+                        logger.error(f"Ошибка при отправке уведомления об истечении: {e}")
+            
+            for session in get_sessions_without_expiry(db, open_statuses):
+                # Если expires_at не установлен, устанавливаем его на основе created_at
+                # (по умолчанию 24 часа, но если есть user_settings.session_duration_hours — используем его)
+                if session.created_at:
+                    try:
+                        from backend.services.user_service import get_user_settings as _get_user_settings
+                        us = _get_user_settings(db, session.user_id)
+                        duration_hours = int(getattr(us, "session_duration_hours", 24) or 24) if us else 24
+                    except Exception:
+                        duration_hours = 24
+                    expires_at = session.created_at + timedelta(hours=duration_hours)
+                    session.expires_at = expires_at
+                    db.commit()
             
             if expired_count > 0:
                 logger.info(f"Отмечено {expired_count} истекших сессий")
@@ -431,6 +442,23 @@ class SchedulerService:
         finally:
             db.close()
     
+    async def refresh_audit_stats(self):
+        """
+        Пересчитать дневную сводку журнала аудита за вчера и сегодня
+        (при пустой сводке — заполнить ее целиком).
+        """
+        db = SessionLocal()
+        
+        try:
+            from backend.services.audit_service import ensure_audit_log_daily, refresh_audit_log_daily
+            ensure_audit_log_daily(db)
+            refresh_audit_log_daily(db, since=datetime.utcnow().date() - timedelta(days=1))
+        except Exception as e:
+            logger.error(f"Ошибка при пересчете сводки аудита: {e}", exc_info=True)
+            db.rollback()
+        finally:
+            db.close()
+    
 
 
 # Глобальный экземпляр планировщика
@@ -1,13 +1,16 @@
 """
 Сервис для работы с системными настройками.
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable
 from sqlalchemy.orm import Session
 from backend.models.setting import Setting
 from cryptography.fernet import Fernet
 from config.settings import settings as app_settings
 import base64
+import hashlib
+import hmac
 import json
+import orjson
 import os
 import re
 import logging
@@ -44,6 +47,14 @@ def decrypt_value(encrypted_value: str) -> str:
         return encrypted_value  # Если не удалось расшифровать, возвращаем как есть
 
 
+def fingerprint_value(value: str) -> bytes:
+    """
+    HMAC-SHA256 отпечаток значения (32 байта) на SECRET_KEY.
+    Позволяет сравнить значение с зашифрованным без расшифровки.
+    """
+    return hmac.new(app_settings.SECRET_KEY.encode(), value.encode(), hashlib.sha256).digest()
+
+
 # Алиасы для обратной совместимости
 _encrypt_value = encrypt_value
 _decrypt_value = decrypt_value
@@ -74,13 +85,20 @@ def get_setting_value(db: Session, key: str, default: Optional[Any] = None) -> O
     if setting.is_encrypted and value:
         value = decrypt_value(value)
     
-    # Попытка преобразовать в JSON, если возможно
+    # Попытка преобразовать в JSON, если возможно (orjson: настройки читаются на каждом запросе и тике планировщика)
     try:
-        return json.loads(value)
-    except (json.JSONDecodeError, TypeError):
+        return orjson.loads(value)
+    except (orjson.JSONDecodeError, TypeError):
         return value
 
 
+def _value_to_str(value: Any) -> str:
+    """Преобразовать значение настройки в строку для хранения."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
 def set_setting(
     db: Session,
     key: str,
@@ -93,10 +111,7 @@ def set_setting(
     setting = get_setting_by_key(db, key)
     
     # Преобразуем значение в строку
-    if isinstance(value, (dict, list)):
-        value_str = json.dumps(value)
-    else:
-        value_str = str(value)
+    value_str = _value_to_str(value)
     
     # Шифруем, если необходимо
     if is_encrypted:
@@ -141,6 +156,54 @@ def set_setting(
     return setting
 
 
+def ensure_default_settings(
+    db: Session,
+    defaults: List[tuple],
+    enforce_category_keys: Iterable[str] = (),
+) -> int:
+    """
+    Создать отсутствующие настройки по умолчанию пакетно.
+    defaults — список (key, value, category, description); существующие значения не меняются.
+    Для ключей из enforce_category_keys категория существующей настройки приводится к указанной.
+    Один SELECT, одна пакетная вставка и UPDATE по категориям, один commit.
+    Возвращает количество созданных настроек.
+    """
+    existing = {
+        key: category
+        for key, category in db.query(Setting.key, Setting.category)
+        .filter(Setting.key.in_([item[0] for item in defaults]))
+        .all()
+    }
+    to_insert = [
+        {
+            "key": key,
+            "value": _value_to_str(value),
+            "category": category,
+            "description": description or f"Setting: {key}",
+            "is_encrypted": False,
+        }
+        for key, value, category, description in defaults
+        if key not in existing
+    ]
+    if to_insert:
+        db.bulk_insert_mappings(Setting, to_insert)
+
+    # Категории: одно UPDATE на каждую целевую категорию (а не на каждый ключ)
+    enforce_category_keys = set(enforce_category_keys)
+    keys_by_category: Dict[str, List[str]] = {}
+    for key, _, category, _ in defaults:
+        if key in enforce_category_keys and key in existing and existing[key] != category:
+            keys_by_category.setdefault(category, []).append(key)
+    for category, keys in keys_by_category.items():
+        db.query(Setting).filter(Setting.key.in_(keys)).update(
+            {Setting.category: category}, synchronize_session=False
+        )
+
+    if to_insert or keys_by_category:
+        db.commit()
+    return len(to_insert)
+
+
 def _sync_setting_to_env_file(key: str, value: str) -> None:
     """
     Синхронизировать настройку с .env файлом.
@@ -247,8 +310,8 @@ def get_settings_dict(db: Session, category: Optional[str] = None) -> Dict[str,
         
         # Попытка преобразовать в JSON
         try:
-            value = json.loads(value)
-        except (json.JSONDecodeError, TypeError):
+            value = orjson.loads(value)
+        except (orjson.JSONDecodeError, TypeError):
             pass
         
         result[setting.key] = value
@@ -3,16 +3,22 @@
 """
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+
+import requests
 from sqlalchemy.orm import Session
-from backend.services.auth_service import create_admin, get_admin_by_username, get_password_hash, get_admin_by_username, get_password_hash
+from backend.services.auth_service import create_admin, get_admin_by_username, get_password_hash, invalidate_admin_cache
 from backend.services.settings_service import set_setting, get_setting_value
 from backend.models.admin import Admin
 from backend.models.mikrotik_config import MikroTikConfig
-from backend.services.mikrotik_config_service import create_mikrotik_config
-from backend.services.mikrotik_service import test_mikrotik_connection
+from backend.services.mikrotik_config_service import (
+    create_mikrotik_config,
+    get_active_mikrotik_config,
+    is_stored_password,
+)
+from backend.services.mikrotik_service import test_mikrotik_connection, invalidate_active_config_cache
 from backend.models.mikrotik_config import ConnectionType
 from config.settings import settings as app_settings
-from backend.services.settings_service import encrypt_value
+from backend.services.settings_service import encrypt_value, fingerprint_value
 
 
 # Шаги мастера настройки
@@ -79,14 +85,12 @@ def get_setup_wizard_status(db: Session) -> Dict[str, Any]:
     
     # Проверяем основные критерии завершенности настройки:
     # 1. Создан хотя бы один администратор
-    from backend.models.admin import Admin
     admin_count = db.query(Admin).count()
     
     # 2. Настроен Telegram Bot Token
     telegram_token = get_setting_value(db, "telegram_bot_token", default=None)
     
     # 3. Настроено подключение к MikroTik
-    from backend.services.mikrotik_config_service import get_active_mikrotik_config
     mikrotik_config = get_active_mikrotik_config(db)
     
     # 4. Сохранены основные настройки безопасности
@@ -103,34 +107,37 @@ def get_setup_wizard_status(db: Session) -> Dict[str, Any]:
     )
     
     # Получаем прогресс по шагам
-    completed_steps = []
-    if get_setting_value(db, "setup_wizard_basic_info_completed", default=False):
-        completed_steps.append("basic_info")
-    if get_setting_value(db, "setup_wizard_security_completed", default=False):
-        completed_steps.append("security")
-    if get_setting_value(db, "setup_wizard_telegram_bot_completed", default=False):
-        completed_steps.append("telegram_bot")
-    if get_setting_value(db, "setup_wizard_mikrotik_completed", default=False):
-        completed_steps.append("mikrotik")
-    if get_setting_value(db, "setup_wizard_notifications_completed", default=False):
-        completed_steps.append("notifications")
-    if get_setting_value(db, "setup_wizard_additional_completed", default=False):
-        completed_steps.append("additional")
-    
-    # Определяем текущий шаг
-    current_step = _get_current_step(completed_steps)
+    completed_steps = _get_completed_steps(db)
     
     # Если мастер был явно завершен ранее (флаг установлен), считаем его завершенным
     # Но все равно разрешаем перезапуск и повторное завершение через веб-интерфейс
     # Это позволяет обновлять настройки после первого завершения
     
+    return _build_setup_wizard_status(is_completed, completed_steps, wizard_completed_flag)
+
+
+def _get_completed_steps(db: Session) -> List[str]:
+    """Получить список завершенных шагов мастера настройки (по флагам в настройках)."""
+    completed_steps = []
+    for step_id in ("basic_info", "security", "telegram_bot", "mikrotik", "notifications", "additional"):
+        if get_setting_value(db, f"setup_wizard_{step_id}_completed", default=False):
+            completed_steps.append(step_id)
+    return completed_steps
+
+
+def _build_setup_wizard_status(
+    is_completed: bool,
+    completed_steps: List[str],
+    was_completed_before: bool,
+) -> Dict[str, Any]:
+    """Сформировать словарь статуса мастера настройки из уже вычисленных значений."""
     return {
         "is_completed": is_completed,
-        "current_step": current_step,
+        "current_step": _get_current_step(completed_steps),
         "completed_steps": completed_steps,
         "total_steps": len(SETUP_WIZARD_STEPS),
         "can_restart": True,  # Всегда разрешаем перезапуск
-        "was_completed_before": wizard_completed_flag,  # Флаг о том, что мастер был завершен ранее
+        "was_completed_before": was_completed_before,  # Флаг о том, что мастер был завершен ранее
     }
 
 
@@ -162,7 +169,6 @@ def get_admin_email_from_db(db: Session) -> Optional[str]:
     
     # Если нет в настройках, пробуем получить из таблицы администраторов
     try:
-        from backend.models.admin import Admin
         admin = db.query(Admin).first()
         if admin and admin.email:
             return admin.email
@@ -235,6 +241,7 @@ def complete_setup_wizard_step(
                 existing_admin.is_active = True
                 db.commit()
                 db.refresh(existing_admin)
+                invalidate_admin_cache(existing_admin.id)
             else:
                 # Если администратор не существует, создаем нового
                 try:
@@ -263,6 +270,7 @@ def complete_setup_wizard_step(
                             existing_admin.is_active = True
                             db.commit()
                             db.refresh(existing_admin)
+                            invalidate_admin_cache(existing_admin.id)
                         else:
                             raise ValueError(f"Не удалось создать администратора: {error_msg}")
                     else:
@@ -324,7 +332,6 @@ def complete_setup_wizard_step(
                 port = int(port)
             
             # Проверяем, не существует ли уже активная конфигурация
-            from backend.services.mikrotik_config_service import get_active_mikrotik_config
             existing_config = get_active_mikrotik_config(db)
             
             if not existing_config:
@@ -350,12 +357,14 @@ def complete_setup_wizard_step(
                     pw = data.get("mikrotik_password")
                     if isinstance(pw, str):
                         pw = pw.rstrip("\r\n")
-                    if pw:
+                    if pw and not is_stored_password(existing_config.password, str(pw), existing_config.password_fp):
                         existing_config.password = encrypt_value(str(pw))
+                        existing_config.password_fp = fingerprint_value(str(pw))
                 existing_config.connection_type = connection_type
                 if "mikrotik_ssh_key_path" in data:
                     existing_config.ssh_key_path = data.get("mikrotik_ssh_key_path")
                 db.commit()
+                invalidate_active_config_cache()
             
             # Сохраняем основные настройки MikroTik в БД (для синхронизации с .env)
             if "mikrotik_host" in data:
@@ -459,15 +468,7 @@ def complete_setup_wizard_step(
     
     elif step_id == "review":
         # Проверяем, что все обязательные шаги выполнены перед завершением
-        completed_steps = []
-        if get_setting_value(db, "setup_wizard_basic_info_completed", default=False):
-            completed_steps.append("basic_info")
-        if get_setting_value(db, "setup_wizard_security_completed", default=False):
-            completed_steps.append("security")
-        if get_setting_value(db, "setup_wizard_telegram_bot_completed", default=False):
-            completed_steps.append("telegram_bot")
-        if get_setting_value(db, "setup_wizard_mikrotik_completed", default=False):
-            completed_steps.append("mikrotik")
+        completed_steps = _get_completed_steps(db)
         
         # Получаем список обязательных шагов (без review и welcome)
         required_steps = [s["id"] for s in SETUP_WIZARD_STEPS if s.get("required", False) and s["id"] not in ["review", "welcome"]]
@@ -490,10 +491,8 @@ def complete_setup_wizard_step(
             }
         
         # Также проверяем, что все необходимые данные присутствуют
-        from backend.models.admin import Admin
         admin_count = db.query(Admin).count()
         telegram_token = get_setting_value(db, "telegram_bot_token", default=None)
-        from backend.services.mikrotik_config_service import get_active_mikrotik_config
         mikrotik_config = get_active_mikrotik_config(db)
         
         if admin_count == 0:
@@ -518,7 +517,12 @@ def complete_setup_wizard_step(
         # Разрешаем завершить мастер даже если он был завершен ранее (перезавершение)
         set_setting(db, "setup_wizard_completed", True, category="setup_wizard")
         set_setting(db, "setup_wizard_completed_at", datetime.utcnow().isoformat(), category="setup_wizard")
-        return {"success": True, "message": "Setup wizard completed"}
+        # Возвращаем актуальный статус, чтобы endpoint не перечитывал его из БД повторно
+        return {
+            "success": True,
+            "message": "Setup wizard completed",
+            "status": _build_setup_wizard_status(True, completed_steps, True),
+        }
     
     return {"success": False, "message": f"Unknown step: {step_id}"}
 
@@ -539,7 +543,6 @@ def test_telegram_connection(token: str) -> tuple[bool, Optional[str]]:
     Возвращает (успех, сообщение об ошибке).
     """
     try:
-        import requests
         response = requests.get(
             f"https://api.telegram.org/bot{token}/getMe",
             timeout=10,
@@ -1,30 +1,86 @@
 """
 Сервис для получения статистики системы.
 """
-from typing import Dict, Any, List
+from enum import Enum
+from typing import Dict, Any, List, Type
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, bindparam
+from sqlalchemy.sql import Select
 from backend.models.user import User, UserStatus
 from backend.models.vpn_session import VPNSession, VPNSessionStatus
 from backend.models.registration_request import RegistrationRequest, RegistrationRequestStatus
-from backend.services.user_service import count_users
-from backend.services.vpn_session_service import count_vpn_sessions
-from backend.services.registration_service import count_registration_requests
 from backend.services.mikrotik_service import MikroTikConnectionError, get_user_manager_sessions
 
 
+# Statement'ы агрегатов собираются один раз при импорте модуля: дашборд опрашивает
+# статистику часто, а одинаковая структура запроса гарантирует попадание
+# в compiled cache SQLAlchemy (меняются только параметры).
+_USERS_BY_STATUS_STMT = select(User.status, func.count(User.id)).group_by(User.status)
+_SESSIONS_BY_STATUS_STMT = select(VPNSession.status, func.count(VPNSession.id)).group_by(VPNSession.status)
+_REGISTRATION_REQUESTS_BY_STATUS_STMT = select(
+    RegistrationRequest.status, func.count(RegistrationRequest.id)
+).group_by(RegistrationRequest.status)
+
+_SESSIONS_BY_DAY_STMT = (
+    select(
+        func.date(VPNSession.created_at).label("date"),
+        func.count(VPNSession.id).label("count"),
+    )
+    .where(
+        VPNSession.created_at >= bindparam("start_date"),
+        VPNSession.created_at <= bindparam("end_date"),
+    )
+    .group_by(func.date(VPNSession.created_at))
+    .order_by(func.date(VPNSession.created_at))
+)
+_USERS_CREATED_BY_DAY_STMT = (
+    select(
+        func.date(User.created_at).label("date"),
+        func.count(User.id).label("count"),
+    )
+    .where(User.created_at >= bindparam("start_date"), User.created_at <= bindparam("end_date"))
+    .group_by(func.date(User.created_at))
+    .order_by(func.date(User.created_at))
+)
+_USERS_APPROVED_BY_DAY_STMT = (
+    select(
+        func.date(User.approved_at).label("date"),
+        func.count(User.id).label("count"),
+    )
+    .where(
+        User.approved_at.isnot(None),
+        User.approved_at >= bindparam("start_date"),
+        User.approved_at <= bindparam("end_date"),
+    )
+    .group_by(func.date(User.approved_at))
+    .order_by(func.date(User.approved_at))
+)
+
+
+def _count_by_status(db: Session, stmt: Select, status_enum: Type[Enum]) -> Dict[str, int]:
+    """Выполнить GROUP BY по статусу и вернуть счетчики для всех значений enum (с нулями)."""
+    counts = {member.value: 0 for member in status_enum}
+    for status_value, count in db.execute(stmt):
+        key = status_value.value if isinstance(status_value, Enum) else str(status_value)
+        counts[key] = int(count)
+    return counts
+
+
 def get_overview_stats(db: Session) -> Dict[str, Any]:
     """Получить общую статистику системы."""
-    total_users = count_users(db)
-    active_users = count_users(db, status=UserStatus.ACTIVE)
-    pending_users = count_users(db, status=UserStatus.PENDING)
+    users_by_status = _count_by_status(db, _USERS_BY_STATUS_STMT, UserStatus)
+    total_users = sum(users_by_status.values())
+    active_users = users_by_status[UserStatus.ACTIVE.value]
+    pending_users = users_by_status[UserStatus.PENDING.value]
     
-    total_sessions = count_vpn_sessions(db)
-    active_sessions = count_vpn_sessions(db, status=VPNSessionStatus.ACTIVE)
+    sessions_by_status = _count_by_status(db, _SESSIONS_BY_STATUS_STMT, VPNSessionStatus)
+    total_sessions = sum(sessions_by_status.values())
+    active_sessions = sessions_by_status[VPNSessionStatus.ACTIVE.value]
     
-    total_registration_requests = count_registration_requests(db)
-    pending_registration_requests = count_registration_requests(db, status=RegistrationRequestStatus.PENDING)
+    requests_by_status = _count_by_status(db, _REGISTRATION_REQUESTS_BY_STATUS_STMT, RegistrationRequestStatus)
+    total_registration_requests = sum(requests_by_status.values())
+    pending_registration_requests = requests_by_status[RegistrationRequestStatus.PENDING.value]
 
     # Активные сессии на MikroTik (UM + PPP active). Это "факт подключения" на роутере.
     # Важно: MikroTik может быть не настроен/недоступен — тогда не валим общий overview.
@@ -60,56 +116,43 @@ def get_overview_stats(db: Session) -> Dict[str, Any]:
 
 def get_users_stats(db: Session) -> Dict[str, Any]:
     """Получить статистику по пользователям."""
-    total = count_users(db)
-    
-    by_status = {}
-    for status_enum in UserStatus:
-        count = count_users(db, status=status_enum)
-        by_status[status_enum.value] = count
+    by_status = _count_by_status(db, _USERS_BY_STATUS_STMT, UserStatus)
     
     return {
-        "total": total,
+        "total": sum(by_status.values()),
         "by_status": by_status,
-        "approved": count_users(db, status=UserStatus.APPROVED),
-        "rejected": count_users(db, status=UserStatus.REJECTED),
-        "pending": count_users(db, status=UserStatus.PENDING),
-        "active": count_users(db, status=UserStatus.ACTIVE),
-        "inactive": count_users(db, status=UserStatus.INACTIVE),
+        "approved": by_status[UserStatus.APPROVED.value],
+        "rejected": by_status[UserStatus.REJECTED.value],
+        "pending": by_status[UserStatus.PENDING.value],
+        "active": by_status[UserStatus.ACTIVE.value],
+        "inactive": by_status[UserStatus.INACTIVE.value],
     }
 
 
 def get_sessions_stats(db: Session) -> Dict[str, Any]:
     """Получить статистику по VPN сессиям."""
-    total = count_vpn_sessions(db)
-    
-    by_status = {}
-    for status_enum in VPNSessionStatus:
-        count = count_vpn_sessions(db, status=status_enum)
-        by_status[status_enum.value] = count
+    by_status = _count_by_status(db, _SESSIONS_BY_STATUS_STMT, VPNSessionStatus)
     
     return {
-        "total": total,
+        "total": sum(by_status.values()),
         "by_status": by_status,
-        "active": count_vpn_sessions(db, status=VPNSessionStatus.ACTIVE),
-        "connected": count_vpn_sessions(db, status=VPNSessionStatus.CONNECTED),
-        "confirmed": count_vpn_sessions(db, status=VPNSessionStatus.CONFIRMED),
-        "disconnected": count_vpn_sessions(db, status=VPNSessionStatus.DISCONNECTED),
-        "expired": count_vpn_sessions(db, status=VPNSessionStatus.EXPIRED),
+        "active": by_status[VPNSessionStatus.ACTIVE.value],
+        "connected": by_status[VPNSessionStatus.CONNECTED.value],
+        "confirmed": by_status[VPNSessionStatus.CONFIRMED.value],
+        "disconnected": by_status[VPNSessionStatus.DISCONNECTED.value],
+        "expired": by_status[VPNSessionStatus.EXPIRED.value],
     }
 
 
 def get_registration_requests_stats(db: Session) -> Dict[str, Any]:
     """Получить статистику по запросам на регистрацию."""
-    total = count_registration_requests(db)
-    pending = count_registration_requests(db, status=RegistrationRequestStatus.PENDING)
-    approved = count_registration_requests(db, status=RegistrationRequestStatus.APPROVED)
-    rejected = count_registration_requests(db, status=RegistrationRequestStatus.REJECTED)
+    by_status = _count_by_status(db, _REGISTRATION_REQUESTS_BY_STATUS_STMT, RegistrationRequestStatus)
     
     return {
-        "total": total,
-        "pending": pending,
-        "approved": approved,
-        "rejected": rejected,
+        "total": sum(by_status.values()),
+        "pending": by_status[RegistrationRequestStatus.PENDING.value],
+        "approved": by_status[RegistrationRequestStatus.APPROVED.value],
+        "rejected": by_status[RegistrationRequestStatus.REJECTED.value],
     }
 
 
@@ -119,15 +162,8 @@ def get_sessions_by_period(
     end_date: datetime,
 ) -> List[Dict[str, Any]]:
     """Получить статистику сессий за период (список по дням)."""
-    query = db.query(
-        func.date(VPNSession.created_at).label("date"),
-        func.count(VPNSession.id).label("count")
-    ).filter(
-        VPNSession.created_at >= start_date,
-        VPNSession.created_at <= end_date,
-    ).group_by(func.date(VPNSession.created_at))
-    
-    result = query.order_by(func.date(VPNSession.created_at)).all()
+    params = {"start_date": start_date, "end_date": end_date}
+    result = db.execute(_SESSIONS_BY_DAY_STMT, params).all()
     return [{"date": str(row.date), "count": int(row.count)} for row in result]
 
 
@@ -143,30 +179,9 @@ def get_users_by_period(
       - created_count: сколько пользователей создано в этот день
       - approved_count: сколько пользователей одобрено в этот день (по approved_at)
     """
-    created_rows = (
-        db.query(
-            func.date(User.created_at).label("date"),
-            func.count(User.id).label("count"),
-        )
-        .filter(User.created_at >= start_date, User.created_at <= end_date)
-        .group_by(func.date(User.created_at))
-        .order_by(func.date(User.created_at))
-        .all()
-    )
-    approved_rows = (
-        db.query(
-            func.date(User.approved_at).label("date"),
-            func.count(User.id).label("count"),
-        )
-        .filter(
-            User.approved_at.isnot(None),
-            User.approved_at >= start_date,
-            User.approved_at <= end_date,
-        )
-        .group_by(func.date(User.approved_at))
-        .order_by(func.date(User.approved_at))
-        .all()
-    )
+    params = {"start_date": start_date, "end_date": end_date}
+    created_rows = db.execute(_USERS_CREATED_BY_DAY_STMT, params).all()
+    approved_rows = db.execute(_USERS_APPROVED_BY_DAY_STMT, params).all()
 
     by_date: Dict[str, Dict[str, Any]] = {}
     for row in created_rows:
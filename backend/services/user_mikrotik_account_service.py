@@ -4,7 +4,7 @@
 
 from __future__ import annotations
 
-from typing import List
+from typing import Dict, Iterable, List
 from sqlalchemy.orm import Session
 
 from backend.models.user import User
@@ -22,6 +22,23 @@ def get_user_mikrotik_usernames(db: Session, user_id: str) -> List[str]:
     return [a.mikrotik_username for a in accounts]
 
 
+def get_users_mikrotik_usernames(db: Session, user_ids: Iterable[str]) -> Dict[str, List[str]]:
+    """MikroTik usernames для набора пользователей одним запросом: user_id -> [usernames]."""
+    user_ids = list(user_ids)
+    result: Dict[str, List[str]] = {user_id: [] for user_id in user_ids}
+    if not user_ids:
+        return result
+    rows = (
+        db.query(UserMikrotikAccount.user_id, UserMikrotikAccount.mikrotik_username)
+        .filter(UserMikrotikAccount.user_id.in_(user_ids), UserMikrotikAccount.is_active == True)  # noqa: E712
+        .order_by(UserMikrotikAccount.created_at.asc())
+        .all()
+    )
+    for user_id, mikrotik_username in rows:
+        result[user_id].append(mikrotik_username)
+    return result
+
+
 def set_user_mikrotik_usernames(db: Session, user_id: str, usernames: List[str]) -> List[str]:
     """
     Установить список MikroTik usernames для пользователя.
@@ -1,18 +1,65 @@
 """
 Сервис для работы с пользователями.
 """
-from typing import Optional, List
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+import time
+from typing import Optional, List, Any, Dict, Iterable, Tuple
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy import and_, or_, select, text, bindparam, inspect as sa_inspect
 from backend.models.user import User, UserStatus
 from backend.models.registration_request import RegistrationRequest, RegistrationRequestStatus
 from backend.models.user_setting import UserSetting
+from backend.utils.pagination import keyset_datetime
 import uuid
 
 
+# Кэш пользователей по ID: user_id -> (expires_at, снимок колонок User).
+# Только для чтения в API (карточка пользователя в панели, get_user_by_id_cached): кэш живет
+# в одном процессе, а статус пользователя меняют и API, и Telegram-бот. Проверки статуса
+# и изменения идут через get_user_by_id, который всегда читает БД.
+_USER_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_USER_CACHE_TTL_SECONDS = 10.0
+_USER_CACHE_MAX_SIZE = 10000
+_USER_COLUMN_KEYS = tuple(attr.key for attr in sa_inspect(User).column_attrs)
+
+
+def invalidate_user_cache(user_id: str) -> None:
+    """Сбросить кэшированного пользователя (вызывать после изменения или удаления)."""
+    _USER_CACHE.pop(user_id, None)
+
+
 def get_user_by_id(db: Session, user_id: str) -> Optional[User]:
-    """Получить пользователя по ID."""
-    return db.query(User).filter(User.id == user_id).first()
+    """
+    Получить пользователя по ID из БД.
+    Повторный вызов в той же сессии (проверка в endpoint, затем в сервисе) берет объект
+    из identity map без SELECT.
+    """
+    return db.get(User, user_id)
+
+
+def get_user_by_id_cached(db: Session, user_id: str) -> Optional[User]:
+    """
+    Получить пользователя по ID через кэш процесса (данные могут отставать до
+    _USER_CACHE_TTL_SECONDS). Только для отображения: не использовать для проверок статуса.
+    """
+    cached = _USER_CACHE.get(user_id)
+    if cached is not None:
+        expires_at, snapshot = cached
+        if expires_at > time.monotonic():
+            # Присоединяем снимок к сессии без SELECT (load=False)
+            user = User(**snapshot)
+            make_transient_to_detached(user)
+            return db.merge(user, load=False)
+        _USER_CACHE.pop(user_id, None)
+
+    user = get_user_by_id(db, user_id)
+    if user is not None:
+        if len(_USER_CACHE) >= _USER_CACHE_MAX_SIZE:
+            _USER_CACHE.clear()
+        _USER_CACHE[user_id] = (
+            time.monotonic() + _USER_CACHE_TTL_SECONDS,
+            {k: getattr(user, k) for k in _USER_COLUMN_KEYS},
+        )
+    return user
 
 
 def get_user_by_telegram_id(db: Session, telegram_id: int) -> Optional[User]:
@@ -79,6 +126,7 @@ def update_user(
         user.status = status
     
     db.commit()
+    invalidate_user_cache(user_id)
     db.refresh(user)
     return user
 
@@ -91,6 +139,7 @@ def delete_user(db: Session, user_id: str) -> bool:
     
     db.delete(user)
     db.commit()
+    invalidate_user_cache(user_id)
     return True
 
 
@@ -119,19 +168,58 @@ def change_user_status(
         user.approved_at = None
     
     db.commit()
+    invalidate_user_cache(user_id)
     db.refresh(user)
     return user
 
 
+# Есть ли FTS5-индекс users_fts (создается в init_db для SQLite); проверяется один раз
+_users_fts_available: Optional[bool] = None
+
+
+def _has_users_fts(db: Session) -> bool:
+    """Проверить наличие полнотекстового индекса пользователей."""
+    global _users_fts_available
+    if _users_fts_available is None:
+        if db.get_bind().dialect.name != "sqlite":
+            _users_fts_available = False
+        else:
+            _users_fts_available = db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type='table' AND name='users_fts'")
+            ).first() is not None
+    return _users_fts_available
+
+
+# Колонки строк списка пользователей: без ORM-объектов, identity map и связей
+_USER_LIST_COLUMNS = (
+    User.id,
+    User.telegram_id,
+    User.full_name,
+    User.phone,
+    User.email,
+    User.status,
+    User.created_at,
+    User.updated_at,
+    User.approved_at,
+    User.rejected_reason,
+)
+
+
 def get_users(
     db: Session,
     skip: int = 0,
     limit: int = 100,
     status: Optional[UserStatus] = None,
     search: Optional[str] = None,
-) -> List[User]:
-    """Получить список пользователей с фильтрацией."""
-    query = db.query(User)
+    after: Optional[tuple] = None,
+) -> List[Any]:
+    """
+    Получить список пользователей с фильтрацией.
+    Возвращает строки только со скалярными колонками (атрибуты как у User, без связей).
+    Если передан after (user_sort_key последней записи предыдущей страницы), используется
+    keyset-пагинация по (created_at, id) вместо OFFSET.
+    """
+    query = db.query(*_USER_LIST_COLUMNS)
     
     # Фильтр по статусу
     if status is not None:
@@ -139,21 +227,47 @@ def get_users(
     
     # Поиск по имени, телефону, email
     if search:
-        search_pattern = f"%{search}%"
+        if len(search) >= 3 and _has_users_fts(db):
+            # Trigram FTS5 находит те же подстроки, что и LIKE '%q%', но по индексу
+            query = query.filter(
+                text("users.rowid IN (SELECT rowid FROM users_fts WHERE users_fts MATCH :fts_query)")
+                .bindparams(fts_query='"' + search.replace('"', '""') + '"')
+            )
+        else:
+            search_pattern = f"%{search}%"
+            query = query.filter(
+                or_(
+                    User.full_name.ilike(search_pattern),
+                    User.phone.ilike(search_pattern),
+                    User.email.ilike(search_pattern),
+                )
+            )
+    
+    # Keyset: сравниваем со значениями из курсора, поэтому удаление опорной записи
+    # между запросами страниц не обрывает список
+    if after is not None:
+        after_created_at, after_id = after
+        after_created_at = keyset_datetime(db, after_created_at)
         query = query.filter(
             or_(
-                User.full_name.ilike(search_pattern),
-                User.phone.ilike(search_pattern),
-                User.email.ilike(search_pattern),
+                User.created_at < after_created_at,
+                and_(User.created_at == after_created_at, User.id < after_id),
             )
         )
     
-    # Сортировка по дате создания (новые первыми)
-    query = query.order_by(User.created_at.desc())
+    # Сортировка по дате создания (новые первыми), id — для стабильного порядка
+    query = query.order_by(User.created_at.desc(), User.id.desc())
     
+    if after is not None:
+        return query.limit(limit).all()
     return query.offset(skip).limit(limit).all()
 
 
+def user_sort_key(user: Any) -> tuple:
+    """Ключ сортировки списка пользователей (created_at, id) — содержимое курсора."""
+    return user.created_at, user.id
+
+
 def count_users(db: Session, status: Optional[UserStatus] = None) -> int:
     """Получить количество пользователей."""
     query = db.query(User)
@@ -167,6 +281,72 @@ def get_user_settings(db: Session, user_id: str) -> Optional[UserSetting]:
     return db.query(UserSetting).filter(UserSetting.user_id == user_id).first()
 
 
+_USER_SETTINGS_ROW_STMT = (
+    select(
+        User.id.label("user_id"),
+        UserSetting.id.label("settings_id"),
+        UserSetting.firewall_rule_comment,
+        UserSetting.require_confirmation,
+        UserSetting.reminder_interval_hours,
+        UserSetting.session_duration_hours,
+        UserSetting.custom_notification_text,
+    )
+    .outerjoin(UserSetting, UserSetting.user_id == User.id)
+    .where(User.id == bindparam("user_id"))
+)
+
+
+def get_users_settings(db: Session, user_ids: Iterable[str]) -> Dict[str, Any]:
+    """Настройки (для списков) набора пользователей одним запросом: user_id -> строка настроек."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    rows = (
+        db.query(UserSetting.user_id, UserSetting.require_confirmation, UserSetting.firewall_rule_comment)
+        .filter(UserSetting.user_id.in_(user_ids))
+        .all()
+    )
+    return {row.user_id: row for row in rows}
+
+
+def get_user_settings_row(db: Session, user_id: str) -> Optional[Any]:
+    """
+    Получить настройки пользователя одним запросом (users LEFT JOIN user_settings).
+    Возвращает None, если пользователя нет; settings_id is None — настройки не созданы.
+    """
+    return db.execute(_USER_SETTINGS_ROW_STMT, {"user_id": user_id}).mappings().first()
+
+
+# Upsert настроек одним атомарным запросом. INSERT ... SELECT FROM users не создает строку
+# для несуществующего пользователя (SQLite не проверяет FK без PRAGMA foreign_keys),
+# поэтому отдельная проверка существования не нужна: RETURNING вернет пустой результат.
+# NULL в параметре означает "не менять" (или значение по умолчанию для новой строки).
+_UPSERT_USER_SETTINGS_SQL = text(
+    """
+    INSERT INTO user_settings (
+        id, user_id, firewall_rule_comment, require_confirmation,
+        reminder_interval_hours, session_duration_hours, custom_notification_text
+    )
+    SELECT
+        :id, users.id, :firewall_rule_comment, COALESCE(:require_confirmation, 0),
+        COALESCE(:reminder_interval_hours, 6), COALESCE(:session_duration_hours, 24),
+        :custom_notification_text
+    FROM users
+    WHERE users.id = :user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        firewall_rule_comment = COALESCE(:firewall_rule_comment, user_settings.firewall_rule_comment),
+        require_confirmation = COALESCE(:require_confirmation, user_settings.require_confirmation),
+        reminder_interval_hours = COALESCE(:reminder_interval_hours, user_settings.reminder_interval_hours),
+        session_duration_hours = COALESCE(:session_duration_hours, user_settings.session_duration_hours),
+        custom_notification_text = COALESCE(:custom_notification_text, user_settings.custom_notification_text),
+        updated_at = CURRENT_TIMESTAMP
+    RETURNING
+        user_id, firewall_rule_comment, require_confirmation,
+        reminder_interval_hours, session_duration_hours, custom_notification_text
+    """
+)
+
+
 def update_user_settings(
     db: Session,
     user_id: str,
@@ -175,27 +355,22 @@ def update_user_settings(
     reminder_interval_hours: Optional[int] = None,
     session_duration_hours: Optional[int] = None,
     custom_notification_text: Optional[str] = None,
-) -> Optional[UserSetting]:
-    """Обновить настройки пользователя."""
-    user_setting = get_user_settings(db, user_id)
-    if not user_setting:
-        # Создаем настройки, если их нет
-        user_setting = UserSetting(user_id=user_id)
-        db.add(user_setting)
-        db.commit()
-        db.refresh(user_setting)
-    
-    if firewall_rule_comment is not None:
-        user_setting.firewall_rule_comment = firewall_rule_comment
-    if require_confirmation is not None:
-        user_setting.require_confirmation = bool(require_confirmation)
-    if reminder_interval_hours is not None:
-        user_setting.reminder_interval_hours = reminder_interval_hours
-    if session_duration_hours is not None:
-        user_setting.session_duration_hours = session_duration_hours
-    if custom_notification_text is not None:
-        user_setting.custom_notification_text = custom_notification_text
-    
+) -> Optional[Any]:
+    """
+    Обновить настройки пользователя (создаются, если их нет).
+    Возвращает строку с сохраненными настройками или None, если пользователь не найден.
+    """
+    row = db.execute(
+        _UPSERT_USER_SETTINGS_SQL,
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "firewall_rule_comment": firewall_rule_comment,
+            "require_confirmation": None if require_confirmation is None else bool(require_confirmation),
+            "reminder_interval_hours": reminder_interval_hours,
+            "session_duration_hours": session_duration_hours,
+            "custom_notification_text": custom_notification_text,
+        },
+    ).first()
     db.commit()
-    db.refresh(user_setting)
-    return user_setting
+    return row
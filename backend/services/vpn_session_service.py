@@ -1,12 +1,13 @@
 """
 Сервис для работы с VPN сессиями.
 """
-from typing import Optional, List
+from typing import Optional, List, Any
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, case
-from backend.models.vpn_session import VPNSession, VPNSessionStatus
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, or_, case, select, text, update
+from backend.models.vpn_session import VPNSession, VPNSessionStatus, LIVE_VPN_SESSION_STATUS_SQL
 from backend.models.user import User, UserStatus
+from backend.utils.pagination import keyset_datetime
 from backend.services.user_service import get_user_by_id, get_user_settings
 from backend.services.mikrotik_service import (
     enable_user_manager_user,
@@ -19,8 +20,13 @@ from backend.services.mikrotik_service import (
 
 
 def get_vpn_session_by_id(db: Session, session_id: str) -> Optional[VPNSession]:
-    """Получить VPN сессию по ID."""
-    return db.query(VPNSession).filter(VPNSession.id == session_id).first()
+    """Получить VPN сессию по ID (вместе с пользователем — одним JOIN)."""
+    return (
+        db.query(VPNSession)
+        .options(joinedload(VPNSession.user))
+        .filter(VPNSession.id == session_id)
+        .first()
+    )
 
 
 def get_active_vpn_session_for_user(db: Session, user_id: str) -> Optional[VPNSession]:
@@ -292,15 +298,89 @@ def get_sessions_by_status(
     ).all()
 
 
+def touch_live_sessions(db: Session, mikrotik_usernames: List[str], seen_at: datetime) -> int:
+    """
+    Отметить last_seen_at у живых сессий указанных MikroTik-пользователей одним UPDATE
+    (частичный индекс ix_vpn_sessions_username_live). Возвращает количество обновленных сессий.
+    """
+    if not mikrotik_usernames:
+        return 0
+    result = db.execute(
+        update(VPNSession)
+        .where(VPNSession.mikrotik_username.in_(mikrotik_usernames), text(LIVE_VPN_SESSION_STATUS_SQL))
+        .values(last_seen_at=seen_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def get_expired_sessions(
+    db: Session,
+    statuses: List[VPNSessionStatus],
+    now: datetime,
+) -> List[VPNSession]:
+    """Получить сессии в указанных статусах, срок действия которых истек (по индексу status, expires_at)."""
+    return db.query(VPNSession).filter(
+        VPNSession.status.in_(statuses),
+        VPNSession.expires_at < now,
+    ).all()
+
+
+def get_sessions_without_expiry(
+    db: Session,
+    statuses: List[VPNSessionStatus],
+) -> List[VPNSession]:
+    """Получить сессии в указанных статусах без установленного expires_at."""
+    return db.query(VPNSession).filter(
+        VPNSession.status.in_(statuses),
+        VPNSession.expires_at.is_(None),
+    ).all()
+
+
+# Ранг статуса для сортировки списка сессий (активные выше); прочие статусы — 0
+_STATUS_RANKS = {
+    VPNSessionStatus.ACTIVE: 5,
+    VPNSessionStatus.REMINDER_SENT: 4,
+    VPNSessionStatus.CONFIRMED: 3,
+    VPNSessionStatus.CONNECTED: 2,
+    VPNSessionStatus.REQUESTED: 1,
+}
+
+
+def _status_rank(status_column):
+    """SQL-выражение ранга статуса сессии для сортировки (активные выше)."""
+    return case(
+        *((status_column == session_status, rank) for session_status, rank in _STATUS_RANKS.items()),
+        else_=0,
+    )
+
+
+def _statuses_with_rank(predicate) -> List[VPNSessionStatus]:
+    """Статусы, ранг которых удовлетворяет predicate (условие на ранг без CASE в WHERE)."""
+    return [s for s in VPNSessionStatus if predicate(_STATUS_RANKS.get(s, 0))]
+
+
+def vpn_session_sort_key(session: VPNSession) -> tuple:
+    """Ключ сортировки списка сессий (ранг статуса, created_at, id) — содержимое курсора."""
+    return _STATUS_RANKS.get(session.status, 0), session.created_at, session.id
+
+
 def get_vpn_sessions(
     db: Session,
     skip: int = 0,
     limit: int = 100,
     status: Optional[VPNSessionStatus] = None,
     user_id: Optional[str] = None,
+    after: Optional[tuple] = None,
 ) -> List[VPNSession]:
-    """Получить список VPN сессий с фильтрацией."""
-    query = db.query(VPNSession)
+    """
+    Получить список VPN сессий с фильтрацией.
+    Если передан after (vpn_session_sort_key последней записи предыдущей страницы),
+    используется keyset-пагинация по (ранг статуса, created_at, id) вместо OFFSET.
+    """
+    # Пользователь нужен для каждой строки ответа: грузим всех одним запросом WHERE id IN (...)
+    query = db.query(VPNSession).options(selectinload(VPNSession.user))
     
     if status is not None:
         query = query.filter(VPNSession.status == status)
@@ -308,17 +388,34 @@ def get_vpn_sessions(
     if user_id is not None:
         query = query.filter(VPNSession.user_id == user_id)
     
+    if after is not None:
+        # Сравниваем со значениями из курсора, а не с текущей строкой опорной записи:
+        # ее статус мог измениться, а сама она — быть удаленной.
+        # Ранг раскрыт в status IN (...), чтобы условие шло по индексам со status.
+        after_rank, after_created_at, after_id = after
+        after_created_at = keyset_datetime(db, after_created_at)
+        query = query.filter(
+            or_(
+                VPNSession.status.in_(_statuses_with_rank(lambda rank: rank < after_rank)),
+                and_(
+                    VPNSession.status.in_(_statuses_with_rank(lambda rank: rank == after_rank)),
+                    or_(
+                        VPNSession.created_at < after_created_at,
+                        and_(VPNSession.created_at == after_created_at, VPNSession.id < after_id),
+                    ),
+                ),
+            )
+        )
+    
     # Сортировка: активные/подключенные наверху, затем по дате (новые первыми).
-    status_rank = case(
-        (VPNSession.status == VPNSessionStatus.ACTIVE, 5),
-        (VPNSession.status == VPNSessionStatus.REMINDER_SENT, 4),
-        (VPNSession.status == VPNSessionStatus.CONFIRMED, 3),
-        (VPNSession.status == VPNSessionStatus.CONNECTED, 2),
-        (VPNSession.status == VPNSessionStatus.REQUESTED, 1),
-        else_=0,
-    )
-    query = query.order_by(status_rank.desc(), VPNSession.created_at.desc())
+    # С фильтром по статусу ранг у всех строк один, и сортировка идет по индексу (status, created_at, id).
+    if status is not None:
+        query = query.order_by(VPNSession.created_at.desc(), VPNSession.id.desc())
+    else:
+        query = query.order_by(_status_rank(VPNSession.status).desc(), VPNSession.created_at.desc(), VPNSession.id.desc())
     
+    if after is not None:
+        return query.limit(limit).all()
     return query.offset(skip).limit(limit).all()
 
 
@@ -331,6 +428,47 @@ def get_active_vpn_sessions(db: Session) -> List[VPNSession]:
     )
 
 
+# Колонки для списка активных сессий: одна выборка с JOIN пользователя без ORM-объектов
+_ACTIVE_SESSION_ROWS_STMT = (
+    select(
+        VPNSession.id,
+        VPNSession.user_id,
+        VPNSession.mikrotik_username,
+        VPNSession.mikrotik_session_id,
+        VPNSession.last_seen_at,
+        VPNSession.connected_at,
+        VPNSession.confirmed_at,
+        VPNSession.expires_at,
+        VPNSession.reminder_sent_at,
+        VPNSession.firewall_rule_id,
+        VPNSession.created_at,
+        VPNSession.updated_at,
+        User.id.label("user__id"),
+        User.telegram_id.label("user__telegram_id"),
+        User.full_name.label("user__full_name"),
+        User.phone.label("user__phone"),
+        User.email.label("user__email"),
+        User.status.label("user__status"),
+        User.created_at.label("user__created_at"),
+        User.updated_at.label("user__updated_at"),
+        User.approved_at.label("user__approved_at"),
+        User.rejected_reason.label("user__rejected_reason"),
+    )
+    .outerjoin(User, User.id == VPNSession.user_id)
+    .where(VPNSession.status == VPNSessionStatus.ACTIVE)
+    .order_by(VPNSession.created_at.desc(), VPNSession.id.desc())
+    .limit(1000)
+)
+
+
+def get_active_vpn_session_rows(db: Session) -> List[Any]:
+    """
+    Получить активные VPN сессии как строки-словари (RowMapping) с полями пользователя
+    (префикс "user__"). Для read-only списка: без ORM identity map и relationship.
+    """
+    return db.execute(_ACTIVE_SESSION_ROWS_STMT).mappings().all()
+
+
 def count_vpn_sessions(
     db: Session,
     status: Optional[VPNSessionStatus] = None,
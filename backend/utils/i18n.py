@@ -13,6 +13,8 @@ DEFAULT_LANGUAGE = "ru"
 
 # Кэш для переводов
 _translations_cache: Dict[str, Dict[str, str]] = {}
+# Плоские каталоги "a.b.c" -> строка: перевод ключа — один поиск в dict вместо обхода вложенности
+_flat_translations_cache: Dict[str, Dict[str, str]] = {}
 
 
 def get_locales_dir() -> Path:
@@ -53,6 +55,33 @@ def load_translations(language: str) -> Dict[str, str]:
         return {}
 
 
+def _flatten_translations(translations: Dict, prefix: str = "") -> Dict[str, str]:
+    """Развернуть вложенный каталог переводов в словарь с ключами через точку."""
+    flat: Dict[str, str] = {}
+    for name, value in translations.items():
+        full_key = f"{prefix}{name}"
+        if isinstance(value, dict):
+            flat.update(_flatten_translations(value, f"{full_key}."))
+        elif isinstance(value, str):
+            flat[full_key] = value
+    return flat
+
+
+def get_flat_translations(language: str) -> Dict[str, str]:
+    """Получить плоский каталог переводов для языка (строится один раз)."""
+    flat = _flat_translations_cache.get(language)
+    if flat is None:
+        flat = _flatten_translations(load_translations(language))
+        _flat_translations_cache[language] = flat
+    return flat
+
+
+def preload_translations() -> None:
+    """Загрузить каталоги всех поддерживаемых языков заранее (при старте приложения)."""
+    for language in SUPPORTED_LANGUAGES:
+        get_flat_translations(language)
+
+
 def get_language_from_request(request: Request, default: Optional[str] = None) -> str:
     """
     Определить язык из запроса.
@@ -93,25 +122,20 @@ def translate(key: str, language: str = DEFAULT_LANGUAGE, **kwargs) -> str:
     Returns:
         Переведенная строка или сам ключ, если перевод не найден
     """
-    translations = load_translations(language)
-    
-    # Поддерживаем вложенные ключи через точку
-    value = translations
-    for part in key.split("."):
-        if isinstance(value, dict) and part in value:
-            value = value[part]
-        else:
-            # Если ключ не найден, возвращаем ключ
-            return key
+    # Вложенные ключи через точку уже развернуты в плоский каталог
+    value = get_flat_translations(language).get(key)
+    if value is None:
+        # Если ключ не найден, возвращаем ключ
+        return key
     
-    # Если значение - строка, подставляем параметры
-    if isinstance(value, str) and kwargs:
+    # Подставляем параметры
+    if kwargs:
         try:
             return value.format(**kwargs)
         except (KeyError, ValueError):
             return value
     
-    return value if isinstance(value, str) else key
+    return value
 
 
 def get_translations(language: str) -> Dict[str, str]:
@@ -126,3 +150,4 @@ def clear_cache():
     """Очистить кэш переводов (полезно при разработке)."""
     global _translations_cache
     _translations_cache.clear()
+    _flat_translations_cache.clear()
@@ -0,0 +1,68 @@
+"""
+Курсорная (keyset) пагинация для списков.
+
+Курсор — непрозрачная для клиента строка с полным ключом сортировки последней записи
+страницы (например, created_at и id). Следующая страница сравнивается с этими значениями,
+а не перечитывает опорную запись: изменение или удаление этой записи между запросами
+не ломает пагинацию, и БД не приходится пропускать OFFSET строк.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Sequence, Tuple
+
+from sqlalchemy import String, literal
+from sqlalchemy.orm import Session
+
+# Ограничение длины курсора: ключ сортировки — несколько коротких значений
+MAX_CURSOR_LENGTH = 512
+
+
+def encode_cursor(*key: Any) -> str:
+    """Закодировать ключ сортировки последней записи страницы в курсор (datetime — в ISO)."""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    raw = json.dumps(values, separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Tuple[Any, ...]:
+    """
+    Декодировать курсор в ключ сортировки с типами types (int, str или datetime).
+    Выбрасывает ValueError для некорректного курсора.
+    """
+    if len(cursor) > MAX_CURSOR_LENGTH:
+        raise ValueError("Invalid cursor")
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+
+    key = []
+    for value, value_type in zip(values, types):
+        if value_type is datetime:
+            if not isinstance(value, str):
+                raise ValueError("Invalid cursor")
+            value = datetime.fromisoformat(value)
+        elif type(value) is not value_type or (value_type is str and not value):
+            raise ValueError("Invalid cursor")
+        key.append(value)
+    return tuple(key)
+
+
+def keyset_datetime(db: Session, value: datetime) -> Any:
+    """
+    Значение datetime из курсора для сравнения с колонкой DateTime.
+
+    SQLite хранит даты строками, и CURRENT_TIMESTAMP пишет их без микросекунд, а параметр
+    datetime SQLAlchemy передает с ".000000": при равенстве строки сравнились бы неверно.
+    Поэтому для SQLite передается строка в формате хранения; сравнение остается по колонке
+    и использует индекс.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return value
+    timespec = "microseconds" if value.microsecond else "seconds"
+    return literal(value.isoformat(sep=" ", timespec=timespec), String)
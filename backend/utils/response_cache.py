@@ -0,0 +1,52 @@
+"""
+Кэш готовых ответов API в памяти процесса.
+
+Админ-панель постоянно опрашивает списки пользователей и активных сессий;
+при неизменных данных ответ отдается из кэша без обращения к БД и сборки Pydantic-моделей.
+Записи инвалидируются по префиксу ключа из endpoints, изменяющих данные.
+TTL короткий: данные меняют также Telegram-бот и планировщик, которые кэш не сбрасывают.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+# Один TTL для списков и их общих количеств (total): иначе после записей бота
+# total расходился бы со строками страницы рядом с ним
+DEFAULT_TTL_SECONDS = 5.0
+MAX_ENTRIES = 512
+
+# key -> (expires_at, value)
+_response_cache: Dict[str, Tuple[float, Any]] = {}
+_lock = threading.Lock()
+
+
+def get_cached_response(key: str) -> Optional[Any]:
+    """Получить ответ из кэша или None, если записи нет или она устарела."""
+    entry = _response_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at <= time.monotonic():
+        with _lock:
+            _response_cache.pop(key, None)
+        return None
+    return value
+
+
+def set_cached_response(key: str, value: Any, ttl: float = DEFAULT_TTL_SECONDS) -> None:
+    """Сохранить ответ в кэш."""
+    now = time.monotonic()
+    with _lock:
+        if len(_response_cache) >= MAX_ENTRIES:
+            for stale_key in [k for k, (expires_at, _) in _response_cache.items() if expires_at <= now]:
+                del _response_cache[stale_key]
+            if len(_response_cache) >= MAX_ENTRIES:
+                _response_cache.clear()
+        _response_cache[key] = (now + ttl, value)
+
+
+def invalidate_cached_responses(*prefixes: str) -> None:
+    """Удалить из кэша все записи, ключи которых начинаются с любого из префиксов."""
+    with _lock:
+        for key in [k for k in _response_cache if k.startswith(prefixes)]:
+            del _response_cache[key]
@@ -23,6 +23,8 @@ class Settings(BaseSettings):
     
     # База данных
     DATABASE_URL: str = "sqlite:///./data/mikrotik_2fa.db"
+    # Сколько соединений пула открыть заранее при старте (0 — не прогревать)
+    DB_POOL_WARM: int = 5
     
     # Безопасность
     SECRET_KEY: str = "change-this-secret-key-in-production"
@@ -30,6 +32,8 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24 часа
     JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Стоимость bcrypt для новых хешей паролей (каждый +1 удваивает время проверки)
+    BCRYPT_ROUNDS: int = 12
     
     # Telegram Bot
     TELEGRAM_BOT_TOKEN: Optional[str] = None
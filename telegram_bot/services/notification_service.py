@@ -2,7 +2,9 @@
 Сервис для отправки уведомлений через Telegram бота.
 """
 import logging
+import string
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional
 from telegram import Bot
 from telegram.error import TelegramError
@@ -33,11 +35,66 @@ class _SafeFormatDict(dict):
         return "{" + str(key) + "}"
 
 
+_FORMATTER = string.Formatter()
+
+
+class CompiledTemplate:
+    """
+    Шаблон сообщения, разобранный один раз: список (литерал, плейсхолдер).
+    Рендеринг склеивает части без повторного разбора строки формата.
+    Плейсхолдеры с форматом/конверсией ({x:>5}, {x!r}) и атрибутами ({a.b}) рендерятся через format_map.
+    """
+
+    __slots__ = ("_template", "_parts", "_use_format_map", "_broken")
+
+    def __init__(self, template: str):
+        self._template = template
+        self._parts = []
+        self._use_format_map = False
+        self._broken = False
+        try:
+            for literal, field_name, format_spec, conversion in _FORMATTER.parse(template):
+                if literal:
+                    self._parts.append((literal, None))
+                if field_name is not None:
+                    if format_spec or conversion or not field_name.isidentifier():
+                        self._use_format_map = True
+                    self._parts.append((None, field_name))
+        except ValueError:
+            # Шаблон сломан фигурными скобками
+            self._broken = True
+
+    def render(self, ctx: dict) -> str:
+        if self._broken:
+            return self._template
+        if self._use_format_map:
+            try:
+                return self._template.format_map(_SafeFormatDict(ctx))
+            except Exception:
+                return self._template
+        out = []
+        for literal, field_name in self._parts:
+            if field_name is None:
+                out.append(literal)
+            elif field_name in ctx:
+                out.append(format(ctx[field_name], ""))
+            else:
+                # Неизвестные ключи оставляем как {key}
+                out.append("{" + field_name + "}")
+        return "".join(out)
+
+
+@lru_cache(maxsize=64)
+def compile_template(template: str) -> CompiledTemplate:
+    """Разобрать шаблон (кэш по тексту: изменения шаблона в UI применяются сразу)."""
+    return CompiledTemplate(template)
+
+
 def _render_template(template: str, ctx: dict) -> str:
     if not template:
         return ""
     try:
-        return str(template).format_map(_SafeFormatDict(ctx))
+        return compile_template(str(template)).render(ctx)
     except Exception:
         # Если шаблон сломан фигурными скобками — не падаем
         return str(template)
@@ -0,0 +1,8 @@
+"""
+Общие настройки тестов: приложение работает с временной SQLite вместо рабочей БД.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
@@ -0,0 +1,56 @@
+"""
+Тесты ASGICors: разрешение источников, в том числе "*".
+"""
+import asyncio
+
+from backend.api.cors import ASGICors
+
+
+async def _ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _call(middleware, method="GET", headers=()):
+    scope = {"type": "http", "method": method, "headers": list(headers)}
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, None, send))
+    start = messages[0]
+    return start["status"], dict(start["headers"])
+
+
+def test_explicit_origin_is_echoed_and_other_is_rejected():
+    cors = ASGICors(_ok_app, allow_origins=["https://vpn.example"])
+    _, headers = _call(cors, headers=[(b"origin", b"https://vpn.example")])
+    assert headers[b"access-control-allow-origin"] == b"https://vpn.example"
+    assert headers[b"vary"] == b"Origin"
+
+    _, headers = _call(cors, headers=[(b"origin", b"https://evil.example")])
+    assert b"access-control-allow-origin" not in headers
+
+
+def test_wildcard_without_credentials_sends_star():
+    cors = ASGICors(_ok_app, allow_origins=["*"], allow_methods=["*"])
+    _, headers = _call(cors, headers=[(b"origin", b"https://any.example")])
+    assert headers[b"access-control-allow-origin"] == b"*"
+    assert b"vary" not in headers
+
+    status, headers = _call(
+        cors,
+        method="OPTIONS",
+        headers=[(b"origin", b"https://any.example"), (b"access-control-request-method", b"POST")],
+    )
+    assert status == 200
+    assert headers[b"access-control-allow-origin"] == b"*"
+
+
+def test_wildcard_with_credentials_echoes_origin():
+    cors = ASGICors(_ok_app, allow_origins=["*"], allow_credentials=True)
+    _, headers = _call(cors, headers=[(b"origin", b"https://any.example")])
+    assert headers[b"access-control-allow-origin"] == b"https://any.example"
+    assert headers[b"access-control-allow-credentials"] == b"true"
+    assert headers[b"vary"] == b"Origin"
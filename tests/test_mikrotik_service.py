@@ -0,0 +1,65 @@
+"""
+Тесты вспомогательных функций mikrotik_service (без подключения к роутеру).
+"""
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+from backend.services import mikrotik_service as ms
+
+
+def _fake_api(sock):
+    """Объект с той же структурой, что librouteros Api: api.protocol.transport.sock."""
+    closed = []
+    api = SimpleNamespace(
+        protocol=SimpleNamespace(transport=SimpleNamespace(sock=sock)),
+        close=lambda: closed.append(True),
+    )
+    return api, closed
+
+
+@pytest.fixture
+def pool_key():
+    key = ("test-host", 8728, "admin", ms._auth_fingerprint("secret"), False)
+    yield key
+    with ms._API_POOL_LOCK:
+        ms._API_POOL.pop(key, None)
+
+
+def test_pooled_api_connection_checked_out_twice(pool_key):
+    local, remote = socket.socketpair()
+    try:
+        api, closed = _fake_api(local)
+        ms._checkin_routeros_api(pool_key, api)
+        assert ms._checkout_routeros_api(pool_key) is api
+        ms._checkin_routeros_api(pool_key, api)
+        assert ms._checkout_routeros_api(pool_key) is api
+        assert not closed
+    finally:
+        local.close()
+        remote.close()
+
+
+def test_pooled_api_connection_closed_by_router_is_dropped(pool_key):
+    local, remote = socket.socketpair()
+    try:
+        api, closed = _fake_api(local)
+        ms._checkin_routeros_api(pool_key, api)
+        remote.close()
+        assert ms._checkout_routeros_api(pool_key) is None
+        assert closed
+    finally:
+        local.close()
+
+
+def test_ros_quote_escapes_special_and_line_break_chars():
+    assert ms._ros_quote('a"b\\c$d') == '"a\\"b\\\\c\\$d"'
+    assert ms._ros_quote("x\r\n/system reboot\ty") == '"x\\r\\n/system reboot\\ty"'
+
+
+def test_ros_quote_rejects_other_control_chars():
+    with pytest.raises(ValueError):
+        ms._ros_quote("name\x00")
+    with pytest.raises(ValueError):
+        ms._ros_quote("name\x1b[0m")
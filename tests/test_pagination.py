@@ -0,0 +1,92 @@
+"""
+Тесты курсорной пагинации: курсор хранит ключ сортировки, а не только id опорной записи.
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.models.base import Base
+from backend.models.user import User
+from backend.models.vpn_session import VPNSession, VPNSessionStatus
+from backend.services.user_service import get_users, user_sort_key
+from backend.services.vpn_session_service import get_vpn_sessions, vpn_session_sort_key
+from backend.utils.pagination import decode_cursor, encode_cursor
+
+SESSION_CURSOR_TYPES = (int, datetime, str)
+USER_CURSOR_TYPES = (datetime, str)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def sessions(db):
+    user = User(telegram_id=1)
+    db.add(user)
+    db.flush()
+    statuses = [VPNSessionStatus.ACTIVE] * 4 + [VPNSessionStatus.DISCONNECTED] * 2
+    db.add_all(VPNSession(user_id=user.id, mikrotik_username=f"u{i}", status=s) for i, s in enumerate(statuses))
+    db.commit()
+    return [s.id for s in get_vpn_sessions(db, limit=100)]
+
+
+def _session_cursor(session):
+    """Курсор так, как его отдает API, и ключ, который API из него получит."""
+    return decode_cursor(encode_cursor(*vpn_session_sort_key(session)), SESSION_CURSOR_TYPES)
+
+
+def test_cursor_round_trip():
+    key = (5, datetime(2024, 1, 2, 3, 4, 5), "abc")
+    assert decode_cursor(encode_cursor(*key), SESSION_CURSOR_TYPES) == key
+
+
+@pytest.mark.parametrize("cursor", ["", "!!!", encode_cursor("only-id"), encode_cursor("5", "2024-01-01", "x")])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, SESSION_CURSOR_TYPES)
+
+
+def test_next_page_after_anchor_status_change(db, sessions):
+    page = get_vpn_sessions(db, limit=2)
+    anchor = page[-1]
+    after = _session_cursor(anchor)
+
+    # Планировщик переводит опорную сессию из ACTIVE в EXPIRED между запросами страниц
+    anchor.status = VPNSessionStatus.EXPIRED
+    db.commit()
+
+    next_ids = [s.id for s in get_vpn_sessions(db, limit=100, after=after)]
+    assert [i for i in next_ids if i != anchor.id] == sessions[2:]
+
+
+def test_next_page_after_anchor_deleted(db, sessions):
+    page = get_vpn_sessions(db, limit=2)
+    anchor = page[-1]
+    after = _session_cursor(anchor)
+
+    db.delete(anchor)
+    db.commit()
+
+    assert [s.id for s in get_vpn_sessions(db, limit=100, after=after)] == sessions[2:]
+
+
+def test_users_next_page_after_anchor_deleted(db):
+    db.add_all(User(telegram_id=i) for i in range(1, 6))
+    db.commit()
+    all_ids = [u.id for u in get_users(db, limit=100)]
+
+    anchor = get_users(db, limit=2)[-1]
+    after = decode_cursor(encode_cursor(*user_sort_key(anchor)), USER_CURSOR_TYPES)
+    db.query(User).filter(User.id == anchor.id).delete()
+    db.commit()
+
+    assert [u.id for u in get_users(db, limit=100, after=after)] == all_ids[2:]
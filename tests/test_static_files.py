@@ -0,0 +1,46 @@
+"""
+Тесты раздачи SPA: fallback на index.html не перехватывает API-запросы.
+"""
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from backend.api.static_files import SPAMount, SPAStaticFiles
+
+
+async def _create_item(request):
+    return PlainTextResponse("created", status_code=201)
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / "index.html").write_text("<html>spa</html>")
+    app = Starlette(routes=[
+        Route("/api/items", _create_item, methods=["POST"]),
+        SPAMount("/", app=SPAStaticFiles(directory=str(tmp_path), html=True), name="spa"),
+    ])
+    return TestClient(app)
+
+
+def test_client_side_route_serves_index(client):
+    response = client.get("/dashboard/users")
+    assert response.status_code == 200
+    assert response.text == "<html>spa</html>"
+    assert response.headers["cache-control"] == "no-store"
+
+
+def test_wrong_method_on_api_route_is_405(client):
+    assert client.get("/api/items").status_code == 405
+
+
+def test_trailing_slash_on_api_route_redirects(client):
+    response = client.post("/api/items/", follow_redirects=False)
+    assert response.status_code in (307, 308)
+    assert response.headers["location"].endswith("/api/items")
+
+
+def test_unknown_api_path_is_404_for_any_method(client):
+    assert client.get("/api/unknown").status_code == 404
+    assert client.post("/api/unknown").status_code == 404